@@ -0,0 +1 @@
+"""Performance benchmarks for nvr_proto. Run with `python -m benchmarks`."""
@@ -0,0 +1,45 @@
+"""
+Run the benchmark suite:
+
+    python -m benchmarks                          # print a table
+    python -m benchmarks --save baseline.json     # record a baseline
+    python -m benchmarks --baseline baseline.json # exit 1 on regressions
+"""
+import argparse
+import sys
+from pathlib import Path
+
+from benchmarks import cases  # noqa: F401  (registers the cases)
+from benchmarks.harness import compare, format_table, load_results, run_cases, save_results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    parser.add_argument("--filter", default=None, help="Only run cases whose name contains this text")
+    parser.add_argument("--min-time", type=float, default=0.3, help="Seconds to time each case for")
+    parser.add_argument("--save", default=None, help="Write results as a JSON baseline")
+    parser.add_argument("--baseline", default=None, help="Compare against this JSON baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed slowdown, 0.25 = 25%%")
+    parser.add_argument("--metric", default="p50_us", help="Metric compared against the baseline")
+    args = parser.parse_args(argv)
+
+    results = run_cases(args.filter, min_time=args.min_time)
+    print(format_table(results))
+
+    if args.save:
+        save_results(results, Path(args.save))
+        print(f"\nSaved results to {args.save}")
+
+    if args.baseline:
+        regressions = compare(results, load_results(Path(args.baseline)), args.threshold, args.metric)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"\nNo regressions over {args.threshold:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+"""
+Benchmark cases for the generator, renderer and repository hot paths.
+"""
+import random
+from contextlib import contextmanager
+
+from benchmarks.harness import case
+from nvr_proto.generator import DIFFICULTY_LEVELS, FAMILIES, attempt_question, generate_question, generate_questions
+from nvr_proto.render_svg import clear_render_caches, render_option_svg, render_question_svg, write_question_svg
+
+
+def _sample_question(family, difficulty="medium"):
+    return generate_questions(1, difficulty, families=[family], seed=1234)[0]
+
+
+# -------------------------------------------------
+# Generator
+# -------------------------------------------------
+
+def _register_generator_cases():
+    for difficulty in DIFFICULTY_LEVELS:
+        def setup(difficulty=difficulty):
+            rng = random.Random(1)
+            return lambda: generate_question(difficulty, rng=rng)
+
+        case(f"generator.generate_question[{difficulty}]")(setup)
+
+        for family in FAMILIES:
+            def setup_family(family=family, difficulty=difficulty):
+                rng = random.Random(1)
+                return lambda: attempt_question(family, difficulty=difficulty, rng=rng)
+
+            case(f"generator.attempt_question[{family}/{difficulty}]")(setup_family)
+
+
+# -------------------------------------------------
+# Renderer
+# -------------------------------------------------
+
+def _register_render_cases():
+    for family in FAMILIES:
+        def setup_stem(family=family):
+            question = _sample_question(family)
+            return lambda: render_question_svg(question)
+
+        def setup_option(family=family):
+            question = _sample_question(family)
+            option = question["options"][0]
+            return lambda: render_option_svg(option, family)
+
+        case(f"render.render_question_svg[{family}]")(setup_stem)
+        case(f"render.render_option_svg[{family}]")(setup_option)
+
+
+class _DiscardSink:
+    def write(self, text):
+        return len(text)
+
+
+@case("render.write_question_svg[100 uncached]")
+def _write_document():
+    questions = [q for family in FAMILIES for q in generate_questions(20, "hard", families=[family], seed=1234)]
+    sink = _DiscardSink()
+
+    def run():
+        clear_render_caches()
+        for question in questions:
+            write_question_svg(question, sink)
+
+    return run
+
+
+# -------------------------------------------------
+# Repository (against an in-process database stand-in)
+# -------------------------------------------------
+
+class _FakeCursor:
+    """
+    Accepts any statement and returns one canned summary row. Measures the
+    Python side of the repository functions, not Postgres.
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    def execute(self, sql, params=None):
+        self.store.append((sql, params))
+
+    def fetchone(self):
+        return {"attempts": len(self.store), "correct": 0, "total_response_ms": 0}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeConnection:
+    def __init__(self):
+        self.store = []
+
+    def cursor(self, cursor_factory=None):
+        return _FakeCursor(self.store)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+@contextmanager
+def _fake_db(nvr_repo, writer):
+    @contextmanager
+    def fake_connection():
+        yield FakeConnection()
+
+    originals = nvr_repo.connection, nvr_repo.get_attempt_writer
+    nvr_repo.connection = fake_connection
+    nvr_repo.get_attempt_writer = lambda: writer
+    try:
+        yield
+    finally:
+        nvr_repo.connection, nvr_repo.get_attempt_writer = originals
+
+
+def _repo_case(name):
+    def register(make_call):
+        def setup():
+            from nvr_proto.repository import nvr_repo
+            from nvr_proto.repository.attempt_writer import AttemptWriter
+
+            call = make_call(nvr_repo)
+            # Batches go nowhere; the cases time the request path only.
+            writer = AttemptWriter(write=lambda rows: None)
+
+            def run():
+                with _fake_db(nvr_repo, writer):
+                    return call()
+
+            return run
+
+        return case(name)(setup)
+
+    return register
+
+
+@_repo_case("repo.record_attempt")
+def _record_attempt(nvr_repo):
+    return lambda: nvr_repo.record_attempt(
+        session_id="bench-session",
+        user_id=None,
+        pattern_family="MATRIX",
+        difficulty="medium",
+        selected_index=1,
+        correct_index=1,
+        is_correct=True,
+        response_ms=1200,
+    )
+
+
+@_repo_case("repo.get_session_summary")
+def _get_session_summary(nvr_repo):
+    return lambda: nvr_repo.get_session_summary(session_id="bench-session")
+
+
+_register_generator_cases()
+_register_render_cases()
@@ -0,0 +1,157 @@
+"""
+Timing, allocation and baseline-comparison helpers for the benchmark suite.
+"""
+import gc
+import json
+import platform
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+CASES: Dict[str, Callable[[], Callable[[], Any]]] = {}
+
+
+def case(name: str):
+    """
+    Register a benchmark. The decorated function does any setup and returns
+    the zero-argument callable that is timed.
+    """
+
+    def register(setup: Callable[[], Callable[[], Any]]):
+        assert name not in CASES, f"Duplicate benchmark case: {name}"
+        CASES[name] = setup
+        return setup
+
+    return register
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def measure(fn: Callable[[], Any], min_time: float = 0.3, min_iterations: int = 50, alloc_iterations: int = 20) -> Dict[str, float]:
+    """
+    Time `fn` until both `min_time` seconds and `min_iterations` calls have
+    elapsed, then sample its memory allocations separately with tracemalloc
+    (tracing slows calls down, so it never overlaps the timed loop).
+    """
+    for _ in range(5):
+        fn()
+
+    samples: List[float] = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        started = time.perf_counter()
+        while len(samples) < min_iterations or time.perf_counter() - started < min_time:
+            t0 = time.perf_counter_ns()
+            fn()
+            samples.append((time.perf_counter_ns() - t0) / 1000.0)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+    tracemalloc.start()
+    try:
+        peaks = []
+        blocks = []
+        for _ in range(alloc_iterations):
+            snapshot_before = tracemalloc.take_snapshot()
+            tracemalloc.reset_peak()
+            base, _ = tracemalloc.get_traced_memory()
+            result = fn()
+            _, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - base)
+            snapshot_after = tracemalloc.take_snapshot()
+            blocks.append(
+                sum(stat.count_diff for stat in snapshot_after.compare_to(snapshot_before, "filename") if stat.count_diff > 0)
+            )
+            del result
+    finally:
+        tracemalloc.stop()
+
+    samples.sort()
+    total_seconds = sum(samples) / 1e6
+    return {
+        "iterations": len(samples),
+        "mean_us": round(sum(samples) / len(samples), 3),
+        "p50_us": round(_percentile(samples, 50), 3),
+        "p95_us": round(_percentile(samples, 95), 3),
+        "p99_us": round(_percentile(samples, 99), 3),
+        "ops_per_sec": round(len(samples) / total_seconds, 1) if total_seconds else 0.0,
+        "alloc_peak_bytes": int(sum(peaks) / len(peaks)),
+        "alloc_retained_blocks": int(sum(blocks) / len(blocks)),
+    }
+
+
+def run_cases(name_filter: Optional[str] = None, min_time: float = 0.3) -> Dict[str, Dict[str, Any]]:
+    results = {}
+    for name, setup in CASES.items():
+        if name_filter and name_filter not in name:
+            continue
+        try:
+            fn = setup()
+        except ImportError as exc:
+            results[name] = {"skipped": f"missing dependency: {exc.name}"}
+            continue
+        results[name] = measure(fn, min_time=min_time)
+    return results
+
+
+def save_results(results: Dict[str, Dict[str, Any]], path: Path) -> None:
+    payload = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "created_at": int(time.time()),
+        },
+        "results": results,
+    }
+    with Path(path).open("w", encoding="utf-8") as file:
+        json.dump(payload, file, indent=2, sort_keys=True)
+
+
+def load_results(path: Path) -> Dict[str, Dict[str, Any]]:
+    with Path(path).open("r", encoding="utf-8") as file:
+        return json.load(file)["results"]
+
+
+def compare(
+    results: Dict[str, Dict[str, Any]],
+    baseline: Dict[str, Dict[str, Any]],
+    threshold: float = 0.25,
+    metric: str = "p50_us",
+) -> List[str]:
+    """
+    Cases whose `metric` grew by more than `threshold` (0.25 = 25%) over
+    the baseline. Cases missing from either side are ignored.
+    """
+    regressions = []
+    for name, current in results.items():
+        before = baseline.get(name)
+        if not before or metric not in current or metric not in before or not before[metric]:
+            continue
+        change = (current[metric] - before[metric]) / before[metric]
+        if change > threshold:
+            regressions.append(
+                f"{name}: {metric} {before[metric]} -> {current[metric]} (+{change:.0%})"
+            )
+    return regressions
+
+
+def format_table(results: Dict[str, Dict[str, Any]]) -> str:
+    header = f"{'case':<48} {'p50 us':>10} {'p95 us':>10} {'p99 us':>10} {'ops/s':>12} {'peak B':>9} {'blocks':>7}"
+    lines = [header, "-" * len(header)]
+    for name, stats in results.items():
+        if "skipped" in stats:
+            lines.append(f"{name:<48} skipped ({stats['skipped']})")
+            continue
+        lines.append(
+            f"{name:<48} {stats['p50_us']:>10.1f} {stats['p95_us']:>10.1f} {stats['p99_us']:>10.1f} "
+            f"{stats['ops_per_sec']:>12.1f} {stats['alloc_peak_bytes']:>9} {stats['alloc_retained_blocks']:>7}"
+        )
+    return "\n".join(lines)
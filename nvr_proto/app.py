@@ -1,7 +1,9 @@
 # nvr_proto/app.py
+import os
 import time
 import uuid
 
+import psycopg2
 import streamlit as st
 import streamlit.components.v1 as components
 
@@ -10,8 +12,13 @@ from nvr_proto.repository.nvr_repo import (
     init_nvr_tables,
     record_attempt,
 )
-from nvr_proto.generator import generate_question
-from nvr_proto.render_svg import render_question_svg, render_option_svg
+from nvr_proto.asset_store import AssetStore
+from nvr_proto.compact import CompactQuestion
+from nvr_proto.fingerprint import SeenSet
+from nvr_proto.generator import ensure_validated, question_stream
+from nvr_proto.components.svg_options import svg_options
+from nvr_proto.render_svg import OPTION_LABELS, RENDER_VERSION, render_options_grid_svg, render_question_svg, set_asset_store
+from nvr_proto.validated import is_trusted
 
 CURRENT_DIFFICULTY = "easy"
 
@@ -24,6 +31,19 @@ st.title("🧠 NVR Prototype – Pattern Reasoning")
 
 init_nvr_tables()
 
+
+@st.cache_resource
+def _open_asset_store(path: str) -> AssetStore:
+    return AssetStore(path, render_version=RENDER_VERSION)
+
+
+# Pre-rendered SVGs (python -m nvr_proto.bank assets --use-defs --compact).
+if os.environ.get("NVR_ASSET_STORE"):
+    try:
+        set_asset_store(_open_asset_store(os.environ["NVR_ASSET_STORE"]))
+    except ValueError as exc:
+        st.warning(f"Rendering live, asset store not used: {exc}")
+
 st.markdown(
     """
     <style>
@@ -69,111 +89,29 @@ def extract_explanation(q: dict) -> str:
     return "Apply the same rule shown in the question."
 
 
-def new_question() -> dict:
-    return normalize_question(generate_question(difficulty=CURRENT_DIFFICULTY))
-
-
-def normalize_question(q: dict) -> dict:
-    """
-    Accepts BOTH schemas:
-    - Canonical: {"pattern_family","stem","options","correct_index",...}
-    - Legacy:   {"question_type","prompt","options","correct_index",...}
-    Returns canonical.
-    """
-    if not isinstance(q, dict):
-        return {}
-
-    # already canonical
-    if "pattern_family" in q and "stem" in q and "options" in q and "correct_index" in q:
-        return q
-
-    # legacy canonical
-    if "question_type" in q and "prompt" in q and "options" in q and "correct_index" in q:
-        pattern_family = q["question_type"]
-        prompt = q.get("prompt") or {}
-        stem = {"type": pattern_family.lower()}
-        if isinstance(prompt, dict):
-            stem.update(prompt)
-        return {
-            "pattern_family": pattern_family,
-            "stem": stem,
-            "options": q.get("options", []),
-            "correct_index": int(q.get("correct_index", 0)),
-            "difficulty": q.get("difficulty", "easy"),
-            "explanation": q.get("explanation", "Apply the same rule shown in the question."),
-        }
-
-    # legacy
-    if "type" not in q:
-        return {}
-
-    t = q.get("type")
-    shape = q.get("shape", "triangle")
-    options = q.get("options", [])
-    correct_index = q.get("correct_index", None)
-    explanation = q.get("explanation", "Apply the same rule shown in the question.")
-
-    if t == "sequence":
-        stem = {"type": "sequence", "shape": shape, "sequence": q.get("sequence", [])}
-        return {
-            "pattern_family": "SEQUENCE",
-            "stem": stem,
-            "options": options,
-            "correct_index": int(correct_index) if correct_index is not None else 0,
-            "difficulty": "easy",
-            "explanation": explanation,
-        }
-
-    if t == "odd_one_out":
-        stem = {"type": "odd_one_out", "shape": shape}
-        return {
-            "pattern_family": "ODD_ONE_OUT",
-            "stem": stem,
-            "options": options,
-            "correct_index": int(correct_index) if correct_index is not None else 0,
-            "difficulty": "easy",
-            "explanation": explanation,
-        }
-
-    if t == "matrix":
-        stem = {"type": "matrix", "shape": shape, "matrix": q.get("matrix", [])}
-        return {
-            "pattern_family": "MATRIX",
-            "stem": stem,
-            "options": options,
-            "correct_index": int(correct_index) if correct_index is not None else 0,
-            "difficulty": "easy",
-            "explanation": explanation,
-        }
-
-    if t == "structure_match":
-        return {
-            "pattern_family": "ANALOGY",
-            "stem": {"type": "structure_match", **q},
-            "options": options,
-            "correct_index": int(correct_index) if correct_index is not None else 0,
-            "difficulty": "easy",
-            "explanation": explanation,
-        }
-
-    if t == "hidden_shape":
-        return {
-            "pattern_family": "COMPOSITION",
-            "stem": {"type": "hidden_shape", "target": q.get("target", [])},
-            "options": options,
-            "correct_index": int(correct_index) if correct_index is not None else 0,
-            "difficulty": "easy",
-            "explanation": explanation,
-        }
-
-    return {}
+def new_question() -> CompactQuestion:
+    # Session state holds the packed form; it is expanded once per rerun.
+    # The stream generates ahead in the background, so "Next" rarely waits.
+    return next(st.session_state.question_stream)
 
 # -----------------------------
 # Session state
 # -----------------------------
+if "seen_questions" not in st.session_state:
+    st.session_state.seen_questions = SeenSet()
+
+if "question_stream" not in st.session_state:
+    st.session_state.question_stream = question_stream(
+        difficulty=CURRENT_DIFFICULTY,
+        seen=st.session_state.seen_questions,
+    )
+
 if "question" not in st.session_state:
     st.session_state.question = new_question()
 
+if "question_no" not in st.session_state:
+    st.session_state.question_no = 0
+
 if "selected" not in st.session_state:
     st.session_state.selected = None
 
@@ -188,40 +126,58 @@ if "question_started_at" not in st.session_state:
 
 with st.sidebar:
     st.markdown("### Session Summary")
-    summary = get_session_summary(session_id=st.session_state.session_id)
-    st.write(f"Attempts: {summary['attempts']}")
-    st.write(f"Correct: {summary['correct']}")
-    if summary["attempts"] > 0:
-        acc = round((summary["correct"] / summary["attempts"]) * 100, 1)
-        st.write(f"Accuracy: {acc}%")
-    st.write(f"Avg time: {summary['avg_response_ms']} ms")
-
-question = st.session_state.question
+    try:
+        summary = get_session_summary(session_id=st.session_state.session_id)
+    except psycopg2.Error:
+        # Attempts are still recorded (spooled locally) while the database is away.
+        summary = None
+    if summary is None:
+        st.caption("Session summary is unavailable right now.")
+    else:
+        st.write(f"Attempts: {summary['attempts']}")
+        st.write(f"Correct: {summary['correct']}")
+        if summary["attempts"] > 0:
+            acc = round((summary["correct"] / summary["attempts"]) * 100, 1)
+            st.write(f"Accuracy: {acc}%")
+        st.write(f"Avg time: {summary['avg_response_ms']} ms")
+
+question = st.session_state.question.to_dict()
 
 # -----------------------------
 # SAFETY GUARD
 # -----------------------------
-if (
-    not isinstance(question, dict)
-    or "pattern_family" not in question
-    or "stem" not in question
-    or "options" not in question
-    or "correct_index" not in question
-):
-    st.error(
-        f"Invalid question schema from generator. "
-        f"Keys received: {list((question or {}).keys())}"
-    )
-    st.stop()
-
-if len(question["options"]) != 4:
-    st.error(f"Expected 4 options, got {len(question['options'])}")
-    st.stop()
+# Generator output arrives as a ValidatedQuestion and skips this guard
+# (NVR_STRICT_VALIDATION=1 keeps it on).
+if not is_trusted(question):
+    if (
+        not isinstance(question, dict)
+        or "pattern_family" not in question
+        or "stem" not in question
+        or "options" not in question
+        or "correct_index" not in question
+    ):
+        st.error(
+            f"Invalid question schema from generator. "
+            f"Keys received: {list((question or {}).keys())}"
+        )
+        st.stop()
+
+    if len(question["options"]) != 4:
+        st.error(f"Expected 4 options, got {len(question['options'])}")
+        st.stop()
+
+    try:
+        question = ensure_validated(question)
+    except AssertionError as exc:
+        st.error(f"Invalid question from generator: {exc}")
+        st.stop()
 
 stem_svg = render_question_svg(
     question,
     selected_option=None,
     show_options=False,
+    use_defs=True,
+    compact=True,
 )
 
 # ===============================
@@ -242,53 +198,19 @@ st.markdown("---")
 with st.container():
     st.markdown("## Choose the correct option")
 
-    cols = st.columns(2)
-
-    for i, opt in enumerate(question["options"]):
-        with cols[i % 2]:
-            is_selected = (st.session_state.selected == i)
-
-            option_svg = render_option_svg(
-                opt,
-                question["pattern_family"],
-            )
-
-            border = "3px solid #22c55e" if is_selected else "2px solid #e5e7eb"
-            bg = "rgba(34,197,94,0.08)" if is_selected else "rgba(255,255,255,0.02)"
-            label = (
-                "<div style='font-size:12px;color:#22c55e;text-align:center;'>Selected</div>"
-                if is_selected else ""
-            )
-
-            components.html(
-                f"""
-                <div style="
-                    border: {border};
-                    border-radius: 12px;
-                    padding: 10px;
-                    height: 190px;
-                    display: flex;
-                    flex-direction: column;
-                    justify-content: center;
-                    align-items: center;
-                    background: {bg};
-                    transition: border 0.15s ease;
-                ">
-                    {option_svg}
-                    {label}
-                </div>
-                """,
-                height=210,
-            )
-
-            if st.button(
-                f"Select {['A','B','C','D'][i]}",
-                key=f"select_opt_{i}",
-                use_container_width=True,
-                disabled=st.session_state.submitted,
-            ):
-                st.session_state.selected = i
-                st.rerun()
+    # The component keeps its last click under this key; a fresh key per
+    # question starts each question with nothing selected.
+    options_key = f"options_{st.session_state.question_no}"
+    picked = st.session_state.get(options_key)
+    if picked in OPTION_LABELS and not st.session_state.submitted:
+        st.session_state.selected = OPTION_LABELS.index(picked)
+
+    svg_options(
+        render_options_grid_svg(question, selected_index=st.session_state.selected, compact=True),
+        height=360,
+        disabled=st.session_state.submitted,
+        key=options_key,
+    )
 
 st.markdown("---")
 
@@ -342,6 +264,7 @@ if st.session_state.submitted:
 
     if st.button("Next Question", use_container_width=True):
         st.session_state.question = new_question()
+        st.session_state.question_no += 1
         st.session_state.question_started_at = time.time()
         st.session_state.selected = None
         st.session_state.submitted = False
@@ -0,0 +1,251 @@
+"""
+Content-addressed store of pre-rendered SVG assets.
+
+A store directory holds two files:
+
+    assets.blob   every distinct SVG once, UTF-8, back to back
+    assets.idx    23-byte header, then fixed-width records sorted by key:
+                  key (16 bytes) | blob offset (u64) | length (u32)
+
+The header records the store format, the record count, the renderer
+version (render_svg.RENDER_VERSION) and the render mode (use_defs, compact,
+precision) the assets were built with, so a reader can reject a stale store
+and skip lookups for modes the store does not hold.
+
+Keys come from stem_asset_key()/option_asset_key(): a hash of the role,
+family, the rendered content and the render mode. Identical SVGs reached
+through different keys share one blob entry. Both files are memory-mapped
+by AssetStore, so a lookup is a binary search over the index and the result
+is a zero-copy slice of the blob.
+
+Build a store with `python -m nvr_proto.bank assets`.
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+BLOB_FILENAME = "assets.blob"
+INDEX_FILENAME = "assets.idx"
+STORE_VERSION = 2
+KEY_BYTES = 16
+
+_MAGIC = b"NVRA"
+# magic, store version, record count, render version, use_defs, compact, precision
+_HEADER = struct.Struct("<4sIQI??B")
+_RECORD = struct.Struct(f"<{KEY_BYTES}sQI")  # key, offset, length
+
+
+def _encode(value: Any) -> str:
+    return json.dumps(value, sort_keys=True, separators=(",", ":"))
+
+
+def asset_key(role: str, family: str, content: Any, mode: Dict[str, Any]) -> bytes:
+    return hashlib.blake2b(
+        _encode([role, family, content, mode]).encode("utf-8"),
+        digest_size=KEY_BYTES,
+    ).digest()
+
+
+def stem_asset_key(
+    question: Dict[str, Any],
+    selected_option: Optional[str] = None,
+    show_options: bool = False,
+    use_defs: bool = False,
+    compact: bool = False,
+    precision: int = 2,
+) -> bytes:
+    """
+    Key of render_question_svg(question, ...) output. Options only take part
+    when they are drawn.
+    """
+    content = [question["stem"], question["options"] if show_options else None]
+    mode = {
+        "selected": selected_option if show_options else None,
+        "defs": use_defs,
+        "compact": precision if compact else None,
+    }
+    return asset_key("stem", question["pattern_family"], content, mode)
+
+
+def option_asset_key(
+    option: Dict[str, Any],
+    pattern_family: str,
+    use_defs: bool = False,
+    compact: bool = False,
+    precision: int = 2,
+) -> bytes:
+    """
+    Key of render_option_svg(option, pattern_family, ...) output.
+    """
+    return asset_key("option", pattern_family, option, {"defs": use_defs, "compact": precision if compact else None})
+
+
+class AssetStoreWriter:
+    """
+    Builds a store in `directory`. Blobs are streamed to disk as they are
+    added; the sorted index is written by close(), and both files are moved
+    into place atomically.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        render_version: int,
+        use_defs: bool = False,
+        compact: bool = False,
+        precision: int = 2,
+    ):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.render_version = render_version
+        self.mode = (use_defs, compact, precision)
+        self._blob_tmp = self.directory / (BLOB_FILENAME + ".tmp")
+        self._blob = self._blob_tmp.open("wb")
+        self._offset = 0
+        self._records: Dict[bytes, tuple] = {}
+        self._by_content: Dict[bytes, tuple] = {}
+        self.summary: Optional[Dict[str, int]] = None
+
+    def add(self, key: bytes, svg: str) -> None:
+        assert len(key) == KEY_BYTES
+        if key in self._records:
+            return
+        data = svg.encode("utf-8")
+        digest = hashlib.blake2b(data, digest_size=KEY_BYTES).digest()
+        location = self._by_content.get(digest)
+        if location is None:
+            location = (self._offset, len(data))
+            self._blob.write(data)
+            self._offset += len(data)
+            self._by_content[digest] = location
+        self._records[key] = location
+
+    def close(self) -> Dict[str, int]:
+        """
+        Finish the store; returns key, distinct-blob and byte counts.
+        """
+        if self.summary is not None:
+            return self.summary
+        self._blob.close()
+        index_tmp = self.directory / (INDEX_FILENAME + ".tmp")
+        with index_tmp.open("wb") as file:
+            file.write(_HEADER.pack(_MAGIC, STORE_VERSION, len(self._records), self.render_version, *self.mode))
+            for key in sorted(self._records):
+                offset, length = self._records[key]
+                file.write(_RECORD.pack(key, offset, length))
+        os.replace(self._blob_tmp, self.directory / BLOB_FILENAME)
+        os.replace(index_tmp, self.directory / INDEX_FILENAME)
+        self.summary = {"keys": len(self._records), "blobs": len(self._by_content), "blob_bytes": self._offset}
+        return self.summary
+
+    def __enter__(self) -> "AssetStoreWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        if exc_type is None:
+            self.close()
+        else:
+            self._blob.close()
+            self._blob_tmp.unlink(missing_ok=True)
+        return False
+
+
+def _map(path: Path) -> Optional[mmap.mmap]:
+    with path.open("rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return None
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class AssetStore:
+    """
+    Read-only view of a store directory. Thread-safe for lookups.
+    With `render_version` given, a store built by another renderer version
+    is rejected with ValueError.
+    """
+
+    def __init__(self, directory: Path, render_version: Optional[int] = None):
+        self.directory = Path(directory)
+        self._index = _map(self.directory / INDEX_FILENAME)
+        self._blob = _map(self.directory / BLOB_FILENAME)
+        if self._index is None or len(self._index) < _HEADER.size:
+            raise ValueError(f"Empty asset index in {self.directory}")
+        magic, version, count, built_with, use_defs, compact, precision = _HEADER.unpack_from(self._index, 0)
+        if magic != _MAGIC or version != STORE_VERSION:
+            raise ValueError(f"Not a version {STORE_VERSION} asset store: {self.directory}")
+        if len(self._index) != _HEADER.size + count * _RECORD.size:
+            raise ValueError(f"Truncated asset index in {self.directory}")
+        if render_version is not None and built_with != render_version:
+            raise ValueError(
+                f"Asset store {self.directory} was built by renderer version {built_with}, "
+                f"not {render_version}; rebuild it"
+            )
+        self.count = count
+        self.render_version = built_with
+        self.mode = (use_defs, compact, precision)
+        self._blob_view = memoryview(self._blob) if self._blob is not None else memoryview(b"")
+
+    def __len__(self) -> int:
+        return self.count
+
+    def serves(self, use_defs: bool, compact: bool, precision: int) -> bool:
+        """
+        True if the store was built in this render mode; lookups in any
+        other mode cannot hit.
+        """
+        built_defs, built_compact, built_precision = self.mode
+        return use_defs == built_defs and compact == built_compact and (not compact or precision == built_precision)
+
+    def _find(self, key: bytes) -> int:
+        lo, hi = 0, self.count
+        index = self._index
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = _HEADER.size + mid * _RECORD.size
+            probe = index[start:start + KEY_BYTES]
+            if probe < key:
+                lo = mid + 1
+            elif probe > key:
+                hi = mid
+            else:
+                return start
+        return -1
+
+    def __contains__(self, key: bytes) -> bool:
+        return self._find(key) >= 0
+
+    def get(self, key: bytes) -> Optional[memoryview]:
+        """
+        Zero-copy view of the stored UTF-8 bytes for `key`, or None.
+        """
+        start = self._find(key)
+        if start < 0:
+            return None
+        _, offset, length = _RECORD.unpack_from(self._index, start)
+        return self._blob_view[offset:offset + length]
+
+    def get_svg(self, key: bytes) -> Optional[str]:
+        """
+        The stored SVG for `key` as a str, or None. Decoding copies the
+        bytes; callers that look the same key up repeatedly keep the result
+        (render_svg caches it), or use get() to stream the bytes as they are.
+        """
+        view = self.get(key)
+        return None if view is None else str(view, "utf-8")
+
+    def close(self) -> None:
+        self._blob_view.release()
+        for mapped in (self._index, self._blob):
+            if mapped is not None:
+                mapped.close()
+
+    def __enter__(self) -> "AssetStore":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.close()
+        return False
@@ -0,0 +1,451 @@
+"""
+Pre-generated question banks.
+
+Build a bank (one JSONL shard per family/difficulty/chunk plus index.json):
+
+    python -m nvr_proto.bank build --output nvr_bank --per-family 10000
+
+The app can then draw from the bank instead of generating on the request path.
+
+Report how many distinct valid questions each family/difficulty can produce:
+
+    python -m nvr_proto.bank space
+
+Pre-render every stem and option SVG of the enumerated question space (or of
+a built bank) into a content-addressed asset store:
+
+    python -m nvr_proto.bank assets --output nvr_assets --compact
+
+Re-validate every question of a built bank (each shard's array encoding is
+cached next to it as <shard>.npz and only rebuilt when the shard changes):
+
+    python -m nvr_proto.bank audit --bank nvr_bank
+
+Export a printable worksheet with an answer key:
+
+    python -m nvr_proto.bank worksheet --output pack.html --count 500 --difficulty medium
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from nvr_proto.asset_store import AssetStoreWriter, option_asset_key, stem_asset_key
+from nvr_proto.batch_validate import EncodedBatch, encode_questions, validate_encoded
+from nvr_proto.compact import CompactQuestion
+from nvr_proto.generator import (
+    DIFFICULTY_LEVELS,
+    FAMILIES,
+    GenerationStats,
+    attempt_question,
+    ensure_validated,
+    generate_questions,
+    get_generation_stats,
+    reset_generation_stats,
+)
+from nvr_proto.question_space import QuestionSpace
+from nvr_proto.render_svg import (
+    DEFAULT_PRECISION,
+    RENDER_VERSION,
+    WORKSHEET_LAYOUTS,
+    render_option_svg,
+    render_question_svg,
+    render_worksheet,
+)
+
+INDEX_FILENAME = "index.json"
+BANK_VERSION = 1
+MAX_ATTEMPTS_PER_QUESTION = 20
+
+
+def shard_seed(base_seed: int, family: str, difficulty: str, shard_no: int) -> int:
+    """
+    Independent, reproducible seed for one shard.
+    """
+    digest = hashlib.sha256(f"{base_seed}:{family}:{difficulty}:{shard_no}".encode()).digest()
+    return int.from_bytes(digest[:8], "big")
+
+
+def _build_shard(task: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Worker entry point: generate one shard and write it as JSONL.
+    Returns the shard's index entry plus the worker's generation stats.
+    """
+    reset_generation_stats()
+    rng = random.Random(task["seed"])
+    family = task["family"]
+    difficulty = task["difficulty"]
+    path = Path(task["path"])
+
+    written = 0
+    with path.open("w", encoding="utf-8") as file:
+        while written < task["count"]:
+            for _ in range(MAX_ATTEMPTS_PER_QUESTION):
+                question = attempt_question(family, difficulty=difficulty, rng=rng)
+                if question is not None:
+                    break
+            else:
+                raise RuntimeError(
+                    f"Failed to generate a valid {family}/{difficulty} question for shard {path.name}"
+                )
+            file.write(json.dumps(question, separators=(",", ":")))
+            file.write("\n")
+            written += 1
+
+    return {
+        "file": path.name,
+        "family": family,
+        "difficulty": difficulty,
+        "count": written,
+        "seed": task["seed"],
+    }, get_generation_stats()
+
+
+def plan_shards(
+    output_dir: Path,
+    per_family: int,
+    shard_size: int,
+    base_seed: int,
+    families: List[str],
+    difficulties: List[str],
+) -> List[Dict[str, Any]]:
+    tasks = []
+    for family in families:
+        for difficulty in difficulties:
+            remaining = per_family
+            shard_no = 0
+            while remaining > 0:
+                count = min(shard_size, remaining)
+                filename = f"{family.lower()}-{difficulty}-{shard_no:04d}.jsonl"
+                tasks.append(
+                    {
+                        "family": family,
+                        "difficulty": difficulty,
+                        "count": count,
+                        "seed": shard_seed(base_seed, family, difficulty, shard_no),
+                        "path": str(output_dir / filename),
+                    }
+                )
+                remaining -= count
+                shard_no += 1
+    return tasks
+
+
+def build_bank(
+    output_dir: Path,
+    per_family: int = 10000,
+    shard_size: int = 2000,
+    workers: Optional[int] = None,
+    seed: Optional[int] = None,
+    families: Optional[List[str]] = None,
+    difficulties: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    """
+    Generate a bank for every (family, difficulty) across a process pool.
+    Shards are independent tasks, so the build scales with worker count.
+    Returns the index that is also written to index.json; its "stats" entry
+    holds the merged generation attempt/rejection counters.
+    """
+    families = families or FAMILIES
+    difficulties = difficulties or DIFFICULTY_LEVELS
+    for family in families:
+        assert family in FAMILIES, f"Unknown family: {family}"
+    for difficulty in difficulties:
+        assert difficulty in DIFFICULTY_LEVELS, f"Unknown difficulty: {difficulty}"
+    assert per_family > 0 and shard_size > 0
+
+    if seed is None:
+        seed = random.SystemRandom().getrandbits(63)
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    tasks = plan_shards(output_dir, per_family, shard_size, seed, families, difficulties)
+
+    started = time.perf_counter()
+    stats = GenerationStats()
+    shards = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for shard, shard_stats in pool.map(_build_shard, tasks):
+            shards.append(shard)
+            stats.merge(shard_stats)
+
+    index = {
+        "version": BANK_VERSION,
+        "seed": seed,
+        "created_at": int(time.time()),
+        "build_seconds": round(time.perf_counter() - started, 3),
+        "shards": shards,
+        "stats": stats.snapshot(),
+    }
+    tmp_path = output_dir / (INDEX_FILENAME + ".tmp")
+    with tmp_path.open("w", encoding="utf-8") as file:
+        json.dump(index, file, indent=2)
+    os.replace(tmp_path, output_dir / INDEX_FILENAME)
+    return index
+
+
+class QuestionBank:
+    """
+    Read side of a built bank. Shards are loaded lazily on first draw.
+    """
+
+    def __init__(self, bank_dir: Path):
+        self.bank_dir = Path(bank_dir)
+        with (self.bank_dir / INDEX_FILENAME).open("r", encoding="utf-8") as file:
+            self.index = json.load(file)
+        assert self.index.get("version") == BANK_VERSION, "Unsupported bank version"
+        self._lines: Dict[str, List[str]] = {}
+
+    def shards(self, difficulty: str, families: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        return [
+            shard
+            for shard in self.index["shards"]
+            if shard["difficulty"] == difficulty
+            and (families is None or shard["family"] in families)
+            and shard["count"] > 0
+        ]
+
+    def _shard_lines(self, filename: str) -> List[str]:
+        lines = self._lines.get(filename)
+        if lines is None:
+            with (self.bank_dir / filename).open("r", encoding="utf-8") as file:
+                lines = file.read().splitlines()
+            self._lines[filename] = lines
+        return lines
+
+    def draw(self, difficulty: str = "easy", families: Optional[List[str]] = None, rng=random) -> Dict[str, Any]:
+        """
+        Random prebuilt question for `difficulty`, optionally limited to
+        `families`. Shards are files on disk, so the question is checked
+        again (ensure_validated) before it is handed out.
+        """
+        shards = self.shards(difficulty, families)
+        if not shards:
+            raise LookupError(f"No bank shards for difficulty={difficulty} families={families}")
+        shard = rng.choices(shards, weights=[s["count"] for s in shards], k=1)[0]
+        return ensure_validated(json.loads(rng.choice(self._shard_lines(shard["file"]))))
+
+
+def _iter_bank_questions(bank_dir: Path):
+    bank = QuestionBank(bank_dir)
+    for difficulty in DIFFICULTY_LEVELS:
+        for shard in bank.shards(difficulty):
+            for line in bank._shard_lines(shard["file"]):
+                yield ensure_validated(json.loads(line))
+
+
+def _load_encoded_shard(shard_path: Path) -> Tuple[EncodedBatch, bool]:
+    """
+    The array encoding of one shard, from <shard>.npz when that is newer
+    than the shard and of the current encoding version, else re-encoded
+    from the JSONL and saved. Returns (encoded, re-encoded?).
+    """
+    encoded_path = shard_path.with_suffix(".npz")
+    try:
+        if encoded_path.stat().st_mtime >= shard_path.stat().st_mtime:
+            return EncodedBatch.load(encoded_path), False
+    except (OSError, ValueError):
+        pass
+
+    with shard_path.open("r", encoding="utf-8") as file:
+        questions = [CompactQuestion.from_dict(json.loads(line)) for line in file]
+    encoded = encode_questions(questions)
+    tmp_path = encoded_path.with_name(encoded_path.name + ".tmp")
+    with tmp_path.open("wb") as file:
+        encoded.save(file)
+    os.replace(tmp_path, encoded_path)
+    return encoded, True
+
+
+def audit_bank(bank_dir: Path) -> Dict[str, Any]:
+    """
+    Run every question of a built bank through batch validation. Returns
+    totals plus, per shard with failures, the invalid count and reasons.
+    """
+    bank = QuestionBank(bank_dir)
+    totals = {"questions": 0, "invalid": 0, "shards": 0, "encoded": 0}
+    failing = []
+    for shard in bank.index["shards"]:
+        encoded, fresh = _load_encoded_shard(bank.bank_dir / shard["file"])
+        mask, reasons = validate_encoded(encoded)
+        invalid = int(len(mask) - mask.sum())
+        totals["questions"] += len(mask)
+        totals["invalid"] += invalid
+        totals["shards"] += 1
+        totals["encoded"] += fresh
+        if invalid:
+            failing.append(
+                {
+                    "file": shard["file"],
+                    "invalid": invalid,
+                    "reasons": Counter(reason for reason in reasons if reason is not None).most_common(),
+                }
+            )
+    return {**totals, "failing": failing}
+
+
+def _iter_space_questions(question_space: QuestionSpace):
+    for family, by_difficulty in question_space.sizes().items():
+        for difficulty, size in by_difficulty.items():
+            for index in range(size):
+                yield question_space.get(family, difficulty, index)
+
+
+def build_asset_store(
+    output_dir: Path,
+    questions,
+    use_defs: bool = False,
+    compact: bool = False,
+    precision: int = DEFAULT_PRECISION,
+) -> Dict[str, int]:
+    """
+    Render the stem and each option of every question once, in the given
+    mode, into an asset store at `output_dir`.
+    """
+    writer = AssetStoreWriter(output_dir, RENDER_VERSION, use_defs, compact, precision)
+    with writer:
+        for question in questions:
+            family = question["pattern_family"]
+            writer.add(
+                stem_asset_key(question, use_defs=use_defs, compact=compact, precision=precision),
+                render_question_svg(question, use_defs=use_defs, compact=compact, precision=precision),
+            )
+            for option in question["options"]:
+                writer.add(
+                    option_asset_key(option, family, use_defs, compact, precision),
+                    render_option_svg(option, family, use_defs, compact, precision),
+                )
+    return writer.close()
+
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m nvr_proto.bank")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="Pre-generate a sharded question bank")
+    build.add_argument("--output", default="nvr_bank", help="Output directory")
+    build.add_argument("--per-family", type=int, default=10000, help="Questions per family and difficulty")
+    build.add_argument("--shard-size", type=int, default=2000, help="Questions per JSONL shard")
+    build.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    build.add_argument("--seed", type=int, default=None, help="Base seed for a reproducible build")
+    build.add_argument("--families", nargs="+", choices=FAMILIES, default=None)
+    build.add_argument("--difficulties", nargs="+", choices=DIFFICULTY_LEVELS, default=None)
+    build.add_argument("--stats", action="store_true", help="Print attempt/rejection counters per family")
+
+    space = sub.add_parser("space", help="Enumerate every valid question and report space sizes")
+    space.add_argument("--output", default=None, help="Write the enumerated table to this JSON file")
+
+    assets = sub.add_parser("assets", help="Pre-render stem and option SVGs into an asset store")
+    assets.add_argument("--output", default="nvr_assets", help="Output directory")
+    assets.add_argument("--bank", default=None, help="Render this bank instead of the whole question space")
+    assets.add_argument("--use-defs", action="store_true", help="Render in <defs>/<use> mode")
+    assets.add_argument("--compact", action="store_true", help="Render in compact mode")
+    assets.add_argument("--precision", type=int, default=DEFAULT_PRECISION)
+
+    audit = sub.add_parser("audit", help="Re-validate every question of a built bank")
+    audit.add_argument("--bank", default="nvr_bank", help="Bank directory")
+
+    worksheet = sub.add_parser("worksheet", help="Export questions as a printable HTML worksheet")
+    worksheet.add_argument("--output", default="worksheet.html", help="Output HTML file")
+    worksheet.add_argument("--count", type=int, default=40, help="Number of questions")
+    worksheet.add_argument("--difficulty", choices=DIFFICULTY_LEVELS, default="easy")
+    worksheet.add_argument("--families", nargs="+", choices=FAMILIES, default=None)
+    worksheet.add_argument("--seed", type=int, default=None, help="Seed for a reproducible pack")
+    worksheet.add_argument("--bank", default=None, help="Draw questions from this bank instead of generating")
+    worksheet.add_argument("--layout", choices=sorted(WORKSHEET_LAYOUTS), default="a4")
+    worksheet.add_argument("--title", default="NVR Worksheet")
+    worksheet.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    return parser.parse_args(argv)
+
+
+def format_stats(stats: Dict[str, Dict[str, Dict[str, Any]]]) -> str:
+    lines = [f"{'family':<12} {'difficulty':<10} {'attempts':>9} {'rejections':>10}  top failure"]
+    for family, by_difficulty in stats.items():
+        for difficulty, counts in by_difficulty.items():
+            top = next(iter(counts["failures"].items()), None)
+            top_text = f"{top[1]}x {top[0]}" if top else "-"
+            lines.append(
+                f"{family:<12} {difficulty:<10} {counts['attempts']:>9} {counts['rejections']:>10}  {top_text}"
+            )
+    return "\n".join(lines)
+
+
+def main(argv=None) -> int:
+    args = _parse_args(argv)
+    if args.command == "build":
+        index = build_bank(
+            Path(args.output),
+            per_family=args.per_family,
+            shard_size=args.shard_size,
+            workers=args.workers,
+            seed=args.seed,
+            families=args.families,
+            difficulties=args.difficulties,
+        )
+        total = sum(shard["count"] for shard in index["shards"])
+        print(
+            f"Wrote {total} questions in {len(index['shards'])} shards "
+            f"to {args.output} in {index['build_seconds']}s (seed={index['seed']})"
+        )
+        if args.stats:
+            print(format_stats(index["stats"]))
+    elif args.command == "space":
+        question_space = QuestionSpace.build()
+        print(f"{'family':<12} {'difficulty':<10} {'questions':>9}")
+        for family, by_difficulty in question_space.sizes().items():
+            for difficulty, size in by_difficulty.items():
+                print(f"{family:<12} {difficulty:<10} {size:>9}")
+        if args.output:
+            question_space.save(Path(args.output))
+            print(f"Wrote question space to {args.output}")
+    elif args.command == "audit":
+        started = time.perf_counter()
+        report = audit_bank(Path(args.bank))
+        for shard in report["failing"]:
+            reasons = ", ".join(f"{count}x {reason}" for reason, count in shard["reasons"][:3])
+            print(f"{shard['file']}: {shard['invalid']} invalid ({reasons})")
+        print(
+            f"Checked {report['questions']} questions in {report['shards']} shards "
+            f"({report['encoded']} re-encoded): {report['invalid']} invalid "
+            f"in {time.perf_counter() - started:.2f}s"
+        )
+        return 1 if report["invalid"] else 0
+    elif args.command == "worksheet":
+        started = time.perf_counter()
+        if args.bank:
+            bank = QuestionBank(Path(args.bank))
+            rng = random.Random(args.seed)
+            questions = [bank.draw(args.difficulty, args.families, rng=rng) for _ in range(args.count)]
+        else:
+            questions = generate_questions(args.count, args.difficulty, families=args.families, seed=args.seed)
+        with Path(args.output).open("w", encoding="utf-8") as file:
+            render_worksheet(questions, layout=args.layout, out=file, title=args.title, workers=args.workers)
+        print(f"Wrote {len(questions)} questions to {args.output} in {time.perf_counter() - started:.1f}s")
+    elif args.command == "assets":
+        if args.bank:
+            questions = _iter_bank_questions(Path(args.bank))
+        else:
+            questions = _iter_space_questions(QuestionSpace.build())
+        started = time.perf_counter()
+        counts = build_asset_store(
+            Path(args.output),
+            questions,
+            use_defs=args.use_defs,
+            compact=args.compact,
+            precision=args.precision,
+        )
+        print(
+            f"Wrote {counts['keys']} keys over {counts['blobs']} distinct SVGs "
+            f"({counts['blob_bytes']} bytes) to {args.output} in {time.perf_counter() - started:.1f}s"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,559 @@
+"""
+Vectorized validation for large batches of generated questions.
+
+validate_questions_batch() applies the same rules as
+generator.validate_question. CompactQuestions are grouped by family and
+reduced, a chunk at a time, to a few int columns (stem rotations, option
+keys, option rotations) read straight from their compact.PackedItem codes.
+Each family's checks then run as NumPy array operations over those columns.
+Questions that do not fit the fixed-shape encoding (unpackable items,
+non-3x3 matrices, ...) and plain dict questions go through
+validate_question one at a time, so verdicts always match the scalar path.
+
+CompactQuestions encode well below the cost of the scalar loop, and a saved
+encoding re-checks in a fraction of it: `python -m nvr_proto.bank audit`
+keeps an EncodedBatch next to each bank shard and only re-encodes shards
+that changed.
+"""
+import json
+from itertools import chain, compress, count, islice, repeat
+from operator import attrgetter, is_not, itemgetter
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from nvr_proto.compact import SHAPE_CODES, CompactQuestion, PackedItem, ROTATION_STEP
+from nvr_proto.generator import _assertion_reason, validate_question
+from nvr_proto.geometry import ROTATION_COUNT, shape_key
+
+MISSING_CELL = -1
+# Bumped whenever the meaning of the saved arrays changes.
+ENCODING_VERSION = 3
+# Shape and rotation bits of a PackedItem: what COMPOSITION compares.
+_SHAPE_ROTATION_MASK = 0b11111
+_ROTATION_BITS = 0b111 << 2
+
+
+def _visual_code(code: int) -> int:
+    """
+    `code` with its rotation replaced by the first one that looks the same
+    (geometry.shape_key), so equal codes mean identical drawings, as in
+    generator._rotation_key.
+    """
+    if code & 0b11 >= len(SHAPE_CODES):
+        return code
+    shape = SHAPE_CODES[code & 0b11]
+    keys = [shape_key(shape, index * ROTATION_STEP) for index in range(ROTATION_COUNT)]
+    first = keys.index(keys[(code >> 2) & 0b111])
+    return code & ~_ROTATION_BITS | first << 2
+
+
+# Indexed by PackedItem code (9 bits).
+_VISUAL_CODES = np.array([_visual_code(code) for code in range(1 << 9)], dtype=np.int64)
+_VISUAL_CODE_LIST = _VISUAL_CODES.tolist()
+
+REASON_OPTION_COUNT = "expected 4 options"
+REASON_CORRECT_INDEX = "correct_index out of range"
+REASON_DUPLICATE_OPTIONS = "options not unique"
+REASON_NO_MISSING_CELL = "matrix has no missing cell"
+REASON_MATRIX_DISAGREE = "Matrix rules disagree"
+REASON_RULE_ANSWER = "rule answer is not exactly the keyed option"
+REASON_ODD_NOT_UNIQUE = "odd item is not unique among the options"
+REASON_COMPOSITION_STEM = "composition stem must be a UNION of two inputs"
+
+# For a missing position p in a row/column of 3, the other two positions in order.
+_OTHER = np.array([[1, 2], [0, 2], [0, 1]])
+
+
+class _Fallback(Exception):
+    """The question does not fit the array encoding; validate it directly."""
+
+
+class _KeyIds(dict):
+    """
+    Int id per distinct hashable key (option keys, ODD_ONE_OUT signatures,
+    composition targets): equal keys get equal ids. Ids are unique but not
+    contiguous, so each key is hashed only once.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._next = count()
+
+    def of(self, keys) -> List[int]:
+        return list(map(self.setdefault, keys, self._next))
+
+    def one(self, key) -> int:
+        return self.setdefault(key, next(self._next))
+
+
+class _PackedItems:
+    """
+    Reads compact.PackedItem codes (CompactQuestion input). Items that
+    stayed dicts because they could not be packed raise TypeError.
+    """
+
+    sequence_type = tuple  # CompactQuestion.to_dict() turns these back into lists
+
+    @staticmethod
+    def rotations(items) -> List[int]:
+        return [((item >> 2) & 0b111) * ROTATION_STEP for item in items]
+
+    @staticmethod
+    def cells(rows) -> List[int]:
+        return [MISSING_CELL if cell is None else ((cell >> 2) & 0b111) * ROTATION_STEP for row in rows for cell in row]
+
+    @staticmethod
+    def keys(items) -> List[Any]:
+        for item in items:
+            if not isinstance(item, PackedItem):
+                raise _Fallback()
+        return list(items)
+
+    @staticmethod
+    def option_keys(options) -> Tuple[List[Any], List[int]]:
+        keys = _PackedItems.keys(options)
+        return [_VISUAL_CODE_LIST[key] for key in keys], _PackedItems.rotations(keys)
+
+    @staticmethod
+    def composite_key(items) -> Tuple:
+        return tuple(_VISUAL_CODE_LIST[item] & _SHAPE_ROTATION_MASK for item in items)
+
+
+# Shape of one question's "values" row per family (COMPOSITION: a scalar).
+_VALUE_SHAPE = {
+    "SEQUENCE": (3,),
+    "ANALOGY": (3,),
+    "MATRIX": (3, 3),
+    "ODD_ONE_OUT": (4,),
+    "COMPOSITION": (),
+}
+# Families whose answer is an option rotation.
+_ROTATION_FAMILIES = ("SEQUENCE", "ANALOGY", "MATRIX")
+
+
+class _FamilyBatch:
+    """
+    Row-aligned encodings for the questions of one family: flat int lists
+    for questions encoded one at a time plus whole chunks from the column
+    encoders, concatenated and reshaped once in to_arrays().
+
+    option_keys identify options (equal key = equal option), values are
+    stem rotations (ODD_ONE_OUT: signature keys, COMPOSITION: target key).
+    Rows need not be in order; each carries its question's position.
+    """
+
+    _COLUMNS = ("rows", "option_keys", "option_rotations", "correct_index", "values")
+
+    def __init__(self, family: str):
+        self.family = family
+        self.rows: List[int] = []
+        self.option_keys: List[int] = []
+        self.option_rotations: List[int] = []
+        self.correct_index: List[int] = []
+        self.values: List[int] = []
+        self._chunks: List[Tuple] = []
+
+    def add_chunk(self, *columns) -> None:
+        """Flat columns for a chunk of questions, in _COLUMNS order."""
+        self._chunks.append(columns)
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        parts = [tuple(getattr(self, name) for name in self._COLUMNS), *self._chunks]
+        rows, option_keys, option_rotations, correct_index, values = (
+            np.concatenate([np.asarray(column, dtype=np.int64) for column in columns])
+            for columns in zip(*parts)
+        )
+        count = len(rows)
+        arrays = {
+            "rows": rows,
+            "option_keys": option_keys.reshape(count, 4),
+            "correct_index": correct_index,
+            "values": values.reshape((count, *_VALUE_SHAPE[self.family])),
+        }
+        if self.family in _ROTATION_FAMILIES:
+            arrays["option_rotations"] = option_rotations.reshape(count, 4)
+        return arrays
+
+
+def _encode(question: Dict[str, Any], row: int, batches: Dict[str, _FamilyBatch], ids: _KeyIds) -> Optional[str]:
+    """
+    Add `question` (the fields of a CompactQuestion, at position `row`) to
+    its family batch. Returns a failure reason for
+    structural problems; raises _Fallback, LookupError, TypeError or
+    AttributeError when the question needs the scalar path. Nothing is
+    added to a batch until the whole question has been encoded.
+    """
+    options = question["options"]
+    if len(options) != 4:
+        return REASON_OPTION_COUNT
+    correct_index = question["correct_index"]
+    if type(correct_index) is not int:
+        raise _Fallback()  # bools and floats index differently per family
+    if not 0 <= correct_index <= 3:
+        return REASON_CORRECT_INDEX
+
+    family = question["pattern_family"]
+    stem = question["stem"]
+    read = _PackedItems
+    option_rotations = ()
+    if family == "SEQUENCE":
+        rotations = _PackedColumns.rotations(stem["items"])
+        keys, option_rotations = read.option_keys(options)
+        values = (rotations[0], rotations[1], rotations[-1])
+    elif family == "ANALOGY":
+        keys, option_rotations = read.option_keys(options)
+        values = _PackedColumns.rotations((stem["A"], stem["B"], stem["C"]))
+    elif family == "MATRIX":
+        cells = stem.get("cells") or stem["items"]
+        if len(cells) != 3 or any(len(r) != 3 for r in cells):
+            raise _Fallback()
+        values = read.cells(cells)
+        if values.count(MISSING_CELL) > 1:
+            raise _Fallback()
+        keys, option_rotations = read.option_keys(options)
+    elif family == "ODD_ONE_OUT":
+        items = stem["items"]
+        keys = None
+        option_keys = [o["ref_index"] for o in options]
+        if len(items) != 4 or any(len(o) != 1 for o in options) or any(not 0 <= ref <= 3 for ref in option_keys):
+            raise _Fallback()
+        values = ids.of(read.keys(items))
+    elif family == "COMPOSITION":
+        inputs = stem.get("inputs")
+        if stem.get("operation") != "UNION" or not isinstance(inputs, read.sequence_type) or len(inputs) != 2:
+            return REASON_COMPOSITION_STEM
+        keys = []
+        for option in options:
+            if option.get("type") != "composite":
+                raise _Fallback()
+            keys.append(("composite", read.composite_key(option.get("items", ()))))
+        values = (ids.one(("composite", read.composite_key(inputs))),)
+    else:
+        return f"Unknown pattern_family: {family}"
+
+    if keys is not None:
+        option_keys = ids.of(keys)
+    batch = batches.get(family)
+    if batch is None:
+        batch = batches[family] = _FamilyBatch(family)
+    batch.rows.append(row)
+    batch.option_keys.extend(option_keys)
+    batch.option_rotations.extend(option_rotations)
+    batch.correct_index.append(correct_index)
+    batch.values.extend(values)
+    return None
+
+
+# Column-at-a-time encoding. Each _columns_* function takes a chunk of
+# same-family questions and returns flat (option_keys, option_rotations,
+# values) lists, working with NumPy over the item codes instead of
+# per-question Python. Anything the fast path cannot prove equivalent (mixed
+# option layouts, a missing key, an unpacked item, ...) raises, and the chunk
+# is encoded one question at a time instead.
+
+# Small enough that the passes over one chunk stay in cache.
+_COLUMN_CHUNK = 256
+
+
+def _codes(items) -> np.ndarray:
+    codes = list(items)
+    if set(map(type, codes)) != {PackedItem}:
+        raise _Fallback()
+    return np.fromiter(codes, dtype=np.int64, count=len(codes))
+
+
+class _PackedColumns:
+    """
+    Column readers for CompactQuestions. A PackedItem's code identifies the
+    item exactly, so codes serve as signatures directly, and as option keys
+    once symmetric rotations are folded together (_VISUAL_CODES).
+    """
+
+    @staticmethod
+    def rotations(items) -> np.ndarray:
+        return ((_codes(items) >> 2) & 0b111) * ROTATION_STEP
+
+    @staticmethod
+    def options(options) -> Tuple[np.ndarray, np.ndarray]:
+        codes = _codes(options)
+        return _VISUAL_CODES[codes], ((codes >> 2) & 0b111) * ROTATION_STEP
+
+    @staticmethod
+    def signatures(items) -> np.ndarray:
+        return _codes(items)
+
+    @staticmethod
+    def composite_keys(item_lists) -> List[Tuple]:
+        pairs = iter((_VISUAL_CODES[_codes(chain.from_iterable(item_lists))] & _SHAPE_ROTATION_MASK).tolist())
+        return list(zip(repeat("composite"), map(tuple, map(islice, repeat(pairs), map(len, item_lists)))))
+
+
+def _columns_sequence(stems, options, ids):
+    item_lists = list(map(itemgetter("items"), stems))
+    lengths = np.fromiter(map(len, item_lists), dtype=np.int64, count=len(item_lists))
+    if lengths.min() < 2:
+        raise _Fallback()
+    rotations = np.array(_PackedColumns.rotations(chain.from_iterable(item_lists)), dtype=np.int64)
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+    values = np.stack([rotations[starts], rotations[starts + 1], rotations[ends - 1]], axis=1)
+    return (*_PackedColumns.options(options), values.ravel())
+
+
+def _columns_analogy(stems, options, ids):
+    terms = chain.from_iterable(map(itemgetter("A", "B", "C"), stems))
+    return (*_PackedColumns.options(options), _PackedColumns.rotations(terms))
+
+
+def _columns_matrix(stems, options, ids):
+    grids = list(map(itemgetter("cells"), stems))
+    rows = list(chain.from_iterable(grids))
+    if set(map(len, grids)) != {3} or set(map(len, rows)) != {3}:
+        raise _Fallback()
+    cells = list(chain.from_iterable(rows))
+    present = np.fromiter(map(is_not, cells, repeat(None)), dtype=bool, count=len(cells))
+    if (~present).reshape(-1, 9).sum(axis=1).max() > 1:
+        raise _Fallback()
+    values = np.full(len(cells), MISSING_CELL, dtype=np.int64)
+    values[present] = _PackedColumns.rotations(compress(cells, present))
+    return (*_PackedColumns.options(options), values)
+
+
+def _columns_odd_one_out(stems, options, ids):
+    if set(map(frozenset, options)) != {frozenset(("ref_index",))}:
+        raise _Fallback()
+    refs = list(map(itemgetter("ref_index"), options))
+    if set(map(type, refs)) != {int} or min(refs) < 0 or max(refs) > 3:
+        raise _Fallback()
+    item_lists = list(map(itemgetter("items"), stems))
+    if set(map(len, item_lists)) != {4}:
+        raise _Fallback()
+    return refs, (), _PackedColumns.signatures(list(chain.from_iterable(item_lists)))
+
+
+def _columns_composition(stems, options, ids):
+    inputs = list(map(itemgetter("inputs"), stems))
+    if (
+        set(map(itemgetter("operation"), stems)) != {"UNION"}
+        or set(map(type, inputs)) != {tuple}
+        or set(map(len, inputs)) != {2}
+        or set(map(itemgetter("type"), options)) != {"composite"}
+    ):
+        raise _Fallback()
+    option_keys = ids.of(_PackedColumns.composite_keys(list(map(itemgetter("items"), options))))
+    return option_keys, (), ids.of(_PackedColumns.composite_keys(inputs))
+
+
+_COLUMN_ENCODERS = {
+    "SEQUENCE": _columns_sequence,
+    "ANALOGY": _columns_analogy,
+    "MATRIX": _columns_matrix,
+    "ODD_ONE_OUT": _columns_odd_one_out,
+    "COMPOSITION": _columns_composition,
+}
+
+
+def _encode_columns(family: str, questions: List[CompactQuestion], rows: List[int], batch: "_FamilyBatch", ids) -> None:
+    """
+    Add a chunk of questions of one `family` to `batch`, or raise (leaving
+    the batch untouched) if any of them needs per-question handling.
+    """
+    option_lists = list(map(attrgetter("options"), questions))
+    correct_index = list(map(attrgetter("correct_index"), questions))
+    if set(map(len, option_lists)) != {4} or set(map(type, correct_index)) != {int}:
+        raise _Fallback()
+    if min(correct_index) < 0 or max(correct_index) > 3:
+        raise _Fallback()
+    option_keys, option_rotations, values = _COLUMN_ENCODERS[family](
+        list(map(attrgetter("stem"), questions)), list(chain.from_iterable(option_lists)), ids
+    )
+    batch.add_chunk(rows, option_keys, option_rotations, correct_index, values)
+
+
+def _keyed_single_match(matches: np.ndarray, correct_index: np.ndarray) -> np.ndarray:
+    rows = np.arange(len(correct_index))
+    return (matches.sum(axis=1) == 1) & matches[rows, correct_index]
+
+
+def _check_family(family: str, arrays: Dict[str, np.ndarray]) -> np.ndarray:
+    correct_index = arrays["correct_index"]
+    option_keys = arrays["option_keys"]
+    values = arrays["values"]
+    ordered = np.sort(option_keys, axis=1)
+    duplicate = (ordered[:, 1:] == ordered[:, :-1]).any(axis=1)
+
+    reason = np.full(len(correct_index), None, dtype=object)
+    reason[duplicate] = REASON_DUPLICATE_OPTIONS
+    pending = ~duplicate
+
+    if family in ("SEQUENCE", "ANALOGY"):
+        first, second, base = values.T
+        expected = (base + (second - first) % 360) % 360
+        ok = _keyed_single_match(arrays["option_rotations"] == expected[:, None], correct_index)
+        reason[pending & ~ok] = REASON_RULE_ANSWER
+    elif family == "MATRIX":
+        missing = values == MISSING_CELL
+        grid = values
+        rows = np.arange(len(grid))
+        flat_missing = missing.reshape(len(grid), 9)
+        has_missing = flat_missing.any(axis=1)
+        first_missing = flat_missing.argmax(axis=1)
+        missing_row, missing_col = first_missing // 3, first_missing % 3
+
+        row_first = grid[rows, missing_row, _OTHER[missing_col, 0]]
+        row_last = grid[rows, missing_row, _OTHER[missing_col, 1]]
+        row_based = (row_last + (row_last - row_first) % 360) % 360
+
+        col_first = grid[rows, _OTHER[missing_row, 0], missing_col]
+        col_second = grid[rows, _OTHER[missing_row, 1], missing_col]
+        column_based = (col_first - (col_second - col_first) % 360) % 360
+
+        reason[pending & ~has_missing] = REASON_NO_MISSING_CELL
+        pending &= has_missing
+        disagree = row_based != column_based
+        reason[pending & disagree] = REASON_MATRIX_DISAGREE
+        pending &= ~disagree
+        ok = _keyed_single_match(arrays["option_rotations"] == row_based[:, None], correct_index)
+        reason[pending & ~ok] = REASON_RULE_ANSWER
+    elif family == "ODD_ONE_OUT":
+        odd = values[np.arange(len(values)), correct_index]
+        option_signatures = np.take_along_axis(values, option_keys, axis=1)
+        ok = (option_signatures == odd[:, None]).sum(axis=1) == 1
+        reason[pending & ~ok] = REASON_ODD_NOT_UNIQUE
+    elif family == "COMPOSITION":
+        ok = _keyed_single_match(option_keys == values[:, None], correct_index)
+        reason[pending & ~ok] = REASON_RULE_ANSWER
+
+    return reason
+
+
+class EncodedBatch:
+    """
+    Array form of a question batch: per-family arrays plus the verdicts that
+    were already decided while encoding (structural failures, scalar fallbacks).
+    """
+
+    def __init__(self, size: int, families: Dict[str, Dict[str, np.ndarray]], decided: List[Optional[str]]):
+        self.size = size
+        self.families = families
+        self.decided = decided
+
+    def save(self, path: Path) -> None:
+        arrays = {
+            f"{family}.{name}": array
+            for family, family_arrays in self.families.items()
+            for name, array in family_arrays.items()
+        }
+        arrays["version"] = np.array(ENCODING_VERSION)
+        arrays["size"] = np.array(self.size)
+        arrays["decided"] = np.array(json.dumps(self.decided))
+        np.savez_compressed(path, **arrays)
+
+    @classmethod
+    def load(cls, path: Path) -> "EncodedBatch":
+        families: Dict[str, Dict[str, np.ndarray]] = {}
+        with np.load(path, allow_pickle=False) as data:
+            version = int(data["version"]) if "version" in data.files else 1
+            if version != ENCODING_VERSION:
+                raise ValueError(f"{path}: encoding version {version}, expected {ENCODING_VERSION}; re-encode the bank")
+            for key in data.files:
+                if "." in key:
+                    family, name = key.split(".", 1)
+                    families.setdefault(family, {})[name] = data[key]
+            return cls(int(data["size"]), families, json.loads(str(data["decided"])))
+
+
+def _group_by_family(questions) -> Dict[Optional[str], List[int]]:
+    """
+    Positions of the CompactQuestions per pattern_family; dict questions and
+    anything of no known family are grouped under None.
+    """
+    groups: Dict[Optional[str], List[int]] = {}
+    for row, question in enumerate(questions):
+        family = question.pattern_family if isinstance(question, CompactQuestion) else None
+        groups.setdefault(family if family in _COLUMN_ENCODERS else None, []).append(row)
+    return groups
+
+
+def encode_questions(questions: List[Union[Dict[str, Any], CompactQuestion]]) -> EncodedBatch:
+    """
+    Encode `questions` into per-family arrays. CompactQuestions are grouped
+    by family and encoded a chunk at a time; chunks that do not fit the
+    column encoding are encoded one question at a time. Dict questions, and
+    questions of no known family, are decided by validate_question here.
+    """
+    decided: List[Optional[str]] = [None] * len(questions)
+    batches: Dict[str, _FamilyBatch] = {}
+    ids = _KeyIds()
+    one_at_a_time: List[int] = []
+
+    for family, rows in _group_by_family(questions).items():
+        if family is None:
+            for i in rows:
+                decided[i] = _scalar_reason(questions[i])
+            continue
+        batch = batches.setdefault(family, _FamilyBatch(family))
+        for start in range(0, len(rows), _COLUMN_CHUNK):
+            chunk = rows[start:start + _COLUMN_CHUNK]
+            try:
+                _encode_columns(family, list(map(questions.__getitem__, chunk)), chunk, batch, ids)
+            except (_Fallback, LookupError, TypeError, AttributeError, ValueError):
+                one_at_a_time.extend(chunk)
+
+    for i in one_at_a_time:
+        question = questions[i]
+        fields = {
+            "pattern_family": question.pattern_family,
+            "stem": question.stem,
+            "options": question.options,
+            "correct_index": question.correct_index,
+        }
+        try:
+            decided[i] = _encode(fields, i, batches, ids)
+        except (_Fallback, LookupError, TypeError, AttributeError):
+            decided[i] = _scalar_reason(question)
+
+    families = {family: batch.to_arrays() for family, batch in batches.items()}
+    return EncodedBatch(len(questions), families, decided)
+
+
+def validate_encoded(encoded: EncodedBatch) -> Tuple[np.ndarray, List[Optional[str]]]:
+    """
+    Run the vectorized checks over an EncodedBatch.
+    Returns (mask, reasons) as validate_questions_batch does.
+    """
+    reasons = list(encoded.decided)
+    for family, arrays in encoded.families.items():
+        for row, reason in zip(arrays["rows"].tolist(), _check_family(family, arrays)):
+            reasons[row] = reason
+
+    mask = np.array([reason is None for reason in reasons], dtype=bool)
+    return mask, reasons
+
+
+def validate_questions_batch(
+    questions: List[Union[Dict[str, Any], CompactQuestion]],
+) -> Tuple[np.ndarray, List[Optional[str]]]:
+    """
+    Validate many questions at once. Only CompactQuestions take the
+    vectorized path; dicts are checked with validate_question.
+
+    Returns (mask, reasons): mask[i] is True when questions[i] passes
+    validate_question; reasons[i] is None for valid questions and a short
+    failure description otherwise.
+    """
+    return validate_encoded(encode_questions(questions))
+
+
+def _scalar_reason(question) -> Optional[str]:
+    if isinstance(question, CompactQuestion):
+        question = question.to_dict()
+    try:
+        validate_question(question)
+    except AssertionError as exc:
+        return _assertion_reason(exc)
+    except Exception as exc:  # malformed question: invalid, never fatal for an audit
+        return f"{type(exc).__name__}: {exc}"
+    return None
@@ -0,0 +1,155 @@
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+DEFAULT_PATTERNS_PATH = Path(__file__).with_name("patterns.json")
+VALID_DIFFICULTIES = ("easy", "medium", "hard")
+
+# patterns.json predates parts of the README schema: "shape" stands in for
+# "base_shapes", and ODD_ONE_OUT entries carry no transformations or
+# distractor rules. Only the keys every entry really has are required; the
+# remaining README keys are type-checked when present.
+REQUIRED_KEYS = ("pattern_id", "question_type", "difficulty")
+OPTIONAL_LIST_KEYS = ("base_shapes", "transformations", "distractor_rules")
+
+
+def validate_pattern(schema: Dict[str, Any]) -> None:
+    """
+    Check one patterns.json entry against the canonical schema.
+    Raises ValueError describing the first problem found.
+    """
+    if not isinstance(schema, dict):
+        raise ValueError(f"Pattern must be an object, got {type(schema).__name__}")
+
+    pattern_id = schema.get("pattern_id", "<unknown>")
+    for key in REQUIRED_KEYS:
+        if key not in schema:
+            raise ValueError(f"Pattern {pattern_id} is missing required key: {key}")
+
+    if schema["difficulty"] not in VALID_DIFFICULTIES:
+        raise ValueError(
+            f"Pattern {pattern_id} has unsupported difficulty: {schema['difficulty']}"
+        )
+
+    for key in OPTIONAL_LIST_KEYS:
+        if key in schema and not isinstance(schema[key], list):
+            raise ValueError(f"Pattern {pattern_id}: {key} must be a list")
+
+    for transformation in schema.get("transformations", []):
+        if not isinstance(transformation, dict) or "type" not in transformation:
+            raise ValueError(f"Pattern {pattern_id}: every transformation needs a type")
+
+    if "level" in schema and not isinstance(schema["level"], int):
+        raise ValueError(f"Pattern {pattern_id}: level must be an integer")
+
+
+class PatternCatalog:
+    """
+    Parsed, validated view of patterns.json with lookup indexes.
+
+    The file is parsed once; refresh() re-reads it only when its mtime
+    changes, so callers can ask for the catalog on every question.
+    """
+
+    def __init__(self, path: Path = DEFAULT_PATTERNS_PATH):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._mtime_ns: Optional[int] = None
+        self.patterns: List[Dict[str, Any]] = []
+        self.by_question_type: Dict[str, List[Dict[str, Any]]] = {}
+        self.by_family: Dict[str, List[Dict[str, Any]]] = {}
+        self.by_level: Dict[int, List[Dict[str, Any]]] = {}
+        self.by_difficulty: Dict[str, List[Dict[str, Any]]] = {}
+        self.refresh()
+
+    def refresh(self) -> bool:
+        """
+        Reload the catalog if patterns.json changed on disk.
+        Returns True when a reload happened.
+        """
+        mtime_ns = os.stat(self.path).st_mtime_ns
+        if mtime_ns == self._mtime_ns:
+            return False
+
+        with self._lock:
+            if mtime_ns == self._mtime_ns:
+                return False
+            with self.path.open("r", encoding="utf-8") as file:
+                patterns = json.load(file)
+            if not isinstance(patterns, list):
+                raise ValueError(f"{self.path.name} must contain a list of patterns")
+            for schema in patterns:
+                validate_pattern(schema)
+            self._build_indexes(patterns)
+            self._mtime_ns = mtime_ns
+        return True
+
+    def _build_indexes(self, patterns: List[Dict[str, Any]]) -> None:
+        by_question_type: Dict[str, List[Dict[str, Any]]] = {}
+        by_family: Dict[str, List[Dict[str, Any]]] = {}
+        by_level: Dict[int, List[Dict[str, Any]]] = {}
+        by_difficulty: Dict[str, List[Dict[str, Any]]] = {}
+
+        for schema in patterns:
+            by_question_type.setdefault(schema["question_type"], []).append(schema)
+            by_difficulty.setdefault(schema["difficulty"], []).append(schema)
+            if "family" in schema:
+                by_family.setdefault(schema["family"], []).append(schema)
+            if "level" in schema:
+                by_level.setdefault(schema["level"], []).append(schema)
+
+        # Swap whole attributes so readers never see a half-built index.
+        self.patterns = patterns
+        self.by_question_type = by_question_type
+        self.by_family = by_family
+        self.by_level = by_level
+        self.by_difficulty = by_difficulty
+
+    def find(
+        self,
+        question_type: Optional[str] = None,
+        family: Optional[str] = None,
+        level: Optional[int] = None,
+        difficulty: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Patterns matching every given filter, in file order. Starts from the
+        smallest index list the filters select and checks the rest per
+        pattern.
+        """
+        filters = [
+            (self.by_question_type, "question_type", question_type),
+            (self.by_family, "family", family),
+            (self.by_level, "level", level),
+            (self.by_difficulty, "difficulty", difficulty),
+        ]
+        filters = [(index.get(value, []), key, value) for index, key, value in filters if value is not None]
+        if not filters:
+            return list(self.patterns)
+        filters.sort(key=lambda entry: len(entry[0]))
+        candidates = filters[0][0]
+        rest = [(key, value) for _, key, value in filters[1:]]
+        return [p for p in candidates if all(p.get(key) == value for key, value in rest)]
+
+
+_CATALOGS: Dict[Path, PatternCatalog] = {}
+_CATALOGS_LOCK = threading.Lock()
+
+
+def get_catalog(path: Path = DEFAULT_PATTERNS_PATH) -> PatternCatalog:
+    """
+    Process-wide catalog for `path`, refreshed if the file changed.
+    """
+    path = Path(path)
+    catalog = _CATALOGS.get(path)
+    if catalog is None:
+        with _CATALOGS_LOCK:
+            catalog = _CATALOGS.get(path)
+            if catalog is None:
+                catalog = PatternCatalog(path)
+                _CATALOGS[path] = catalog
+                return catalog
+    catalog.refresh()
+    return catalog
@@ -0,0 +1,145 @@
+"""
+Compact in-memory form of generator questions.
+
+Shape items ({"shape", "rotation", "reflect", "fill"}) are packed into small
+ints and lists become tuples; CompactQuestion.to_dict() rebuilds the exact
+dict contract that render_svg and app.py consume.
+"""
+from typing import Any, Dict
+
+from nvr_proto.validated import ValidatedQuestion, mark_validated
+
+SHAPE_CODES = ("triangle", "square", "circle")
+REFLECT_CODES = (None, "none", "horizontal", "vertical")
+FILL_CODES = (None, "outline", "solid")
+ROTATION_STEP = 45
+
+_ITEM_KEYS = frozenset(("shape", "rotation", "reflect", "fill"))
+_MISSING = object()
+
+
+class PackedItem(int):
+    """
+    One shape item as an int:
+    bits 0-1 shape, bits 2-4 rotation / 45, bits 5-6 reflect, bits 7-8 fill.
+    A None code means the key was absent from the original dict.
+    """
+
+    __slots__ = ()
+
+    @property
+    def shape(self) -> str:
+        return SHAPE_CODES[self & 0b11]
+
+    @property
+    def rotation(self) -> int:
+        return ((self >> 2) & 0b111) * ROTATION_STEP
+
+    @property
+    def reflect(self):
+        return REFLECT_CODES[(self >> 5) & 0b11]
+
+    @property
+    def fill(self):
+        return FILL_CODES[(self >> 7) & 0b11]
+
+    def to_dict(self) -> Dict[str, Any]:
+        item = {"shape": self.shape, "rotation": self.rotation}
+        reflect = self.reflect
+        if reflect is not None:
+            item["reflect"] = reflect
+        fill = self.fill
+        if fill is not None:
+            item["fill"] = fill
+        return item
+
+
+# Every distinct item is shared, so a packed item costs one pointer per use.
+_ITEM_CACHE: Dict[int, PackedItem] = {}
+
+
+def pack_item(item: Dict[str, Any]):
+    """
+    PackedItem for a plain shape item, or None if it cannot be packed
+    (extra keys, unknown values, or a rotation off the 45° grid).
+    """
+    if not _ITEM_KEYS.issuperset(item) or "shape" not in item or "rotation" not in item:
+        return None
+    rotation = item["rotation"]
+    if type(rotation) is not int or rotation % ROTATION_STEP or not 0 <= rotation < 360:
+        return None
+    try:
+        value = (
+            SHAPE_CODES.index(item["shape"])
+            | (rotation // ROTATION_STEP) << 2
+            | REFLECT_CODES.index(item.get("reflect")) << 5
+            | FILL_CODES.index(item.get("fill")) << 7
+        )
+    except ValueError:
+        return None
+    packed = _ITEM_CACHE.get(value)
+    if packed is None:
+        packed = _ITEM_CACHE.setdefault(value, PackedItem(value))
+    return packed
+
+
+def _pack(value):
+    if isinstance(value, dict):
+        packed = pack_item(value)
+        if packed is not None:
+            return packed
+        return {key: _pack(inner) for key, inner in value.items()}
+    if isinstance(value, list):
+        return tuple(_pack(inner) for inner in value)
+    return value
+
+
+def _unpack(value):
+    if isinstance(value, PackedItem):
+        return value.to_dict()
+    if isinstance(value, dict):
+        return {key: _unpack(inner) for key, inner in value.items()}
+    if isinstance(value, tuple):
+        return [_unpack(inner) for inner in value]
+    return value
+
+
+class CompactQuestion:
+    """
+    Slotted, packed form of a question dict. Round-trips exactly through
+    from_dict() / to_dict(); unknown top-level keys are kept in `extras`.
+    A ValidatedQuestion comes back out of to_dict() as a ValidatedQuestion.
+    """
+
+    __slots__ = (
+        "pattern_family",
+        "stem",
+        "options",
+        "correct_index",
+        "difficulty",
+        "explanation",
+        "extras",
+        "validated",
+    )
+
+    _CORE_FIELDS = ("pattern_family", "stem", "options", "correct_index", "difficulty", "explanation")
+
+    @classmethod
+    def from_dict(cls, question: Dict[str, Any]) -> "CompactQuestion":
+        compact = cls()
+        for field in cls._CORE_FIELDS:
+            setattr(compact, field, _pack(question[field]) if field in question else _MISSING)
+        extras = {key: value for key, value in question.items() if key not in cls._CORE_FIELDS}
+        compact.extras = _pack(extras) if extras else None
+        compact.validated = isinstance(question, ValidatedQuestion)
+        return compact
+
+    def to_dict(self) -> Dict[str, Any]:
+        question = {}
+        for field in self._CORE_FIELDS:
+            value = getattr(self, field)
+            if value is not _MISSING:
+                question[field] = _unpack(value)
+        if self.extras:
+            question.update(_unpack(self.extras))
+        return mark_validated(question) if self.validated else question
@@ -11,5 +11,20 @@ _svg_options = components.declare_component(
 )
 
 
-def svg_options(svg_html: str, height: int = 420) -> str | None:
-    return _svg_options(svg_html=svg_html, height=height)
+def svg_options(
+    svg_html: str,
+    height: int = 420,
+    disabled: bool = False,
+    key: str | None = None,
+) -> str | None:
+    """
+    Show `svg_html` and return the letter ("A".."D") of the last clicked
+    #option-X element, or None. Clicks are ignored while `disabled`.
+    """
+    return _svg_options(
+        svg_html=svg_html,
+        height=height,
+        disabled=disabled,
+        key=key,
+        default=None,
+    )
@@ -1,44 +1,231 @@
+"""
+Shared Postgres connections.
+
+All repository code borrows connections from one process-wide pool instead
+of opening a new one per statement:
+
+    with connection() as conn:
+        with conn:                      # transaction: commit / rollback
+            with conn.cursor() as cur:
+                cur.execute(...)
+
+Pool size and behaviour come from the environment:
+
+    NVR_DB_POOL_MIN              connections opened up front (default 1)
+    NVR_DB_POOL_MAX              hard cap on open connections (default 10)
+    NVR_DB_POOL_TIMEOUT          seconds to wait for a free connection (default 10)
+    NVR_DB_HEALTHCHECK_IDLE      idle seconds after which a connection is
+                                 pinged with SELECT 1 before reuse (default 30)
+"""
+import atexit
 import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
 
 import psycopg2
+from psycopg2 import extensions, pool
 from dotenv import load_dotenv
 
 load_dotenv()
 
+POOL_MIN = int(os.environ.get("NVR_DB_POOL_MIN", "1"))
+POOL_MAX = int(os.environ.get("NVR_DB_POOL_MAX", "10"))
+POOL_TIMEOUT = float(os.environ.get("NVR_DB_POOL_TIMEOUT", "10"))
+HEALTHCHECK_IDLE = float(os.environ.get("NVR_DB_HEALTHCHECK_IDLE", "30"))
 
-def get_db_connection():
+
+def _database_url() -> str:
     url = os.environ.get("DATABASE_URL")
     if not url:
         raise RuntimeError("DATABASE_URL not set")
-    return psycopg2.connect(url)
+    return url
 
 
-def init_nvr_tables():
-    conn = get_db_connection()
+def get_db_connection():
+    """
+    A dedicated, unpooled connection; the caller closes it. For scripts and
+    long-lived work that should not hold a pool slot. Request-path code
+    uses connection().
+    """
+    return psycopg2.connect(_database_url())
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool over psycopg2's ThreadedConnectionPool.
+
+    ThreadedConnectionPool raises as soon as `maxconn` connections are out;
+    a semaphore in front of it makes callers wait up to `timeout` seconds
+    instead. Connections idle for longer than `healthcheck_idle` seconds are
+    pinged before reuse, and broken ones are replaced.
+    """
+
+    def __init__(
+        self,
+        dsn: str,
+        minconn: int = POOL_MIN,
+        maxconn: int = POOL_MAX,
+        timeout: float = POOL_TIMEOUT,
+        healthcheck_idle: float = HEALTHCHECK_IDLE,
+    ):
+        if not 0 <= minconn <= maxconn or maxconn < 1:
+            raise ValueError(f"Invalid pool size: min={minconn} max={maxconn}")
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.healthcheck_idle = healthcheck_idle
+        self._pool = pool.ThreadedConnectionPool(minconn, maxconn, dsn)
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        self._returned_at: Dict[int, float] = {}
+        self._stats = {
+            "checkouts": 0,
+            "timeouts": 0,
+            "discarded": 0,
+            "wait_total_ms": 0.0,
+            "wait_max_ms": 0.0,
+        }
+
+    def _healthy(self, conn) -> bool:
+        if conn.closed:
+            return False
+        returned_at = self._returned_at.get(id(conn))
+        if returned_at is None or time.monotonic() - returned_at < self.healthcheck_idle:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn) -> None:
+        self._returned_at.pop(id(conn), None)
+        self._pool.putconn(conn, close=True)
+        with self._lock:
+            self._stats["discarded"] += 1
+
+    def getconn(self):
+        """
+        Check out a connection, waiting for a free slot. Every successful
+        call must be matched by putconn().
+        """
+        started = time.perf_counter()
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self._stats["timeouts"] += 1
+            raise pool.PoolError(f"No database connection free after {self.timeout}s")
+        waited_ms = (time.perf_counter() - started) * 1000
+        try:
+            conn = self._pool.getconn()
+            while not self._healthy(conn):
+                self._discard(conn)
+                conn = self._pool.getconn()
+        except BaseException:
+            self._slots.release()
+            raise
+        with self._lock:
+            stats = self._stats
+            stats["checkouts"] += 1
+            stats["wait_total_ms"] += waited_ms
+            stats["wait_max_ms"] = max(stats["wait_max_ms"], waited_ms)
+        return conn
+
+    def putconn(self, conn) -> None:
+        try:
+            if conn.closed:
+                self._discard(conn)
+                return
+            if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    self._discard(conn)
+                    return
+            self._returned_at[id(conn)] = time.monotonic()
+            self._pool.putconn(conn)
+        finally:
+            self._slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        checkouts = stats["checkouts"]
+        stats["wait_mean_ms"] = round(stats["wait_total_ms"] / checkouts, 3) if checkouts else 0.0
+        stats["wait_total_ms"] = round(stats["wait_total_ms"], 3)
+        stats["wait_max_ms"] = round(stats["wait_max_ms"], 3)
+        stats["in_use"] = len(self._pool._used)
+        stats["idle"] = len(self._pool._pool)
+        stats["max"] = self.maxconn
+        return stats
+
+    def close(self) -> None:
+        self._pool.closeall()
+        self._returned_at.clear()
+
+
+_POOL: Optional[ConnectionPool] = None
+_POOL_PID: Optional[int] = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """
+    The process-wide pool, created on first use. A forked child (e.g. a
+    worksheet worker) gets its own pool rather than the parent's sockets.
+    """
+    global _POOL, _POOL_PID
+    pid = os.getpid()
+    if _POOL is not None and _POOL_PID == pid:
+        return _POOL
+    with _POOL_LOCK:
+        if _POOL is None or _POOL_PID != pid:
+            _POOL = ConnectionPool(_database_url())
+            _POOL_PID = pid
+        return _POOL
+
+
+def close_pool() -> None:
+    global _POOL, _POOL_PID
+    with _POOL_LOCK:
+        if _POOL is not None and _POOL_PID == os.getpid():
+            _POOL.close()
+        _POOL = None
+        _POOL_PID = None
+
+
+atexit.register(close_pool)
+
+
+@contextmanager
+def connection() -> Iterator[Any]:
+    """
+    Borrow a pooled connection for the duration of the block. Anything left
+    uncommitted is rolled back when the connection goes back to the pool.
+    """
+    db_pool = get_pool()
+    conn = db_pool.getconn()
     try:
-        with conn.cursor() as cur:
-            cur.execute(
-                """
-                CREATE TABLE IF NOT EXISTS nvr_users (
-                  id SERIAL PRIMARY KEY,
-                  email TEXT UNIQUE,
-                  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                );
-                """
-            )
-            cur.execute(
-                """
-                CREATE TABLE IF NOT EXISTS nvr_attempts (
-                  id SERIAL PRIMARY KEY,
-                  user_id INTEGER,
-                  pattern_id TEXT,
-                  family TEXT,
-                  level INTEGER,
-                  is_correct BOOLEAN,
-                  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                );
-                """
-            )
-            conn.commit()
+        yield conn
     finally:
-        conn.close()
+        db_pool.putconn(conn)
+
+
+def pool_stats() -> Dict[str, Any]:
+    """
+    Checkout counts and wait times of the shared pool (empty before first use).
+    """
+    if _POOL is None or _POOL_PID != os.getpid():
+        return {}
+    return _POOL.stats()
+
+
+def init_nvr_tables():
+    """
+    Bring the schema up to date (once per process); see nvr_proto.migrations.
+    """
+    from nvr_proto.migrations import ensure_schema
+
+    ensure_schema()
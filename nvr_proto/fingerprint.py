@@ -0,0 +1,106 @@
+"""
+Stable question fingerprints and per-user "already seen" sets.
+"""
+import hashlib
+import json
+import math
+from typing import Any, Dict
+
+FINGERPRINT_BYTES = 16
+
+
+def _encode(value: Any) -> str:
+    return json.dumps(value, sort_keys=True, separators=(",", ":"))
+
+
+def question_fingerprint(question: Dict[str, Any]) -> bytes:
+    """
+    16-byte content hash of family, stem and options.
+
+    Options are hashed in canonical (sorted) order, so the same question with
+    its options shuffled differently has the same fingerprint.
+    """
+    canonical = _encode(
+        [
+            question.get("pattern_family"),
+            question.get("stem"),
+            sorted(_encode(option) for option in question.get("options", [])),
+        ]
+    )
+    return hashlib.blake2b(canonical.encode("utf-8"), digest_size=FINGERPRINT_BYTES).digest()
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over fingerprints.
+    Bit positions come from the fingerprint itself (double hashing).
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        assert capacity > 0 and 0 < error_rate < 1
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, fingerprint: bytes):
+        h1 = int.from_bytes(fingerprint[:8], "big")
+        h2 = int.from_bytes(fingerprint[8:16], "big") | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, fingerprint: bytes) -> None:
+        for position in self._positions(fingerprint):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, fingerprint: bytes) -> bool:
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(fingerprint)
+        )
+
+
+class SeenSet:
+    """
+    Fingerprints a user has already been shown.
+
+    Exact up to `exact_limit` entries; past that it moves into a Bloom filter
+    sized for `bloom_capacity`, so memory stays bounded for long-lived users
+    at the cost of rare false "seen" answers.
+    """
+
+    def __init__(self, exact_limit: int = 50_000, bloom_capacity: int = 1_000_000, error_rate: float = 0.001):
+        self.exact_limit = exact_limit
+        self.bloom_capacity = bloom_capacity
+        self.error_rate = error_rate
+        self._exact = set()
+        self._bloom = None
+
+    def __len__(self) -> int:
+        return self._bloom.count if self._bloom is not None else len(self._exact)
+
+    def __contains__(self, fingerprint: bytes) -> bool:
+        if self._bloom is not None:
+            return fingerprint in self._bloom
+        return fingerprint in self._exact
+
+    def add(self, fingerprint: bytes) -> None:
+        if self._bloom is not None:
+            self._bloom.add(fingerprint)
+            return
+        self._exact.add(fingerprint)
+        if len(self._exact) > self.exact_limit:
+            bloom = BloomFilter(max(self.bloom_capacity, len(self._exact)), self.error_rate)
+            for seen in self._exact:
+                bloom.add(seen)
+            self._bloom = bloom
+            self._exact = set()
+
+    def seen_question(self, question: Dict[str, Any]) -> bool:
+        return question_fingerprint(question) in self
+
+    def add_question(self, question: Dict[str, Any]) -> None:
+        self.add(question_fingerprint(question))
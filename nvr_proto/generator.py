@@ -1,11 +1,25 @@
-import json
 import random
+import threading
+import traceback
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+from nvr_proto.catalog import get_catalog
+from nvr_proto.compact import CompactQuestion
+from nvr_proto.fingerprint import question_fingerprint
+from nvr_proto.geometry import shape_key
+from nvr_proto.validated import STRICT_VALIDATION, is_trusted, mark_validated
+
 PATTERNS_PATH = Path(__file__).with_name("patterns.json")
 FAMILIES = ["SEQUENCE", "ODD_ONE_OUT", "MATRIX", "ANALOGY", "COMPOSITION"]
 DIFFICULTY_LEVELS = ["easy", "medium", "hard"]
 SHAPES = ["triangle", "square", "circle"]
+# Shapes with at least four visually distinct 45° orientations.
+ROTATABLE_SHAPES = [
+    shape for shape in SHAPES
+    if len({shape_key(shape, rotation) for rotation in range(0, 360, 45)}) >= 4
+]
 PATTERN_WEIGHTS = {
     "easy": {
         "SEQUENCE": 4,
@@ -45,22 +59,23 @@ def apply_rotation(value, step):
     return (value + step) % 360
 
 
-def choose_single_shape(difficulty):
+def choose_single_shape(difficulty, rng=random):
     """
-    Single shape per question.
+    Single shape per question. The rotation families need four options that
+    look different, so only shapes with that many orientations qualify.
     """
     if difficulty == "easy":
         return "triangle"
-    return random.choice(SHAPES)
+    return rng.choice(ROTATABLE_SHAPES)
 
 
-def choose_shape_pair(difficulty):
+def choose_shape_pair(difficulty, rng=random):
     """
     Two shapes max, only for medium+ difficulty.
     """
     if difficulty == "easy":
         return ["triangle"]
-    return random.sample(SHAPES, 2)
+    return rng.sample(SHAPES, 2)
 
 
 def validate_shape_usage(items):
@@ -84,19 +99,31 @@ def _cell(rotation, shape):
     }
 
 
+def _shape_key(shape, rotation):
+    """
+    geometry.shape_key, or the raw pair for shapes or angles it cannot draw.
+    """
+    try:
+        return shape_key(shape, rotation)
+    except (ValueError, TypeError):
+        return (shape, rotation)
+
+
+def _composite_key(items):
+    return tuple(_shape_key(item.get("shape"), item.get("rotation")) for item in items)
+
+
 def _rotation_key(option):
+    """
+    What an option looks like: a square at 0° and 90°, or a circle at any
+    angle, share a key.
+    """
     if option.get("type") == "composite":
-        items = option.get("items", [])
-        normalized_items = tuple(
-            (item.get("shape"), item.get("rotation"))
-            for item in items
-        )
-        return ("composite", normalized_items)
+        return ("composite", _composite_key(option.get("items", [])))
     if "ref_index" in option:
         return ("ref", option["ref_index"])
     return (
-        option.get("shape"),
-        option.get("rotation"),
+        _shape_key(option.get("shape"), option.get("rotation")),
         option.get("reflect"),
         option.get("fill"),
     )
@@ -116,21 +143,46 @@ def all_options_unique(options):
     return len({str(option) for option in options}) == 4
 
 
-def _exactly_one_correct(options, correct_rotation):
-    matches = [opt for opt in options if opt.get("rotation") == correct_rotation]
+def _exactly_one_correct(options, correct_rotation, correct_index=None):
+    matches = [i for i, opt in enumerate(options) if opt.get("rotation") == correct_rotation]
+    if correct_index is not None and matches != [correct_index]:
+        return False
     return len(matches) == 1
 
 
-def _exactly_one_composition_match(options, correct_items):
-    correct_key = tuple((item.get("shape"), item.get("rotation")) for item in correct_items)
-    matches = 0
-    for option in options:
+def _exactly_one_composition_match(options, correct_items, correct_index=None):
+    correct_key = _composite_key(correct_items)
+    matches = []
+    for i, option in enumerate(options):
         if option.get("type") != "composite":
             continue
-        option_key = tuple((item.get("shape"), item.get("rotation")) for item in option.get("items", []))
-        if option_key == correct_key:
-            matches += 1
-    return matches == 1
+        if _composite_key(option.get("items", [])) == correct_key:
+            matches.append(i)
+    if correct_index is not None and matches != [correct_index]:
+        return False
+    return len(matches) == 1
+
+
+def _pick_distractors(correct, candidates, count=3):
+    """
+    First `count` candidates that differ from the correct answer and from each
+    other. Callers pass an exhaustive tail of candidates, so this always fills.
+    """
+    used = {_rotation_key(correct)}
+    distractors = []
+    for candidate in candidates:
+        key = _rotation_key(candidate)
+        if key in used:
+            continue
+        distractors.append(candidate)
+        used.add(key)
+        if len(distractors) == count:
+            return distractors
+    raise ValueError("Not enough distinct distractor candidates")
+
+
+def _all_rotations_from(rotation):
+    return [apply_rotation(rotation, 45 * k) for k in range(1, 8)]
 
 
 def validate_question(question):
@@ -143,7 +195,7 @@ def validate_question(question):
         rotations = [item["rotation"] for item in question["stem"]["items"]]
         step = (rotations[1] - rotations[0]) % 360
         correct_rotation = apply_rotation(rotations[-1], step)
-        assert _exactly_one_correct(question["options"], correct_rotation)
+        assert _exactly_one_correct(question["options"], correct_rotation, question["correct_index"])
     elif family == "ODD_ONE_OUT":
         stem_items = question["stem"]["items"]
         odd_item = stem_items[question["correct_index"]]
@@ -198,7 +250,7 @@ def validate_question(question):
 
         if row_based != column_based:
             assert False, "Matrix rules disagree"
-        assert _exactly_one_correct(question["options"], row_based)
+        assert _exactly_one_correct(question["options"], row_based, question["correct_index"])
     elif family == "ANALOGY":
         stem = question["stem"]
         a_rot = stem["A"]["rotation"]
@@ -206,13 +258,13 @@ def validate_question(question):
         c_rot = stem["C"]["rotation"]
         step = (b_rot - a_rot) % 360
         correct_rotation = apply_rotation(c_rot, step)
-        assert _exactly_one_correct(question["options"], correct_rotation)
+        assert _exactly_one_correct(question["options"], correct_rotation, question["correct_index"])
     elif family == "COMPOSITION":
         stem = question["stem"]
         assert stem.get("operation") == "UNION"
         assert isinstance(stem.get("inputs"), list)
         assert len(stem["inputs"]) == 2
-        assert _exactly_one_composition_match(question["options"], stem["inputs"])
+        assert _exactly_one_composition_match(question["options"], stem["inputs"], question["correct_index"])
     else:
         raise AssertionError(f"Unknown pattern_family: {family}")
 
@@ -223,79 +275,388 @@ def validate_question_quality(question):
     assert len({str(option) for option in question["options"]}) == 4
 
 
+def ensure_validated(question):
+    """
+    `question` as a ValidatedQuestion, running validate_question_quality and
+    validate_question unless it already carries the marker (in strict mode
+    the checks always run). Raises AssertionError like the validators.
+    """
+    if is_trusted(question):
+        return question
+    validate_question_quality(question)
+    validate_question(question)
+    return mark_validated(question)
+
+
+class GenerationStats:
+    """
+    Thread-safe counters of generation attempts and rejections,
+    keyed by (family, difficulty).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+
+    def _entry(self, family, difficulty):
+        key = (family, difficulty)
+        entry = self._counters.get(key)
+        if entry is None:
+            entry = {"attempts": 0, "rejections": 0, "repeats": 0, "failures": Counter()}
+            self._counters[key] = entry
+        return entry
+
+    def record(self, family, difficulty, failure=None):
+        with self._lock:
+            entry = self._entry(family, difficulty)
+            entry["attempts"] += 1
+            if failure is not None:
+                entry["rejections"] += 1
+                entry["failures"][failure] += 1
+
+    def record_repeat(self, family, difficulty):
+        """
+        A valid question that was skipped because the user had already seen it.
+        """
+        with self._lock:
+            self._entry(family, difficulty)["repeats"] += 1
+
+    def merge(self, snapshot):
+        """
+        Add counters from another snapshot(), e.g. one returned by a worker process.
+        """
+        with self._lock:
+            for family, by_difficulty in snapshot.items():
+                for difficulty, counts in by_difficulty.items():
+                    entry = self._entry(family, difficulty)
+                    entry["attempts"] += counts["attempts"]
+                    entry["rejections"] += counts["rejections"]
+                    entry["repeats"] += counts.get("repeats", 0)
+                    entry["failures"].update(counts["failures"])
+
+    def snapshot(self):
+        with self._lock:
+            result = {}
+            for (family, difficulty), entry in sorted(self._counters.items()):
+                result.setdefault(family, {})[difficulty] = {
+                    "attempts": entry["attempts"],
+                    "rejections": entry["rejections"],
+                    "repeats": entry["repeats"],
+                    "failures": dict(entry["failures"].most_common()),
+                }
+            return result
+
+    def reset(self):
+        with self._lock:
+            self._counters = {}
+
+
+_STATS = GenerationStats()
+
+
+def get_generation_stats():
+    """
+    {family: {difficulty: {"attempts", "rejections", "repeats", "failures": {reason: count}}}}
+    for this process since start or the last reset.
+    """
+    return _STATS.snapshot()
+
+
+def reset_generation_stats():
+    _STATS.reset()
+
+
+def _assertion_reason(exc):
+    if str(exc):
+        return str(exc)
+    frame = traceback.extract_tb(exc.__traceback__)[-1]
+    return f"{frame.name}: {frame.line}"
+
+
 def load_patterns():
-    with PATTERNS_PATH.open("r", encoding="utf-8") as file:
-        return json.load(file)
+    return list(get_catalog(PATTERNS_PATH).patterns)
+
+
+def _patterns_by_type():
+    return get_catalog(PATTERNS_PATH).by_question_type
 
 
 # -------------------------------------------------
 # PUBLIC API (USED BY UI / STREAMLIT)
 # -------------------------------------------------
 
-def generate_question(difficulty="easy"):
+def generate_question(difficulty="easy", rng=random, seen=None):
     """
     Canonical NVR generator output.
     Returns ONLY clickable patterns (no MCQ).
+    If `seen` (a fingerprint.SeenSet) is given, questions already in it are
+    skipped and the returned question is added to it.
     """
 
     assert difficulty in DIFFICULTY_LEVELS
 
-    patterns = load_patterns()
-    patterns_by_type = {}
-    for schema in patterns:
-        patterns_by_type.setdefault(schema["question_type"], []).append(schema)
+    weights = PATTERN_WEIGHTS[difficulty]
+    return _generate_validated(
+        difficulty,
+        families=list(weights.keys()),
+        probs=list(weights.values()),
+        patterns_by_type=_patterns_by_type(),
+        rng=rng,
+        seen=seen,
+    )
+
 
-    for _ in range(20):
-        qtype = choose_pattern_family(difficulty)
-        question = generate_question_for_family(
-            qtype,
+def generate_questions(n, difficulty="easy", families=None, seed=None, seen=None):
+    """
+    Generate `n` validated questions in one call.
+
+    Uses a private random.Random(seed), so the same seed always yields the
+    same questions and concurrent callers never share RNG state.
+    `families` restricts the mix; weights still follow PATTERN_WEIGHTS.
+    `seen` works as in generate_question.
+    """
+    assert difficulty in DIFFICULTY_LEVELS
+    assert n >= 0
+
+    rng = random.Random(seed)
+    families, probs = _weighted_families(difficulty, families or FAMILIES)
+    patterns_by_type = _patterns_by_type()
+
+    return [
+        _generate_validated(
+            difficulty,
+            families=families,
+            probs=probs,
             patterns_by_type=patterns_by_type,
-            difficulty=difficulty,
+            rng=rng,
+            seen=seen,
         )
+        for _ in range(n)
+    ]
 
-        if question is None:
-            continue
 
-        try:
-            validate_question_quality(question)
-            validate_question(question)
-        except AssertionError:
-            continue
+# Shared by every question_stream(): a stream that is running low queues a
+# short refill task here instead of keeping a thread of its own.
+PREFETCH_WORKERS = 2
+_prefetch_pool = None
+_prefetch_lock = threading.Lock()
 
-        assert question["pattern_family"] in SUPPORTED_PATTERN_FAMILIES, (
-            f"Unsupported pattern family emitted: {question['pattern_family']}"
+
+def _get_prefetch_pool():
+    global _prefetch_pool
+    with _prefetch_lock:
+        if _prefetch_pool is None:
+            _prefetch_pool = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="nvr-question-prefetch")
+        return _prefetch_pool
+
+
+class QuestionStream:
+    """
+    Iterator over questions from `generate`, kept up to `buffer` ahead as
+    CompactQuestions. At most one refill task per stream runs on the shared
+    prefetch pool, so `generate` (and any RNG it uses) is never called
+    concurrently, and an idle stream holds no thread.
+    """
+
+    def __init__(self, generate, buffer):
+        self._generate = generate
+        self._buffer = buffer
+        self._ready = deque()
+        self._cond = threading.Condition()
+        self._filling = False
+        self._closed = False
+        self._error = None
+        with self._cond:
+            self._refill()
+
+    def _refill(self):
+        # Called with self._cond held.
+        if self._filling or self._closed or self._error is not None or len(self._ready) >= self._buffer:
+            return
+        self._filling = True
+        _get_prefetch_pool().submit(self._fill)
+
+    def _fill(self):
+        while True:
+            with self._cond:
+                if self._closed or len(self._ready) >= self._buffer:
+                    self._filling = False
+                    return
+            try:
+                item = self._generate()
+                if not isinstance(item, CompactQuestion):
+                    item = CompactQuestion.from_dict(item)
+            except Exception as exc:
+                with self._cond:
+                    self._error = exc
+                    self._filling = False
+                    self._cond.notify_all()
+                return
+            with self._cond:
+                self._ready.append(item)
+                self._cond.notify_all()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        with self._cond:
+            while not self._ready:
+                if self._closed:
+                    raise StopIteration
+                if self._error is not None:
+                    # Raised once, after the questions generated before it.
+                    error, self._closed = self._error, True
+                    raise error
+                self._refill()
+                self._cond.wait()
+            item = self._ready.popleft()
+            self._refill()
+            return item
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._ready.clear()
+            self._cond.notify_all()
+
+
+def question_stream(difficulty="easy", families=None, buffer=4, seed=None, seen=None):
+    """
+    Infinite iterator of validated questions, as CompactQuestions.
+
+    Families the process-wide question space enumerates are drawn from it
+    (an index lookup); others are generated and validated. Up to `buffer`
+    questions are prepared ahead on a thread pool shared by all streams, so
+    next() normally returns at once. Call close() to stop early.
+    `families`, `seed` and `seen` work as in generate_questions.
+    """
+    assert difficulty in DIFFICULTY_LEVELS
+    assert buffer > 0
+
+    rng = random.Random(seed)
+    families, probs = _weighted_families(difficulty, families or FAMILIES)
+
+    def generate():
+        return _generate_validated(
+            difficulty,
+            families=families,
+            probs=probs,
+            patterns_by_type=_patterns_by_type(),
+            rng=rng,
+            seen=seen,
+            space=None if STRICT_VALIDATION else _question_space(),
         )
 
+    return QuestionStream(generate, buffer)
+
+
+def _question_space():
+    # question_space imports this module.
+    from nvr_proto.question_space import get_question_space
+
+    return get_question_space()
+
+
+def _weighted_families(difficulty, allowed_families):
+    weights = PATTERN_WEIGHTS[difficulty]
+    families = [family for family in allowed_families if family in weights]
+    if not families:
+        families = list(allowed_families)
+    probs = [weights.get(family, 1) for family in families]
+    return families, probs
+
+
+def _generate_validated(difficulty, families, probs, patterns_by_type, rng, seen=None, space=None):
+    repeat = None
+    for _ in range(20):
+        qtype = rng.choices(families, weights=probs, k=1)[0]
+        fingerprint = None
+        if space is not None and space.size(qtype, difficulty):
+            # Enumerated and validated when the space was built.
+            question, fingerprint = space.draw(qtype, difficulty, rng)
+        else:
+            question = attempt_question(
+                qtype,
+                difficulty=difficulty,
+                patterns_by_type=patterns_by_type,
+                rng=rng,
+            )
+
+            if question is None:
+                continue
+
+            if STRICT_VALIDATION:
+                assert question["pattern_family"] in SUPPORTED_PATTERN_FAMILIES, (
+                    f"Unsupported pattern family emitted: {question['pattern_family']}"
+                )
+
+        if seen is not None:
+            if fingerprint is None:
+                fingerprint = question_fingerprint(question)
+            if fingerprint in seen:
+                _STATS.record_repeat(qtype, difficulty)
+                repeat = question
+                continue
+            seen.add(fingerprint)
+
         return question
 
+    # Small question spaces run out; a repeat beats failing the request.
+    if repeat is not None:
+        return repeat
+
     raise RuntimeError("Failed to generate a valid question after multiple attempts.")
 
 
-def generate_question_for_family(qtype, patterns_by_type=None, difficulty="easy"):
+def attempt_question(qtype, difficulty="easy", patterns_by_type=None, rng=random):
+    """
+    One generate-then-validate attempt for `qtype`, recorded in the
+    generation stats. Returns the question as a ValidatedQuestion, or None
+    if it was rejected.
+    """
+    failure = None
+    question = None
+    try:
+        question = generate_question_for_family(
+            qtype,
+            patterns_by_type=patterns_by_type,
+            difficulty=difficulty,
+            rng=rng,
+        )
+        if question is None:
+            failure = "builder returned None"
+        else:
+            # generate_question_for_family already ran the quality checks.
+            if STRICT_VALIDATION:
+                validate_question_quality(question)
+            validate_question(question)
+    except AssertionError as exc:
+        failure = _assertion_reason(exc)
+
+    _STATS.record(qtype, difficulty, failure)
+    return None if failure else mark_validated(question)
+
+
+def generate_question_for_family(qtype, patterns_by_type=None, difficulty="easy", rng=random):
     assert difficulty in DIFFICULTY_LEVELS
 
     if qtype == "SEQUENCE":
         if patterns_by_type is None:
-            patterns = load_patterns()
-            patterns_by_type = {}
-            for schema in patterns:
-                patterns_by_type.setdefault(schema["question_type"], []).append(schema)
-        schema = random.choice(patterns_by_type[qtype])
-        question = _sequence(schema, difficulty=difficulty)
+            patterns_by_type = _patterns_by_type()
+        schema = rng.choice(patterns_by_type[qtype])
+        question = _sequence(schema, difficulty=difficulty, rng=rng)
     elif qtype == "ODD_ONE_OUT":
         if patterns_by_type is None:
-            patterns = load_patterns()
-            patterns_by_type = {}
-            for schema in patterns:
-                patterns_by_type.setdefault(schema["question_type"], []).append(schema)
-        schema = random.choice(patterns_by_type[qtype])
-        question = _odd_one_out(schema, difficulty=difficulty)
+            patterns_by_type = _patterns_by_type()
+        schema = rng.choice(patterns_by_type[qtype])
+        question = _odd_one_out(schema, difficulty=difficulty, rng=rng)
     elif qtype == "MATRIX":
-        question = generate_matrix_question(difficulty=difficulty)
+        question = generate_matrix_question(difficulty=difficulty, rng=rng)
     elif qtype == "ANALOGY":
-        question = generate_analogy_question(difficulty=difficulty)
+        question = generate_analogy_question(difficulty=difficulty, rng=rng)
     elif qtype == "COMPOSITION":
-        question = generate_composition_question(difficulty=difficulty)
+        question = generate_composition_question(difficulty=difficulty, rng=rng)
     else:
         raise ValueError(f"Unsupported question_type: {qtype}")
 
@@ -310,10 +671,7 @@ def generate_question_for_family(qtype, patterns_by_type=None, difficulty="easy"
 
 def dev_smoke_test():
     families = ["SEQUENCE", "ODD_ONE_OUT", "MATRIX", "ANALOGY", "COMPOSITION"]
-    patterns = load_patterns()
-    patterns_by_type = {}
-    for schema in patterns:
-        patterns_by_type.setdefault(schema["question_type"], []).append(schema)
+    patterns_by_type = _patterns_by_type()
 
     for family in families:
         question = generate_question_for_family(family, patterns_by_type, difficulty="easy")
@@ -321,28 +679,24 @@ def dev_smoke_test():
         assert question["pattern_family"] == family
 
 
-def generate_question_for_mix(allowed_families, difficulty="easy"):
-    weights = PATTERN_WEIGHTS[difficulty]
-    families = [family for family in allowed_families if family in weights]
-    if not families:
-        families = allowed_families
-    probs = [weights.get(family, 1) for family in families]
-    family = random.choices(families, weights=probs, k=1)[0]
-    return generate_question_for_family(family, difficulty=difficulty)
+def generate_question_for_mix(allowed_families, difficulty="easy", rng=random):
+    families, probs = _weighted_families(difficulty, allowed_families)
+    family = rng.choices(families, weights=probs, k=1)[0]
+    return generate_question_for_family(family, difficulty=difficulty, rng=rng)
 
 
-def choose_pattern_family(difficulty):
+def choose_pattern_family(difficulty, rng=random):
     weights = PATTERN_WEIGHTS[difficulty]
     families = list(weights.keys())
     probs = list(weights.values())
-    return random.choices(families, weights=probs, k=1)[0]
+    return rng.choices(families, weights=probs, k=1)[0]
 
 
 # -------------------------------------------------
 # QUESTION BUILDERS (UI CONTRACT)
 # -------------------------------------------------
 
-def _sequence(schema, difficulty="easy"):
+def _sequence(schema, difficulty="easy", rng=random):
     start = schema["start_values"]
     if difficulty == "easy":
         step = 90
@@ -354,38 +708,27 @@ def _sequence(schema, difficulty="easy"):
         step = 45
         distractor_order = ["wrong_direction", "near_miss", "wrong_step"]
 
-    correct_value = apply_rotation(start[-1], step)
+    # The visible stem is laid out with the difficulty's step so the shown
+    # rule, the keyed answer and the explanation always agree.
+    values = [apply_rotation(start[0], step * i) for i in range(len(start))]
+    last = values[-1]
+    correct_value = apply_rotation(last, step)
 
     distractor_pool = {
-        "wrong_direction": apply_rotation(start[-1], -step),
-        "repeat_last": start[-1],
-        "wrong_step": apply_rotation(start[-1], step * 2),
+        "wrong_direction": apply_rotation(last, -step),
+        "repeat_last": last,
+        "wrong_step": apply_rotation(last, step * 2),
         "near_miss": apply_rotation(correct_value, -45),
     }
 
-    candidate_rotations = [distractor_pool[name] for name in distractor_order]
-    fallback_rotations = [
-        apply_rotation(correct_value, 45),
-        apply_rotation(correct_value, 135),
-        apply_rotation(correct_value, 180),
-    ]
-
-    distractors = []
-    used = {correct_value}
-    for rotation in candidate_rotations + fallback_rotations:
-        if rotation in used:
-            continue
-        distractors.append(rotation)
-        used.add(rotation)
-        if len(distractors) == 3:
-            break
-
-    if len(distractors) != 3:
-        return None
-
-    options_rotations = [correct_value] + distractors
-    shape = choose_single_shape(difficulty)
-    options = [{**_option_from_rotation(schema, rot), "shape": shape} for rot in options_rotations]
+    shape = choose_single_shape(difficulty, rng=rng)
+    candidates = [distractor_pool[name] for name in distractor_order] + _all_rotations_from(correct_value)
+    correct = {**_option_from_rotation(schema, correct_value), "shape": shape}
+    distractors = _pick_distractors(
+        correct,
+        [{**correct, "rotation": rotation} for rotation in candidates],
+    )
+    options = [correct] + distractors
     validate_shape_usage(options)
     correct_index = 0
 
@@ -396,7 +739,7 @@ def _sequence(schema, difficulty="easy"):
             "reflect": "none",
             "fill": "outline",
         }
-        for v in start
+        for v in values
     ]
     validate_shape_usage(visible_items)
 
@@ -415,7 +758,7 @@ def _sequence(schema, difficulty="easy"):
     }
 
 
-def _odd_one_out(schema, difficulty="easy"):
+def _odd_one_out(schema, difficulty="easy", rng=random):
     if difficulty == "easy":
         invariant = "rotation"
         common = {"rotation": 90, "fill": "outline"}
@@ -429,7 +772,7 @@ def _odd_one_out(schema, difficulty="easy"):
         common = {"rotation": 0, "fill": "outline"}
         odd = {"rotation": 0, "fill": "outline"}
 
-    shapes = choose_shape_pair(difficulty)
+    shapes = choose_shape_pair(difficulty, rng=rng)
     common_shape = shapes[0]
     odd_shape = shapes[1] if len(shapes) > 1 else shapes[0]
 
@@ -438,7 +781,7 @@ def _odd_one_out(schema, difficulty="easy"):
         for _ in range(3)
     ]
     stem_items.append({"shape": odd_shape, "reflect": "none", **odd})
-    random.shuffle(stem_items)
+    rng.shuffle(stem_items)
     validate_shape_usage(stem_items)
 
     correct_index = stem_items.index(next(item for item in stem_items if item["shape"] == odd_shape and item["fill"] == odd["fill"] and item["rotation"] == odd["rotation"]))
@@ -477,14 +820,14 @@ def _matrix(schema):
     return None
 
 
-def generate_matrix_question(difficulty="easy"):
+def generate_matrix_question(difficulty="easy", rng=random):
     """
     Generate a 3x3 MATRIX question with one missing cell.
     Rule: rotation across rows (+90° clockwise).
     """
     assert difficulty in DIFFICULTY_LEVELS
 
-    shape = choose_single_shape(difficulty)
+    shape = choose_single_shape(difficulty, rng=rng)
 
     if difficulty == "easy":
         rules = ["row_only"]
@@ -493,8 +836,7 @@ def generate_matrix_question(difficulty="easy"):
             [_cell(90, shape), _cell(180, shape), _cell(270, shape)],
             [_cell(180, shape), _cell(270, shape), _cell(0, shape)],
         ]
-        correct = _cell(180, shape)
-        distractors = [_cell(270, shape), _cell(90, shape), _cell(0, shape)]
+        distractor_rotations = [270, 90, 0]
         explanation = "The shape rotates 90° clockwise across each row."
     elif difficulty == "medium":
         rules = ["row", "column"]
@@ -503,8 +845,7 @@ def generate_matrix_question(difficulty="easy"):
             [_cell(270, shape), _cell(180, shape), _cell(270, shape)],
             [_cell(0, shape), _cell(270, shape), _cell(0, shape)],
         ]
-        correct = _cell(180, shape)
-        distractors = [_cell(0, shape), _cell(90, shape), _cell(315, shape)]
+        distractor_rotations = [0, 90, 315]
         explanation = "Use both row and column rotation rules to find the missing cell."
     else:
         rules = ["row", "column"]
@@ -513,15 +854,19 @@ def generate_matrix_question(difficulty="easy"):
             [_cell(270, shape), _cell(180, shape), _cell(270, shape)],
             [_cell(0, shape), _cell(270, shape), _cell(0, shape)],
         ]
-        correct = _cell(180, shape)
-        distractors = [_cell(135, shape), _cell(225, shape), _cell(270, shape)]
+        distractor_rotations = [135, 225, 270]
         explanation = "Both row and column rules apply; distractors are near-miss rotations."
 
-    options = [correct] + distractors
-    if not all_options_unique(options):
-        return None
+    # Derive the answer from the grid's row rule instead of restating it.
+    row = [cell["rotation"] for cell in cells[0] if cell is not None]
+    correct = _cell(apply_rotation(row[-1], (row[1] - row[0]) % 360), shape)
+    distractors = _pick_distractors(
+        correct,
+        [_cell(rotation, shape) for rotation in distractor_rotations + _all_rotations_from(correct["rotation"])],
+    )
 
-    random.shuffle(options)
+    options = [correct] + distractors
+    rng.shuffle(options)
     correct_index = options.index(correct)
 
     stem_items = [cell for row in cells for cell in row if cell is not None]
@@ -544,51 +889,46 @@ def generate_matrix_question(difficulty="easy"):
     }
 
 
-def generate_analogy_question(difficulty="easy"):
+def generate_analogy_question(difficulty="easy", rng=random):
     """
     A : B :: C : ?
     Rule: rotate +90° clockwise
     """
-    shape = choose_single_shape(difficulty)
+    shape = choose_single_shape(difficulty, rng=rng)
 
     if difficulty == "easy":
         transformation = "rotate_90"
         A = {"shape": shape, "rotation": 0}
         B = {"shape": shape, "rotation": 90}
         C = {"shape": shape, "rotation": 180}
-        correct = {"shape": shape, "rotation": 270}
-        distractors = [
-            {"shape": shape, "rotation": 90},
-            {"shape": shape, "rotation": 180},
-            {"shape": shape, "rotation": 0},
-        ]
+        distractor_rotations = [90, 180, 0]
     elif difficulty == "medium":
         transformation = "rotate_90"
         A = {"shape": shape, "rotation": 45}
         B = {"shape": shape, "rotation": 135}
         C = {"shape": shape, "rotation": 225}
-        correct = {"shape": shape, "rotation": 315}
-        distractors = [
-            {"shape": shape, "rotation": 135},
-            {"shape": shape, "rotation": 270},
-            {"shape": shape, "rotation": 225},
-        ]
+        distractor_rotations = [135, 270, 225]
     else:
         transformation = "rotate_45"
         A = {"shape": shape, "rotation": 0}
         B = {"shape": shape, "rotation": 45}
         C = {"shape": shape, "rotation": 180}
-        correct = {"shape": shape, "rotation": 225}
-        distractors = [
-            {"shape": shape, "rotation": 180},
-            {"shape": shape, "rotation": 135},
-            {"shape": shape, "rotation": 270},
-        ]
+        distractor_rotations = [180, 135, 270]
+
+    correct_rotation = apply_rotation(C["rotation"], (B["rotation"] - A["rotation"]) % 360)
+    correct = {"shape": shape, "rotation": correct_rotation}
+    distractors = _pick_distractors(
+        correct,
+        [
+            {"shape": shape, "rotation": rotation}
+            for rotation in distractor_rotations + _all_rotations_from(correct_rotation)
+        ],
+    )
 
     options = [correct] + distractors
     validate_shape_usage([A, B, C])
     validate_shape_usage(options)
-    random.shuffle(options)
+    rng.shuffle(options)
     correct_index = options.index(correct)
 
     return {
@@ -607,11 +947,11 @@ def generate_analogy_question(difficulty="easy"):
     }
 
 
-def generate_composition_question(difficulty="easy"):
+def generate_composition_question(difficulty="easy", rng=random):
     """
     Composition rule: UNION (overlay) of two inputs.
     """
-    shapes = choose_shape_pair(difficulty)
+    shapes = choose_shape_pair(difficulty, rng=rng)
     A = {"shape": shapes[0], "rotation": 0}
     B = {"shape": shapes[-1], "rotation": 180}
 
@@ -639,12 +979,26 @@ def generate_composition_question(difficulty="easy"):
             {"type": "composite", "items": [{"shape": shapes[0], "rotation": 45}, B]},
         ]
 
+    # Symmetric shapes (a square, a circle) have few distinct rotations, so
+    # rotating B and the single inputs are also needed to fill the options.
+    fallbacks = [
+        {"type": "composite", "items": [{"shape": shapes[0], "rotation": rotation}, B]}
+        for rotation in _all_rotations_from(A["rotation"])
+    ] + [
+        {"type": "composite", "items": [A, {"shape": shapes[-1], "rotation": rotation}]}
+        for rotation in _all_rotations_from(B["rotation"])
+    ] + [
+        {"type": "composite", "items": [A]},
+        {"type": "composite", "items": [B]},
+    ]
+    distractors = _pick_distractors(correct, distractors + fallbacks)
+
     options = [correct] + distractors
     validate_shape_usage([A, B])
     for option in options:
         if option.get("type") == "composite":
             validate_shape_usage(option.get("items", []))
-    random.shuffle(options)
+    rng.shuffle(options)
     correct_index = options.index(correct)
 
     return {
@@ -0,0 +1,93 @@
+"""
+Precomputed shape geometry.
+
+Generator rotations are multiples of 45°, so every shape has at most eight
+orientations. VERTEX_TABLES holds the unit-size vertices (centred on the
+origin, y pointing down as in SVG) of each (shape, rotation index); drawing
+a shape is a scale and a translate, with no trigonometry at render time.
+Other angles fall back to rotating the unit vertices with math.
+
+The same vertices answer "do these two items look identical?" (shape_key).
+"""
+import math
+from functools import lru_cache
+from typing import Dict, Hashable, Optional, Tuple
+
+ROTATION_STEP = 45
+ROTATION_COUNT = 360 // ROTATION_STEP
+
+Point = Tuple[float, float]
+
+# Unit shapes (size 1), matching the original render_svg drawings.
+UNIT_SHAPES: Dict[str, Tuple[Point, ...]] = {
+    "triangle": ((0.0, -0.5), (-0.5, 0.5), (0.5, 0.5)),
+    "square": ((-0.5, -0.5), (0.5, -0.5), (0.5, 0.5), (-0.5, 0.5)),
+    "circle": (),
+}
+
+_SQRT_HALF = math.sqrt(0.5)
+# cos/sin of k * 45°, exact where the value is 0 or ±1.
+_COS = (1.0, _SQRT_HALF, 0.0, -_SQRT_HALF, -1.0, -_SQRT_HALF, 0.0, _SQRT_HALF)
+_SIN = (0.0, _SQRT_HALF, 1.0, _SQRT_HALF, 0.0, -_SQRT_HALF, -1.0, -_SQRT_HALF)
+
+
+def _rotate(points, cos: float, sin: float) -> Tuple[Point, ...]:
+    # Same sense as SVG rotate(): clockwise on screen for positive angles.
+    return tuple((x * cos - y * sin, x * sin + y * cos) for x, y in points)
+
+
+VERTEX_TABLES: Dict[Tuple[str, int], Tuple[Point, ...]] = {
+    (shape, index): _rotate(points, _COS[index], _SIN[index])
+    for shape, points in UNIT_SHAPES.items()
+    for index in range(ROTATION_COUNT)
+}
+
+
+def rotation_index(rotation) -> Optional[int]:
+    """
+    Index into VERTEX_TABLES for `rotation` degrees, or None when the angle
+    is not a multiple of 45°.
+    """
+    if rotation % ROTATION_STEP:
+        return None
+    return int(rotation // ROTATION_STEP) % ROTATION_COUNT
+
+
+def unit_vertices(shape: str, rotation=0) -> Tuple[Point, ...]:
+    if shape not in UNIT_SHAPES:
+        raise ValueError(f"Unsupported shape: {shape}")
+    index = rotation_index(rotation)
+    if index is not None:
+        return VERTEX_TABLES[(shape, index)]
+    angle = math.radians(rotation)
+    return _rotate(UNIT_SHAPES[shape], math.cos(angle), math.sin(angle))
+
+
+@lru_cache(maxsize=1024)
+def scaled_vertices(shape: str, size: float, rotation=0) -> Tuple[Point, ...]:
+    """
+    Vertices of `shape` with side/diameter `size`, centred on the origin.
+    """
+    return tuple((vx * size, vy * size) for vx, vy in unit_vertices(shape, rotation))
+
+
+def shape_vertices(shape: str, x: float, y: float, size: float, rotation=0) -> Tuple[Point, ...]:
+    """
+    Final vertices of `shape` drawn at (x, y) with side/diameter `size`.
+    Empty for circles.
+    """
+    return tuple([(x + dx, y + dy) for dx, dy in scaled_vertices(shape, size, rotation)])
+
+
+@lru_cache(maxsize=1024)
+def shape_key(shape: str, rotation=0) -> Hashable:
+    """
+    Hashable key of what the shape looks like: two (shape, rotation) pairs
+    with equal keys draw identically (a square at 0° and 90°, a circle at
+    any angle).
+    """
+    if shape == "circle":
+        return ("circle",)
+    vertices = unit_vertices(shape, rotation)
+    return (shape, frozenset((round(vx, 6) + 0.0, round(vy, 6) + 0.0) for vx, vy in vertices))
+
@@ -0,0 +1,241 @@
+"""
+Versioned schema migrations.
+
+MIGRATIONS is the single source of truth for the database schema. Applied
+versions are recorded in `schema_version`; ensure_schema() applies whatever
+is missing, under a Postgres advisory lock so concurrent app processes do
+not race, and then remembers for the rest of the process that the schema is
+current. Streamlit reruns therefore cost nothing after the first one.
+
+Apply or inspect from the command line:
+
+    python -m nvr_proto.migrations            # apply pending migrations
+    python -m nvr_proto.migrations --status   # list applied / pending
+
+To change the schema, append a Migration with the next version number;
+never edit one that has shipped.
+"""
+import argparse
+import threading
+from typing import List, NamedTuple, Optional
+
+from nvr_proto.db import connection
+
+# Arbitrary, fixed key for pg_advisory_lock ("NVR" in ASCII).
+MIGRATION_LOCK_KEY = 0x4E5652
+
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    sql: str
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(
+        1,
+        "canonical nvr_users and nvr_attempts",
+        """
+        -- Earlier db.init_nvr_tables() created an incompatible nvr_attempts
+        -- (family/level/created_at). Keep its rows aside rather than mixing them in.
+        DO $$
+        BEGIN
+            IF EXISTS (
+                SELECT 1 FROM information_schema.columns
+                WHERE table_schema = current_schema()
+                  AND table_name = 'nvr_attempts' AND column_name = 'family'
+            ) AND NOT EXISTS (
+                SELECT 1 FROM information_schema.columns
+                WHERE table_schema = current_schema()
+                  AND table_name = 'nvr_attempts' AND column_name = 'pattern_family'
+            ) THEN
+                ALTER TABLE nvr_attempts RENAME TO nvr_attempts_legacy;
+                ALTER INDEX IF EXISTS nvr_attempts_pkey RENAME TO nvr_attempts_legacy_pkey;
+                ALTER SEQUENCE IF EXISTS nvr_attempts_id_seq RENAME TO nvr_attempts_legacy_id_seq;
+            END IF;
+        END
+        $$;
+
+        CREATE TABLE IF NOT EXISTS nvr_users (
+            id SERIAL PRIMARY KEY,
+            email TEXT UNIQUE,
+            name TEXT NULL,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        );
+        ALTER TABLE nvr_users ADD COLUMN IF NOT EXISTS name TEXT NULL;
+
+        CREATE TABLE IF NOT EXISTS nvr_attempts (
+            id BIGSERIAL PRIMARY KEY,
+            attempt_id UUID NULL,
+            session_id TEXT NOT NULL,
+            user_id TEXT NULL,
+
+            pattern_family TEXT NOT NULL,
+            difficulty TEXT NOT NULL,
+            pattern_id TEXT NULL,
+            level INT NULL,
+
+            selected_index INT NOT NULL,
+            correct_index INT NOT NULL,
+            is_correct BOOLEAN NOT NULL,
+
+            response_ms INT NOT NULL,
+
+            ts TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        );
+        -- Tables created by the old nvr_repo.init_nvr_tables().
+        ALTER TABLE nvr_attempts ADD COLUMN IF NOT EXISTS attempt_id UUID NULL;
+        ALTER TABLE nvr_attempts ADD COLUMN IF NOT EXISTS pattern_id TEXT NULL;
+        ALTER TABLE nvr_attempts ADD COLUMN IF NOT EXISTS level INT NULL;
+
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_nvr_attempts_attempt_id
+            ON nvr_attempts (attempt_id);
+
+        CREATE INDEX IF NOT EXISTS idx_nvr_attempts_session_ts
+            ON nvr_attempts (session_id, ts DESC);
+
+        CREATE INDEX IF NOT EXISTS idx_nvr_attempts_user_ts
+            ON nvr_attempts (user_id, ts DESC);
+
+        CREATE INDEX IF NOT EXISTS idx_nvr_attempts_pattern
+            ON nvr_attempts (pattern_family);
+        """,
+    ),
+    Migration(
+        2,
+        "nvr_session_stats rollup",
+        """
+        -- One row per session, upserted in the same transaction as each
+        -- attempt batch (attempt_writer.insert_attempts).
+        CREATE TABLE IF NOT EXISTS nvr_session_stats (
+            session_id TEXT PRIMARY KEY,
+            attempts INT NOT NULL DEFAULT 0,
+            correct INT NOT NULL DEFAULT 0,
+            total_response_ms BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        );
+
+        INSERT INTO nvr_session_stats (session_id, attempts, correct, total_response_ms)
+        SELECT session_id, COUNT(*), COUNT(*) FILTER (WHERE is_correct), COALESCE(SUM(response_ms), 0)
+        FROM nvr_attempts
+        GROUP BY session_id
+        ON CONFLICT (session_id) DO NOTHING;
+        """,
+    ),
+    Migration(
+        3,
+        "covering index for per-user level stats",
+        """
+        -- progress_repo's GROUP BY pattern_family, level for one user is an
+        -- index-only scan with is_correct included.
+        CREATE INDEX IF NOT EXISTS idx_nvr_attempts_user_family_level
+            ON nvr_attempts (user_id, pattern_family, level) INCLUDE (is_correct);
+        """,
+    ),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+_SCHEMA_VERSION_DDL = """
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INT PRIMARY KEY,
+    description TEXT NOT NULL,
+    applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+)
+"""
+
+_migrated = False
+_migrate_lock = threading.Lock()
+
+
+def _current_version(cur) -> int:
+    cur.execute("SELECT to_regclass('schema_version') IS NOT NULL")
+    if not cur.fetchone()[0]:
+        return 0
+    cur.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+    return int(cur.fetchone()[0])
+
+
+def migrate(target: Optional[int] = None) -> List[int]:
+    """
+    Apply every migration up to `target` (default: latest) that the
+    database has not seen, each in its own transaction. Returns the
+    versions applied by this call.
+    """
+    target = LATEST_VERSION if target is None else target
+    applied: List[int] = []
+    with connection() as conn:
+        with conn.cursor() as cur:
+            # Cheap check first: no lock and no DDL when already current.
+            current = _current_version(cur)
+            conn.rollback()
+            if current >= target:
+                return applied
+
+            cur.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_KEY,))
+            try:
+                with conn:
+                    cur.execute(_SCHEMA_VERSION_DDL)
+                for migration in MIGRATIONS:
+                    if migration.version > target:
+                        break
+                    with conn:
+                        # Re-read under the lock: another process may have got here first.
+                        if migration.version <= _current_version(cur):
+                            continue
+                        cur.execute(migration.sql)
+                        cur.execute(
+                            "INSERT INTO schema_version (version, description) VALUES (%s, %s)",
+                            (migration.version, migration.description),
+                        )
+                    applied.append(migration.version)
+            finally:
+                cur.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_KEY,))
+                conn.commit()
+    return applied
+
+
+def ensure_schema() -> None:
+    """
+    Bring the schema up to date once per process; later calls return
+    immediately without touching the database.
+    """
+    global _migrated
+    if _migrated:
+        return
+    with _migrate_lock:
+        if not _migrated:
+            migrate()
+            _migrated = True
+
+
+def status() -> List[str]:
+    with connection() as conn:
+        with conn.cursor() as cur:
+            current = _current_version(cur)
+        conn.rollback()
+    return [
+        f"{'applied' if m.version <= current else 'pending'}  {m.version:>3}  {m.description}"
+        for m in MIGRATIONS
+    ]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m nvr_proto.migrations")
+    parser.add_argument("--status", action="store_true", help="List applied and pending migrations")
+    parser.add_argument("--target", type=int, default=None, help="Migrate up to this version only")
+    args = parser.parse_args(argv)
+
+    if args.status:
+        print("\n".join(status()))
+        return 0
+    applied = migrate(args.target)
+    if applied:
+        print(f"Applied migration(s): {', '.join(map(str, applied))}")
+    else:
+        print(f"Schema is up to date (version {LATEST_VERSION})")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,195 @@
+"""
+Exhaustive enumeration of the generator's question space.
+
+Every builder in generator.py draws its randomness through an `rng` argument,
+so replaying each possible sequence of rng outcomes visits every question a
+builder can emit. Each distinct question is validated once and stored as a
+CompactQuestion with its fingerprint; sampling at runtime is an index
+lookup, with no decoding. generator.question_stream() draws from the
+process-wide space for every family the space holds.
+"""
+import itertools
+import json
+import random
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from nvr_proto.compact import CompactQuestion
+from nvr_proto.fingerprint import question_fingerprint
+from nvr_proto.generator import (
+    DIFFICULTY_LEVELS,
+    FAMILIES,
+    PATTERN_WEIGHTS,
+    generate_question_for_family,
+    validate_question,
+    validate_question_quality,
+)
+from nvr_proto.validated import mark_validated
+
+# Bumped whenever generation or validation rules change what a space holds.
+SPACE_VERSION = 2
+
+
+class _ReplayRandom:
+    """
+    Stand-in for random.Random that follows a fixed path of branch indexes
+    and records how many branches each call had.
+    """
+
+    def __init__(self, path: List[int]):
+        self.path = path
+        self.branches: List[int] = []
+
+    def _pick(self, n: int) -> int:
+        position = len(self.branches)
+        self.branches.append(n)
+        return self.path[position] if position < len(self.path) else 0
+
+    def choice(self, seq):
+        return seq[self._pick(len(seq))]
+
+    def choices(self, population, weights=None, k=1):
+        # Weights only change how often a branch is drawn, not whether it exists.
+        return [population[self._pick(len(population))] for _ in range(k)]
+
+    def sample(self, population, k):
+        arrangements = list(itertools.permutations(population, k))
+        return list(arrangements[self._pick(len(arrangements))])
+
+    def shuffle(self, x):
+        arrangements = list(itertools.permutations(x))
+        x[:] = arrangements[self._pick(len(arrangements))]
+
+
+def _next_path(path: List[int], branches: List[int]) -> Optional[List[int]]:
+    full = [path[i] if i < len(path) else 0 for i in range(len(branches))]
+    for i in reversed(range(len(full))):
+        if full[i] + 1 < branches[i]:
+            return full[:i] + [full[i] + 1]
+    return None
+
+
+def _encode(question: Dict[str, Any]) -> str:
+    return json.dumps(question, sort_keys=True, separators=(",", ":"))
+
+
+def enumerate_questions(family: str, difficulty: str) -> List[Dict[str, Any]]:
+    """
+    Every distinct valid question the `family` builder can emit at
+    `difficulty`, as ValidatedQuestions in a stable order.
+    """
+    assert family in FAMILIES, f"Unknown family: {family}"
+    assert difficulty in DIFFICULTY_LEVELS
+
+    seen = set()
+    questions = []
+    path: Optional[List[int]] = []
+    while path is not None:
+        rng = _ReplayRandom(path)
+        question = generate_question_for_family(family, difficulty=difficulty, rng=rng)
+        if question is not None:
+            key = _encode(question)
+            if key not in seen:
+                seen.add(key)
+                try:
+                    validate_question_quality(question)
+                    validate_question(question)
+                except AssertionError:
+                    pass
+                else:
+                    questions.append(mark_validated(question))
+        path = _next_path(path, rng.branches)
+    return questions
+
+
+class QuestionSpace:
+    """
+    Indexed table of every valid question per (family, difficulty), held as
+    CompactQuestions. A space enumerated in this process hands out
+    validated questions; one loaded from a file hands out plain ones.
+    """
+
+    def __init__(self, tables: Dict[Tuple[str, str], List[CompactQuestion]]):
+        self.tables = tables
+        self.fingerprints = {
+            key: [question_fingerprint(question.to_dict()) for question in table] for key, table in tables.items()
+        }
+
+    @classmethod
+    def build(cls, families: Optional[List[str]] = None, difficulties: Optional[List[str]] = None) -> "QuestionSpace":
+        tables = {}
+        for family in families or FAMILIES:
+            for difficulty in difficulties or DIFFICULTY_LEVELS:
+                questions = enumerate_questions(family, difficulty)
+                tables[(family, difficulty)] = [CompactQuestion.from_dict(q) for q in questions]
+        return cls(tables)
+
+    def size(self, family: str, difficulty: str) -> int:
+        return len(self.tables.get((family, difficulty), ()))
+
+    def sizes(self) -> Dict[str, Dict[str, int]]:
+        result: Dict[str, Dict[str, int]] = {}
+        for (family, difficulty), table in self.tables.items():
+            result.setdefault(family, {})[difficulty] = len(table)
+        return result
+
+    def get(self, family: str, difficulty: str, index: int) -> Dict[str, Any]:
+        return self.tables[(family, difficulty)][index].to_dict()
+
+    def draw(self, family: str, difficulty: str, rng=random) -> Tuple[CompactQuestion, bytes]:
+        """
+        Random question of `family` at `difficulty` and its fingerprint.
+        Raises LookupError when the space holds none.
+        """
+        table = self.tables.get((family, difficulty))
+        if not table:
+            raise LookupError(f"No enumerated questions for family={family} difficulty={difficulty}")
+        index = rng.randrange(len(table))
+        return table[index], self.fingerprints[(family, difficulty)][index]
+
+    def sample(self, difficulty: str = "easy", families: Optional[List[str]] = None, rng=random) -> CompactQuestion:
+        """
+        Random valid question; the family is drawn with PATTERN_WEIGHTS.
+        No construction, validation or decoding happens here.
+        """
+        weights = PATTERN_WEIGHTS[difficulty]
+        candidates = [family for family in (families or FAMILIES) if self.size(family, difficulty)]
+        if not candidates:
+            raise LookupError(f"No enumerated questions for difficulty={difficulty} families={families}")
+        family = rng.choices(candidates, weights=[weights.get(f, 1) for f in candidates], k=1)[0]
+        return self.draw(family, difficulty, rng)[0]
+
+    def save(self, path: Path) -> None:
+        data = {"version": SPACE_VERSION, "tables": {}}
+        for (family, difficulty), table in self.tables.items():
+            data["tables"].setdefault(family, {})[difficulty] = [q.to_dict() for q in table]
+        with Path(path).open("w", encoding="utf-8") as file:
+            json.dump(data, file, separators=(",", ":"))
+
+    @classmethod
+    def load(cls, path: Path) -> "QuestionSpace":
+        with Path(path).open("r", encoding="utf-8") as file:
+            data = json.load(file)
+        assert data.get("version") == SPACE_VERSION, "Unsupported question space version"
+        tables = {}
+        for family, by_difficulty in data["tables"].items():
+            for difficulty, questions in by_difficulty.items():
+                tables[(family, difficulty)] = [CompactQuestion.from_dict(q) for q in questions]
+        return cls(tables)
+
+
+_SPACE: Optional[QuestionSpace] = None
+_SPACE_LOCK = threading.Lock()
+
+
+def get_question_space() -> QuestionSpace:
+    """
+    Process-wide QuestionSpace, enumerated on first use.
+    """
+    global _SPACE
+    if _SPACE is None:
+        with _SPACE_LOCK:
+            if _SPACE is None:
+                _SPACE = QuestionSpace.build()
+    return _SPACE
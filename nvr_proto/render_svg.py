@@ -1,10 +1,51 @@
 # nvr_proto/render_svg.py
-import math
-from typing import Optional, List, Any, Dict
+import gzip
+import html
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, List, Any, Callable, Dict, Hashable, Tuple
+
+from nvr_proto.asset_store import option_asset_key, stem_asset_key
+from nvr_proto.geometry import shape_vertices
+from nvr_proto.validated import is_trusted
+
+try:
+    import brotli
+except ImportError:  # optional: only needed for compress_svg(..., encoding="br")
+    brotli = None
+
+# Bump whenever the SVG output changes: asset stores record the version they
+# were rendered with, and set_asset_store() refuses any other.
+RENDER_VERSION = 2
 
 STROKE_COLOR = "#E5E7EB"   # light grey, visible on dark background
 STROKE_WIDTH = 2
 
+# Renderers draw for the dark app ("screen"). Other themes swap colours as
+# the SVG is written: "print" is dark ink on white paper with the canvas
+# and tile backgrounds left transparent, since browsers drop background
+# fills when printing and light strokes vanish on white.
+THEMES = {
+    "screen": {},
+    "print": {
+        "#0f1117": "none",
+        "#161b22": "none",
+        "#1f2937": "#f3f4f6",
+        "#E5E7EB": "#111827",
+        "#e6edf3": "#111827",
+        "#9aa4b2": "#4b5563",
+        "#888": "#4b5563",
+        "rgba(255,255,255,.18)": "#9ca3af",
+        "rgba(255,255,255,.16)": "#9ca3af",
+        "#58a6ff": "#1d4ed8",
+        "#6ea8fe": "#1d4ed8",
+        "#4DA3FF": "#1d4ed8",
+    },
+}
+
 STEM_RENDERERS = {
     "SEQUENCE",
     "ODD_ONE_OUT",
@@ -23,41 +64,128 @@ OPTION_RENDERERS = {
 
 
 # =========================
-# Core SVG helpers
+# Render cache
 # =========================
-def _svg_wrap(inner: str, w: int = 920, h: int = 420) -> str:
-    return f"""
-<svg xmlns="http://www.w3.org/2000/svg"
-     viewBox="0 0 {w} {h}"
-     width="100%"
-     height="auto"
-     preserveAspectRatio="xMidYMid meet">
-  <rect x="0" y="0" width="{w}" height="{h}" rx="18" fill="#0f1117"/>
-  {inner}
-</svg>
-""".strip()
+class _RenderCache:
+    """
+    Bounded LRU of rendered SVG strings, limited both by entry count and by
+    the total length of the cached strings. Thread-safe.
+    """
 
+    def __init__(self, name: str, max_entries: int, max_bytes: int):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, str]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[str]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: str) -> None:
+        size = len(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous)
+            self._entries[key] = value
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def info(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+            }
+
+
+# Fragments: one per distinct (shape, position, size, rotation, opacity).
+_FRAGMENT_CACHE = _RenderCache("fragments", max_entries=8192, max_bytes=2 * 1024 * 1024)
+# Whole render_option_svg() outputs, keyed on (family, mode, frozen option).
+_OPTION_CACHE = _RenderCache("options", max_entries=2048, max_bytes=4 * 1024 * 1024)
+# compact-mode fragments, keyed on (fragment, precision).
+_MINIFY_CACHE = _RenderCache("minified", max_entries=8192, max_bytes=2 * 1024 * 1024)
+# Fragments recoloured for a theme, keyed on (fragment, theme).
+_THEME_CACHE = _RenderCache("themed", max_entries=8192, max_bytes=2 * 1024 * 1024)
+# render_question_svg() outputs in the asset store's mode, keyed on stem_asset_key().
+_STEM_CACHE = _RenderCache("stems", max_entries=512, max_bytes=4 * 1024 * 1024)
+
+
+# Pre-rendered assets consulted before rendering; see set_asset_store().
+_ASSET_STORE = None
+
+
+def set_asset_store(store) -> None:
+    """
+    Serve renders from an asset_store.AssetStore when it has them
+    (None switches the lookup off). Raises ValueError for a store built by
+    another RENDER_VERSION.
+    """
+    global _ASSET_STORE
+    if store is not None and store.render_version != RENDER_VERSION:
+        raise ValueError(
+            f"Asset store was built by renderer version {store.render_version}, not {RENDER_VERSION}; rebuild it"
+        )
+    _ASSET_STORE = store
+    _STEM_CACHE.clear()
+
+
+def _freeze(value: Any) -> Hashable:
+    """
+    Canonical hashable form of an option (dict key order does not matter).
+    """
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(inner)) for key, inner in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(inner) for inner in value)
+    hash(value)
+    return value
+
+
+def render_cache_info() -> Dict[str, Dict[str, int]]:
+    """
+    Hit/miss counters and current size of each render cache.
+    """
+    return {cache.name: cache.info() for cache in (_FRAGMENT_CACHE, _OPTION_CACHE, _MINIFY_CACHE, _THEME_CACHE, _STEM_CACHE)}
 
-def _tile(
-    x: int,
-    y: int,
-    w: int,
-    h: int,
-    inner: str,
-    selected: bool = False,
-) -> str:
-    stroke = "#58a6ff" if selected else "rgba(255,255,255,.18)"
-    stroke_w = 4 if selected else 2
-    fill = "#1f2937" if selected else "#161b22"
-    return f"""
-<g>
-  <rect x="{x}" y="{y}" width="{w}" height="{h}" rx="16"
-        fill="{fill}" stroke="{stroke}" stroke-width="{stroke_w}"/>
-  {inner}
-</g>
-""".strip()
 
+def clear_render_caches() -> None:
+    _FRAGMENT_CACHE.clear()
+    _OPTION_CACHE.clear()
+    _MINIFY_CACHE.clear()
+    _THEME_CACHE.clear()
+    _STEM_CACHE.clear()
 
+
+# =========================
+# Core SVG helpers
+# =========================
 def _text(x: Any, y: Any, s: str, size: int = 18, color: str = "#e6edf3", anchor: str = "start") -> str:
     # x/y can be numbers or "50%" strings
     return (
@@ -66,20 +194,17 @@ def _text(x: Any, y: Any, s: str, size: int = 18, color: str = "#e6edf3", anchor
     )
 
 
-def _rotate_point(px: float, py: float, cx: float, cy: float, deg: float):
-    ang = math.radians(deg)
-    dx, dy = px - cx, py - cy
-    rx = dx * math.cos(ang) - dy * math.sin(ang)
-    ry = dx * math.sin(ang) + dy * math.cos(ang)
-    return cx + rx, cy + ry
+def _points(vertices) -> str:
+    # Vertex coordinates to 2 decimals, without trailing zeros.
+    return " ".join([
+        f'{f"{px:.2f}".rstrip("0").rstrip(".")},{f"{py:.2f}".rstrip("0").rstrip(".")}'
+        for px, py in vertices
+    ])
 
 
-def _triangle(x: int, y: int, size: int = 34, rotation: int = 0, opacity: float = 1.0) -> str:
-    half = size / 2
-    points = f"{x},{y-half} {x-half},{y+half} {x+half},{y+half}"
+def _polygon(vertices, opacity: float) -> str:
     return (
-        f'<polygon points="{points}" '
-        f'transform="rotate({rotation},{x},{y})" '
+        f'<polygon points="{_points(vertices)}" '
         f'fill="none" '
         f'stroke="{STROKE_COLOR}" '
         f'stroke-width="{STROKE_WIDTH}" '
@@ -87,16 +212,12 @@ def _triangle(x: int, y: int, size: int = 34, rotation: int = 0, opacity: float
     )
 
 
+def _triangle(x: int, y: int, size: int = 34, rotation: int = 0, opacity: float = 1.0) -> str:
+    return _polygon(shape_vertices("triangle", x, y, size, rotation), opacity)
+
+
 def _square(x: int, y: int, size: int, rotation: int = 0, opacity: float = 1.0) -> str:
-    half = size / 2
-    return (
-        f'<rect x="{x-half}" y="{y-half}" width="{size}" height="{size}" '
-        f'transform="rotate({rotation},{x},{y})" '
-        f'fill="none" '
-        f'stroke="{STROKE_COLOR}" '
-        f'stroke-width="{STROKE_WIDTH}" '
-        f'opacity="{opacity}" />'
-    )
+    return _polygon(shape_vertices("square", x, y, size, rotation), opacity)
 
 
 def _circle(x: int, y: int, size: int, opacity: float = 1.0) -> str:
@@ -110,7 +231,25 @@ def _circle(x: int, y: int, size: int, opacity: float = 1.0) -> str:
     )
 
 
-def _draw_shape(shape, x, y, size, rotation=0, opacity=1.0):
+def _draw_shape(shape, x, y, size, rotation=0, opacity=1.0, defs=None):
+    """
+    One shape as inline SVG, or, when `defs` is given, as a <use> of a
+    shared definition that `defs` will emit once per document.
+    """
+    if defs is not None:
+        return defs.use(shape, x, y, size, rotation, opacity)
+    try:
+        key = (shape, x, y, size, rotation, opacity)
+        cached = _FRAGMENT_CACHE.get(key)
+    except TypeError:  # unhashable value from a hand-written question
+        return _draw_shape_uncached(shape, x, y, size, rotation, opacity)
+    if cached is None:
+        cached = _draw_shape_uncached(shape, x, y, size, rotation, opacity)
+        _FRAGMENT_CACHE.put(key, cached)
+    return cached
+
+
+def _draw_shape_uncached(shape, x, y, size, rotation=0, opacity=1.0):
     if shape == "triangle":
         return _triangle(x, y, size, rotation, opacity)
     if shape == "square":
@@ -120,30 +259,251 @@ def _draw_shape(shape, x, y, size, rotation=0, opacity=1.0):
     raise ValueError(f"Unsupported shape: {shape}")
 
 
-def _lines(lines: List, ox: int, oy: int, stroke: str = "#e6edf3", stroke_w: int = 3) -> str:
-    out = ""
+class _ShapeDefs:
+    """
+    Shapes referenced from one SVG document in <defs>/<use> mode.
+
+    Each (shape, size) is defined once, centred on the origin and styled by
+    the shared "nvr-shape" class; instances are <use> elements carrying only
+    their position, rotation and any non-default opacity.
+    """
+
+    STYLE = (
+        f"<style>.nvr-shape{{fill:none;stroke:{STROKE_COLOR};"
+        f"stroke-width:{STROKE_WIDTH}}}</style>"
+    )
+
+    def __init__(self):
+        self.shapes: Dict[str, str] = {}
+
+    def _define(self, shape: str, size) -> str:
+        shape_id = f"nvr-{shape}-{size}"
+        if shape_id not in self.shapes:
+            if shape == "circle":
+                body = f'<circle cx="0" cy="0" r="{size / 2}"'
+            else:
+                body = f'<polygon points="{_points(shape_vertices(shape, 0, 0, size))}"'
+            self.shapes[shape_id] = f'{body} id="{shape_id}" class="nvr-shape" />'
+        return shape_id
+
+    def use(self, shape, x, y, size, rotation=0, opacity=1.0) -> str:
+        shape_id = self._define(shape, size)
+        transform = f"translate({x},{y})"
+        if rotation and shape != "circle":
+            transform += f" rotate({rotation})"
+        attrs = f' opacity="{opacity}"' if opacity != 1.0 else ""
+        return f'<use href="#{shape_id}" transform="{transform}"{attrs} />'
+
+    def markup(self) -> str:
+        return "<defs>" + self.STYLE + "".join(self.shapes.values()) + "</defs>"
+
+
+# =========================
+# Compact output
+# =========================
+DEFAULT_PRECISION = 2
+
+_TAG_GAP = re.compile(r">\s+<")
+_SPACE_RUN = re.compile(r"\s+")
+_ATTR_VALUE = re.compile(r'="([^"]*)"')
+_DECIMAL = re.compile(r"-?\d+\.\d+")
+# Attributes that restate the SVG default once numbers are shortened.
+_DEFAULT_ATTRS = re.compile(r' (?:opacity="1"|text-anchor="start"|transform="rotate\(0(?:,[^")]*)?\)")(?=[ />])')
+
+
+def _format_number(text: str, precision: int) -> str:
+    """
+    Shortest form of a decimal: 443.0 -> 443, 14.500 -> 14.5, -0.0 -> 0.
+    """
+    formatted = f"{round(float(text), precision):.{precision}f}"
+    if "." in formatted:
+        formatted = formatted.rstrip("0").rstrip(".")
+    return "0" if formatted == "-0" else formatted
+
+
+def _minify_uncached(fragment: str, precision: int) -> str:
+    fragment = _SPACE_RUN.sub(" ", _TAG_GAP.sub("><", fragment.strip()))
+    fragment = _ATTR_VALUE.sub(
+        lambda match: '="' + _DECIMAL.sub(lambda number: _format_number(number.group(), precision), match.group(1)) + '"',
+        fragment,
+    )
+    fragment = _DEFAULT_ATTRS.sub("", fragment)
+    return fragment.replace(" />", "/>").replace('" >', '">')
+
+
+def _minify(fragment: str, precision: int) -> str:
+    """
+    Whitespace-free form of one writer fragment, with decimals in attribute
+    values rounded to `precision` places and default-valued attributes
+    dropped. Fragments always start and end at
+    tag boundaries, so trimming them never touches text content.
+    """
+    key = (fragment, precision)
+    cached = _MINIFY_CACHE.get(key)
+    if cached is None:
+        cached = _minify_uncached(fragment, precision)
+        _MINIFY_CACHE.put(key, cached)
+    return cached
+
+
+_THEME_PATTERNS = {
+    name: re.compile("|".join(re.escape(color) for color in colors) + r"(?![0-9A-Za-z])")
+    for name, colors in THEMES.items()
+    if colors
+}
+
+
+def _recolor(fragment: str, theme: str) -> str:
+    """
+    `fragment` with the screen colours replaced by those of `theme`.
+    """
+    key = (fragment, theme)
+    cached = _THEME_CACHE.get(key)
+    if cached is None:
+        colors = THEMES[theme]
+        cached = _THEME_PATTERNS[theme].sub(lambda match: colors[match.group()], fragment)
+        _THEME_CACHE.put(key, cached)
+    return cached
+
+
+def compress_svg(svg: str, encoding: str = "gzip", level: Optional[int] = None) -> bytes:
+    """
+    Precompressed bytes of `svg` for static serving, to be sent with a
+    matching Content-Encoding. encoding is "gzip" or "br" (needs the
+    optional brotli package). gzip output is deterministic (mtime=0).
+    """
+    data = svg.encode("utf-8")
+    if encoding == "gzip":
+        return gzip.compress(data, compresslevel=9 if level is None else level, mtime=0)
+    if encoding == "br":
+        if brotli is None:
+            raise ImportError("compress_svg(..., encoding='br') requires the brotli package")
+        return brotli.compress(data, quality=11 if level is None else level)
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+# =========================
+# Output writer
+# =========================
+class _SvgWriter:
+    """
+    Append-only SVG output shared by every renderer.
+
+    Fragments go straight to `out` when one is given (an open file, a
+    socket wrapper, anything with write()); otherwise they are collected
+    and joined once by getvalue(). With compact=True every fragment is
+    minified on the way through, and a `theme` other than "screen"
+    recolours it (see THEMES).
+    """
+
+    __slots__ = ("_parts", "write")
+
+    def __init__(self, out=None, compact: bool = False, precision: int = DEFAULT_PRECISION, theme: str = "screen"):
+        assert theme in THEMES, f"Unknown theme: {theme}"
+        if out is None:
+            self._parts: Optional[List[str]] = []
+            sink = self._parts.append
+        else:
+            self._parts = None
+            sink = out.write
+        if THEMES[theme]:
+            themed = sink
+            sink = lambda fragment: themed(_recolor(fragment, theme))
+        if compact:
+            self.write = lambda fragment: sink(_minify(fragment, precision))
+        else:
+            self.write = sink
+
+    def getvalue(self) -> str:
+        assert self._parts is not None, "getvalue() is only available without a target"
+        return "".join(self._parts)
+
+
+def _as_writer(out, compact: bool = False, precision: int = DEFAULT_PRECISION, theme: str = "screen") -> _SvgWriter:
+    if isinstance(out, _SvgWriter) and theme == "screen":
+        return out
+    return _SvgWriter(out, compact, precision, theme)
+
+
+def _open_canvas(out: _SvgWriter, w: int = 920, h: int = 420) -> None:
+    # Full-width, dark-background canvas used by the "wrapped" renderers.
+    out.write(
+        f"""<svg xmlns="http://www.w3.org/2000/svg"
+     viewBox="0 0 {w} {h}"
+     width="100%"
+     height="auto"
+     preserveAspectRatio="xMidYMid meet">
+  <rect x="0" y="0" width="{w}" height="{h}" rx="18" fill="#0f1117"/>
+  """
+    )
+
+
+def _close_canvas(out: _SvgWriter, defs: Optional[_ShapeDefs] = None) -> None:
+    _write_defs(out, defs)
+    out.write("\n</svg>")
+
+
+def _open_svg(out: _SvgWriter, w: int, h: int) -> None:
+    # Fixed-size canvas used by the stem and composite renderers.
+    out.write(f'<svg width="{w}" height="{h}" viewBox="0 0 {w} {h}">')
+
+
+def _close_svg(out: _SvgWriter, defs: Optional[_ShapeDefs] = None) -> None:
+    _write_defs(out, defs)
+    out.write("</svg>")
+
+
+def _write_defs(out: _SvgWriter, defs: Optional[_ShapeDefs]) -> None:
+    # Written last so a streamed document never has to be revisited;
+    # <use> may reference definitions that appear later in the file.
+    if defs is not None and defs.shapes:
+        out.write(defs.markup())
+
+
+def _open_tile(
+    out: _SvgWriter,
+    x: int,
+    y: int,
+    w: int,
+    h: int,
+    selected: bool = False,
+    attrs: str = "",
+) -> None:
+    stroke = "#58a6ff" if selected else "rgba(255,255,255,.18)"
+    stroke_w = 4 if selected else 2
+    fill = "#1f2937" if selected else "#161b22"
+    out.write(
+        f"""<g{attrs}>
+  <rect x="{x}" y="{y}" width="{w}" height="{h}" rx="16"
+        fill="{fill}" stroke="{stroke}" stroke-width="{stroke_w}"/>
+  """
+    )
+
+
+def _close_tile(out: _SvgWriter) -> None:
+    out.write("\n</g>")
+
+
+def _lines(out: _SvgWriter, lines: List, ox: int, oy: int, stroke: str = "#e6edf3", stroke_w: int = 3) -> None:
     for (x1, y1), (x2, y2) in lines:
-        out += f'<line x1="{x1+ox}" y1="{y1+oy}" x2="{x2+ox}" y2="{y2+oy}" stroke="{stroke}" stroke-width="{stroke_w}" stroke-linecap="round" />'
-    return out
+        out.write(f'<line x1="{x1+ox}" y1="{y1+oy}" x2="{x2+ox}" y2="{y2+oy}" stroke="{stroke}" stroke-width="{stroke_w}" stroke-linecap="round" />')
 
 
-def _render_option_tiles_rotations(options: List[Dict[str, Any]], y: int, selected_label: Optional[str], show_labels: bool = True) -> str:
+def _render_option_tiles_rotations(out: _SvgWriter, options: List[Dict[str, Any]], y: int, selected_label: Optional[str], show_labels: bool = True, defs: Optional[_ShapeDefs] = None) -> None:
     labels = ["A", "B", "C", "D"]
     tile_w, tile_h = 200, 140
     gap = 24
     x0 = 24
-    out = ""
     sel = (selected_label or "").upper() if selected_label else None
 
     for i in range(min(4, len(options))):
         x = x0 + i * (tile_w + gap)
         rot = options[i]["rotation"]
-        inner = ""
+        _open_tile(out, x, y, tile_w, tile_h, selected=(labels[i] == sel))
         if show_labels:
-            inner += _text(x + 16, y + 34, labels[i], size=18, color="#9aa4b2")
-        inner += _draw_shape(shape=options[i].get("shape", "triangle"), x=x + tile_w // 2, y=y + 92, size=28, rotation=rot, opacity=options[i].get("opacity", 1.0))
-        out += _tile(x, y, tile_w, tile_h, inner, selected=(labels[i] == sel))
-    return out
+            out.write(_text(x + 16, y + 34, labels[i], size=18, color="#9aa4b2"))
+        out.write(_draw_shape(shape=options[i].get("shape", "triangle"), x=x + tile_w // 2, y=y + 92, size=28, rotation=rot, opacity=options[i].get("opacity", 1.0), defs=defs))
+        _close_tile(out)
 
 
 # =========================
@@ -153,21 +513,88 @@ def render_question_svg(
     question: Dict,
     selected_option: Optional[str] = None,
     show_options: bool = False,
+    use_defs: bool = False,
+    compact: bool = False,
+    precision: int = DEFAULT_PRECISION,
+    theme: str = "screen",
 ) -> str:
     """
     Returns ONE SVG containing the question prompt (and optionally option tiles).
+    With use_defs=True each shape is defined once in <defs> and placed with
+    <use> when that makes the SVG smaller (stems that repeat shapes, such
+    as MATRIX); otherwise the inline rendering is returned.
+    With compact=True whitespace is stripped and numbers are written in
+    their shortest form, rounded to `precision` decimal places.
+    `theme` picks the colours (see THEMES).
     Contract expected from generator:
       - question["pattern_family"] in {"SEQUENCE","ODD_ONE_OUT","MATRIX","ANALOGY","COMPOSITION"}
       - question["stem"] dict
       - question["options"] list (len 4)
       - question["correct_index"] int
     """
-    assert "pattern_family" in question
-    assert "stem" in question
-    assert "options" in question
-    assert isinstance(question["options"], list)
-    assert len(question["options"]) == 4
-    assert isinstance(question["correct_index"], int)
+    store = _ASSET_STORE
+    # The store only holds bare stems in its own mode; don't pay for a key
+    # that cannot hit. Once paid for, the key also caches misses, since the
+    # app re-renders the same stem on every rerun.
+    key = None
+    if store is not None and not show_options and theme == "screen" and store.serves(use_defs, compact, precision):
+        key = stem_asset_key(question, None, False, use_defs, compact, precision)
+        cached = _STEM_CACHE.get(key)
+        if cached is None:
+            cached = store.get_svg(key)
+            if cached is not None:
+                _STEM_CACHE.put(key, cached)
+        if cached is not None:
+            return cached
+
+    def render(defs_mode: bool) -> str:
+        out = _SvgWriter(compact=compact, precision=precision, theme=theme)
+        write_question_svg(question, out, selected_option, show_options, defs_mode)
+        return out.getvalue()
+
+    svg = _shortest(render, use_defs)
+    if key is not None:
+        _STEM_CACHE.put(key, svg)
+    return svg
+
+
+def _shortest(render: Callable[[bool], str], use_defs: bool) -> str:
+    """
+    render(use_defs), except that a <defs>/<use> rendering is only kept
+    when it is shorter than the inline one: the definitions and shared
+    style cost more than they save unless shapes repeat.
+    """
+    svg = render(use_defs)
+    if use_defs:
+        inline = render(False)
+        if len(inline) <= len(svg):
+            return inline
+    return svg
+
+
+def write_question_svg(
+    question: Dict,
+    out,
+    selected_option: Optional[str] = None,
+    show_options: bool = False,
+    use_defs: bool = False,
+    compact: bool = False,
+    precision: int = DEFAULT_PRECISION,
+    theme: str = "screen",
+) -> None:
+    """
+    Same as render_question_svg(), but streams the SVG into `out` (anything
+    with a write(str) method) instead of returning it. use_defs is applied
+    as given, since a streamed document cannot be compared afterwards.
+    The schema checks are skipped for a ValidatedQuestion.
+    """
+    if not is_trusted(question):
+        assert "pattern_family" in question
+        assert "stem" in question
+        assert "options" in question
+        assert isinstance(question["options"], list)
+        assert len(question["options"]) == 4
+        assert isinstance(question["correct_index"], int)
 
     family = question["pattern_family"]
     assert family in STEM_RENDERERS, (
@@ -175,44 +602,47 @@ def render_question_svg(
     )
     stem = question["stem"] or {}
     options = question["options"] or []
+    out = _as_writer(out, compact, precision, theme)
+    defs = _ShapeDefs() if use_defs else None
 
     if family == "SEQUENCE":
-        return _render_sequence(stem, options, selected_option, show_options)
+        _render_sequence(out, stem, options, selected_option, show_options, defs)
 
-    if family == "ODD_ONE_OUT":
-        return _render_odd_one_out(stem, options, selected_option, show_options)
+    elif family == "ODD_ONE_OUT":
+        _render_odd_one_out(out, stem, options, selected_option, show_options, defs)
 
-    if family == "MATRIX":
-        return _render_matrix_stem(question["stem"])
+    elif family == "MATRIX":
+        _render_matrix_stem(out, question["stem"], defs)
 
-    if family == "ANALOGY":
-        return _render_analogy_stem(question["stem"])
+    elif family == "ANALOGY":
+        _render_analogy_stem(out, question["stem"], defs)
 
-    if family == "COMPOSITION":
-        return _render_composition_stem(question["stem"])
+    elif family == "COMPOSITION":
+        _render_composition_stem(out, question["stem"], defs)
 
-    # fallback
-    inner = _text(24, 44, f"{family or 'QUESTION'}", size=22)
-    inner += _text(24, 78, "Renderer not implemented for this pattern_family.", size=16, color="#9aa4b2")
-    if show_options and options:
-        inner += _render_option_tiles_rotations(options, y=230, selected_label=selected_option)
-    return _svg_wrap(inner, 920, 420)
+    else:
+        # fallback
+        _open_canvas(out, 920, 420)
+        out.write(_text(24, 44, f"{family or 'QUESTION'}", size=22))
+        out.write(_text(24, 78, "Renderer not implemented for this pattern_family.", size=16, color="#9aa4b2"))
+        if show_options and options:
+            _render_option_tiles_rotations(out, options, y=230, selected_label=selected_option, defs=defs)
+        _close_canvas(out, defs)
 
 
 # =========================
 # Renderers
 # =========================
-def _render_sequence(stem: Dict, options: List[Dict[str, Any]], selected: Optional[str], show_options: bool) -> str:
+def _render_sequence(out: _SvgWriter, stem: Dict, options: List[Dict[str, Any]], selected: Optional[str], show_options: bool, defs: Optional[_ShapeDefs] = None) -> None:
     seq = stem.get("items") or []
-    inner = """
-<defs>
+    _open_canvas(out, 920, 420)
+    out.write("""<defs>
   <marker id="arrowhead" markerWidth="10" markerHeight="7"
           refX="10" refY="3.5" orient="auto">
     <polygon points="0 0, 10 3.5, 0 7" fill="#6ea8fe"/>
   </marker>
-</defs>
-""".strip()
-    inner += _text(24, 44, "Sequence", size=22)
+</defs>""")
+    out.write(_text(24, 44, "Sequence", size=22))
 
     def _arrow(x1: int, y: int, x2: int) -> str:
         return (
@@ -225,23 +655,24 @@ def _render_sequence(stem: Dict, options: List[Dict[str, Any]], selected: Option
     y = 140
     for i, item in enumerate(seq[:4]):
         x = start_x + i * gap
-        inner += _draw_shape(shape=item.get("shape", "triangle"), x=x, y=y, size=28, rotation=item.get("rotation", 0), opacity=item.get("opacity", 1.0))
+        out.write(_draw_shape(shape=item.get("shape", "triangle"), x=x, y=y, size=28, rotation=item.get("rotation", 0), opacity=item.get("opacity", 1.0), defs=defs))
         if i < len(seq[:4]) - 1:
-            inner += _arrow(x + 40, y, x + gap - 40)
+            out.write(_arrow(x + 40, y, x + gap - 40))
 
     qx = start_x + len(seq[:4]) * gap
-    inner += (
+    out.write(
         f'<text x="{qx}" y="{y + 12}" text-anchor="middle" '
         'font-size="44" font-weight="600" fill="#6ea8fe">?</text>'
     )
 
     if show_options and options:
-        inner += _render_option_tiles_rotations(options, y=230, selected_label=selected)
-    return _svg_wrap(inner, 920, 420)
+        _render_option_tiles_rotations(out, options, y=230, selected_label=selected, defs=defs)
+    _close_canvas(out, defs)
 
 
-def _render_odd_one_out(stem: Dict, options: List[Dict[str, Any]], selected: Optional[str], show_options: bool) -> str:
-    inner = _text(24, 44, "Odd one out", size=22)
+def _render_odd_one_out(out: _SvgWriter, stem: Dict, options: List[Dict[str, Any]], selected: Optional[str], show_options: bool, defs: Optional[_ShapeDefs] = None) -> None:
+    _open_canvas(out, 920, 420)
+    out.write(_text(24, 44, "Odd one out", size=22))
     items = stem.get("items") or []
     labels = ["A", "B", "C", "D"]
     selected_ref_index = None
@@ -258,17 +689,18 @@ def _render_odd_one_out(stem: Dict, options: List[Dict[str, Any]], selected: Opt
     for i, item in enumerate(items[:4]):
         x = x0 + i * (tile_w + gap)
         rot = item.get("rotation", 0)
-        inner_tile = ""
+        _open_tile(out, x, y, tile_w, tile_h, selected=(selected_ref_index == i))
         if show_options:
-            inner_tile += _text(x + 16, y + 34, labels[i], size=18, color="#9aa4b2")
-        inner_tile += _draw_shape(shape=item.get("shape", "triangle"), x=x + tile_w // 2, y=y + 92, size=28, rotation=rot, opacity=item.get("opacity", 1.0))
-        inner += _tile(x, y, tile_w, tile_h, inner_tile, selected=(selected_ref_index == i))
-    return _svg_wrap(inner, 920, 420)
+            out.write(_text(x + 16, y + 34, labels[i], size=18, color="#9aa4b2"))
+        out.write(_draw_shape(shape=item.get("shape", "triangle"), x=x + tile_w // 2, y=y + 92, size=28, rotation=rot, opacity=item.get("opacity", 1.0), defs=defs))
+        _close_tile(out)
+    _close_canvas(out, defs)
 
 
-def _render_matrix(stem: Dict, options: List[Dict[str, Any]], selected: Optional[str], show_options: bool) -> str:
+def _render_matrix(out: _SvgWriter, stem: Dict, options: List[Dict[str, Any]], selected: Optional[str], show_options: bool, defs: Optional[_ShapeDefs] = None) -> None:
     m = stem.get("items") or []
-    inner = _text("50%", 40, "Matrix", size=22, anchor="middle")
+    _open_canvas(out, 920, 440)
+    out.write(_text("50%", 40, "Matrix", size=22, anchor="middle"))
 
     grid = 3
     cell = 84
@@ -286,18 +718,18 @@ def _render_matrix(stem: Dict, options: List[Dict[str, Any]], selected: Optional
             x = start_x + c * (cell + gap)
             y = start_y + r * (cell + gap)
             # cell outline
-            inner += f'<rect x="{x}" y="{y}" width="{cell}" height="{cell}" rx="12" fill="none" stroke="rgba(255,255,255,.16)" />'
+            out.write(f'<rect x="{x}" y="{y}" width="{cell}" height="{cell}" rx="12" fill="none" stroke="rgba(255,255,255,.16)" />')
             if v is None:
-                inner += _text(x + cell / 2, y + cell / 2 + 8, "?", size=26, color="#9aa4b2", anchor="middle")
+                out.write(_text(x + cell / 2, y + cell / 2 + 8, "?", size=26, color="#9aa4b2", anchor="middle"))
             else:
-                inner += _draw_shape(shape=v.get("shape", "triangle"), x=x + cell // 2, y=y + cell // 2, size=28, rotation=int(v.get("rotation", 0)), opacity=v.get("opacity", 1.0))
+                out.write(_draw_shape(shape=v.get("shape", "triangle"), x=x + cell // 2, y=y + cell // 2, size=28, rotation=int(v.get("rotation", 0)), opacity=v.get("opacity", 1.0), defs=defs))
 
     if show_options and options:
-        inner += _render_option_tiles_rotations(options, y=250, selected_label=selected)
-    return _svg_wrap(inner, 920, 440)
+        _render_option_tiles_rotations(out, options, y=250, selected_label=selected, defs=defs)
+    _close_canvas(out, defs)
 
 
-def _render_matrix_stem(stem: dict) -> str:
+def _render_matrix_stem(out: _SvgWriter, stem: dict, defs: Optional[_ShapeDefs] = None) -> None:
     """
     Render a MATRIX stem grid with one missing cell.
     """
@@ -310,9 +742,7 @@ def _render_matrix_stem(stem: dict) -> str:
     width = cols * cell_size + padding * 2
     height = rows * cell_size + padding * 2
 
-    svg = [
-        f'<svg width="{width}" height="{height}" viewBox="0 0 {width} {height}">'
-    ]
+    _open_svg(out, width, height)
 
     for r in range(rows):
         for c in range(cols):
@@ -322,22 +752,19 @@ def _render_matrix_stem(stem: dict) -> str:
             cell = cells[r][c]
             if cell is None:
                 # missing cell indicator
-                svg.append(
+                out.write(
                     f'<rect x="{x-30}" y="{y-30}" width="60" height="60" '
                     f'rx="8" ry="8" stroke="#4DA3FF" stroke-width="2" fill="none"/>'
                 )
             else:
-                svg.append(
-                    _draw_shape(shape=cell.get("shape", "triangle"), x=x, y=y, size=28, rotation=cell.get("rotation", 0), opacity=cell.get("opacity", 1.0))
+                out.write(
+                    _draw_shape(shape=cell.get("shape", "triangle"), x=x, y=y, size=28, rotation=cell.get("rotation", 0), opacity=cell.get("opacity", 1.0), defs=defs)
                 )
 
-    svg.append("</svg>")
-    return "".join(svg)
-
+    _close_svg(out, defs)
 
 
-
-def _render_analogy_stem(stem: dict) -> str:
+def _render_analogy_stem(out: _SvgWriter, stem: dict, defs: Optional[_ShapeDefs] = None) -> None:
     """
     Render A → B :: C → ?
     """
@@ -346,9 +773,7 @@ def _render_analogy_stem(stem: dict) -> str:
     width = 4 * cell_size + 3 * gap
     height = cell_size + 40
 
-    svg = [
-        f'<svg width="{width}" height="{height}" viewBox="0 0 {width} {height}">'
-    ]
+    _open_svg(out, width, height)
 
     items = [stem["A"], stem["B"], stem["C"], None]
 
@@ -357,25 +782,23 @@ def _render_analogy_stem(stem: dict) -> str:
         y = height // 2
 
         if item is None:
-            svg.append(
+            out.write(
                 f'<text x="{x}" y="{y+10}" font-size="36" text-anchor="middle" fill="#4DA3FF">?</text>'
             )
         else:
-            svg.append(
-                _draw_shape(shape=item.get("shape", "triangle"), x=x, y=y, size=28, rotation=item.get("rotation", 0), opacity=item.get("opacity", 1.0))
+            out.write(
+                _draw_shape(shape=item.get("shape", "triangle"), x=x, y=y, size=28, rotation=item.get("rotation", 0), opacity=item.get("opacity", 1.0), defs=defs)
             )
 
         if i in (0, 2):
-            svg.append(
+            out.write(
                 f'<text x="{x + cell_size}" y="{y+10}" font-size="24" fill="#888">→</text>'
             )
 
-    svg.append("</svg>")
-    return "".join(svg)
-
+    _close_svg(out, defs)
 
 
-def _render_composition_stem(stem: dict) -> str:
+def _render_composition_stem(out: _SvgWriter, stem: dict, defs: Optional[_ShapeDefs] = None) -> None:
     """
     Render composition stem: Input A + Input B → ?
     """
@@ -384,9 +807,7 @@ def _render_composition_stem(stem: dict) -> str:
     width = 3 * cell + 2 * gap
     height = cell + 40
 
-    svg = [
-        f'<svg width="{width}" height="{height}" viewBox="0 0 {width} {height}">'
-    ]
+    _open_svg(out, width, height)
 
     positions = [
         (cell // 2, height // 2),
@@ -394,112 +815,298 @@ def _render_composition_stem(stem: dict) -> str:
     ]
 
     for (x, y), item in zip(positions, stem["inputs"]):
-        svg.append(
-            _draw_shape(shape=item.get("shape", "triangle"), x=x, y=y, size=28, rotation=item.get("rotation", 0), opacity=item.get("opacity", 1.0))
+        out.write(
+            _draw_shape(shape=item.get("shape", "triangle"), x=x, y=y, size=28, rotation=item.get("rotation", 0), opacity=item.get("opacity", 1.0), defs=defs)
         )
 
-    svg.append(
+    out.write(
         f'<text x="{positions[1][0] + cell//2}" y="{height//2 + 8}" '
         f'font-size="28" fill="#888">+</text>'
     )
-    svg.append(
+    out.write(
         f'<text x="{width - cell//2}" y="{height//2 + 8}" '
         f'font-size="28" fill="#4DA3FF">?</text>'
     )
 
-    svg.append("</svg>")
-    return "".join(svg)
+    _close_svg(out, defs)
+
 
-def _render_structure_match(prompt: Dict, selected: Optional[str], show_options: bool) -> str:
+def _render_structure_match(out: _SvgWriter, prompt: Dict, selected: Optional[str], show_options: bool) -> None:
     # prompt is whatever generator gives; we just show a clear placeholder stem
-    inner = _text(24, 44, "Structure match", size=22)
-    inner += _text(24, 78, "Match the same connection structure.", size=16, color="#9aa4b2")
+    _open_canvas(out, 920, 380)
+    out.write(_text(24, 44, "Structure match", size=22))
+    out.write(_text(24, 78, "Match the same connection structure.", size=16, color="#9aa4b2"))
 
     # simple stem: circle -> square -> circle
-    inner += _draw_shape("circle", 260, 170, 36)
-    inner += _draw_shape("square", 360, 170, 38)
-    inner += _draw_shape("circle", 460, 170, 36)
-    inner += '<line x1="278" y1="170" x2="340" y2="170" stroke="#e6edf3" stroke-width="3" stroke-linecap="round"/>'
-    inner += '<line x1="380" y1="170" x2="442" y2="170" stroke="#e6edf3" stroke-width="3" stroke-linecap="round"/>'
+    out.write(_draw_shape("circle", 260, 170, 36))
+    out.write(_draw_shape("square", 360, 170, 38))
+    out.write(_draw_shape("circle", 460, 170, 36))
+    out.write('<line x1="278" y1="170" x2="340" y2="170" stroke="#e6edf3" stroke-width="3" stroke-linecap="round"/>')
+    out.write('<line x1="380" y1="170" x2="442" y2="170" stroke="#e6edf3" stroke-width="3" stroke-linecap="round"/>')
 
     # options are complex structures; for now we display prompt only (no options in SVG)
     # Streamlit will show A/B/C/D buttons.
-    return _svg_wrap(inner, 920, 380)
+    _close_canvas(out)
 
 
-def _render_hidden_shape(prompt: Dict, selected: Optional[str], show_options: bool) -> str:
-    inner = _text(24, 44, "Hidden shape", size=22)
-    inner += _text(24, 78, "Find the option that contains the target lines.", size=16, color="#9aa4b2")
+def _render_hidden_shape(out: _SvgWriter, prompt: Dict, selected: Optional[str], show_options: bool) -> None:
+    _open_canvas(out, 920, 380)
+    out.write(_text(24, 44, "Hidden shape", size=22))
+    out.write(_text(24, 78, "Find the option that contains the target lines.", size=16, color="#9aa4b2"))
 
     # draw a small target "L" on the left as stem
     target = prompt.get("target") or [((0, 0), (40, 0)), ((0, 0), (0, 40))]
-    inner += _tile(80, 120, 180, 180, _lines(target, ox=120, oy=160), selected=False)
+    _open_tile(out, 80, 120, 180, 180, selected=False)
+    _lines(out, target, ox=120, oy=160)
+    _close_tile(out)
 
-    return _svg_wrap(inner, 920, 380)
+    _close_canvas(out)
 
 
-def _render_sequence_option(option: Dict[str, Any]) -> str:
-    return _svg_wrap(
-        _draw_shape(shape=option.get("shape", "triangle"), x=460, y=170, size=28, rotation=int(option.get("rotation", 0)), opacity=option.get("opacity", 1.0)),
-        w=920,
-        h=340,
-    )
+def _render_sequence_option(out: _SvgWriter, option: Dict[str, Any], defs: Optional[_ShapeDefs] = None) -> None:
+    _open_canvas(out, w=920, h=340)
+    out.write(_draw_shape(shape=option.get("shape", "triangle"), x=460, y=170, size=28, rotation=int(option.get("rotation", 0)), opacity=option.get("opacity", 1.0), defs=defs))
+    _close_canvas(out, defs)
 
 
-def _render_matrix_cell(option: Dict[str, Any]) -> str:
-    inner = '<rect x="400" y="110" width="120" height="120" rx="14" fill="none" stroke="rgba(255,255,255,.16)" />'
-    inner += _draw_shape(shape=option.get("shape", "triangle"), x=460, y=170, size=28, rotation=int(option.get("rotation", 0)), opacity=option.get("opacity", 1.0))
-    return _svg_wrap(inner, w=920, h=340)
+def _render_matrix_cell(out: _SvgWriter, option: Dict[str, Any], defs: Optional[_ShapeDefs] = None) -> None:
+    _open_canvas(out, w=920, h=340)
+    out.write('<rect x="400" y="110" width="120" height="120" rx="14" fill="none" stroke="rgba(255,255,255,.16)" />')
+    out.write(_draw_shape(shape=option.get("shape", "triangle"), x=460, y=170, size=28, rotation=int(option.get("rotation", 0)), opacity=option.get("opacity", 1.0), defs=defs))
+    _close_canvas(out, defs)
 
 
-def _render_composite_option(option: dict) -> str:
+def _render_composite_option(out: _SvgWriter, option: dict, defs: Optional[_ShapeDefs] = None) -> None:
     """
     Render a composite (overlay) option.
     """
     items = option.get("items", [])
-    svg = [
-        '<svg width="120" height="120" viewBox="0 0 120 120">'
-    ]
+    _open_svg(out, 120, 120)
 
     for item in items:
-        svg.append(
-            _draw_shape(shape=item.get("shape", "triangle"), x=60, y=60, size=28, rotation=item.get("rotation", 0), opacity=0.6)
+        out.write(
+            _draw_shape(shape=item.get("shape", "triangle"), x=60, y=60, size=28, rotation=item.get("rotation", 0), opacity=0.6, defs=defs)
         )
 
-    svg.append("</svg>")
-    return "".join(svg)
+    _close_svg(out, defs)
 
 
-def _render_odd_item(option: Dict[str, Any]) -> str:
-    return _svg_wrap(
-        _draw_shape(shape=option.get("shape", "triangle"), x=460, y=170, size=28, rotation=int(option.get("rotation", 0)), opacity=option.get("opacity", 1.0)),
-        w=920,
-        h=340,
-    )
+def _render_odd_item(out: _SvgWriter, option: Dict[str, Any], defs: Optional[_ShapeDefs] = None) -> None:
+    _open_canvas(out, w=920, h=340)
+    out.write(_draw_shape(shape=option.get("shape", "triangle"), x=460, y=170, size=28, rotation=int(option.get("rotation", 0)), opacity=option.get("opacity", 1.0), defs=defs))
+    _close_canvas(out, defs)
 
 
-def render_option_svg(option: dict, pattern_family: str) -> str:
+def render_option_svg(
+    option: dict,
+    pattern_family: str,
+    use_defs: bool = False,
+    compact: bool = False,
+    precision: int = DEFAULT_PRECISION,
+) -> str:
     """
     Render a single option visual in isolation.
     This is used by the student UI for the visual option grid.
+    use_defs, compact and precision work as in render_question_svg.
     """
     assert pattern_family in OPTION_RENDERERS, (
         f"No option renderer implemented for pattern family: {pattern_family}"
     )
-    if pattern_family == "SEQUENCE":
-        return _render_sequence_option(option)
+    try:
+        key = (pattern_family, use_defs, compact, precision if compact else None, _freeze(option))
+    except TypeError:
+        return _render_option(option, pattern_family, use_defs, compact, precision)
 
-    if pattern_family == "MATRIX":
-        return _render_matrix_cell(option)
+    cached = _OPTION_CACHE.get(key)
+    if cached is None:
+        store = _ASSET_STORE
+        if store is not None and store.serves(use_defs, compact, precision):
+            cached = store.get_svg(option_asset_key(option, pattern_family, use_defs, compact, precision))
+        if cached is None:
+            cached = _render_option(option, pattern_family, use_defs, compact, precision)
+        _OPTION_CACHE.put(key, cached)
+    return cached
 
-    if pattern_family == "ANALOGY":
-        return _render_sequence_option(option)
 
+OPTION_LABELS = ("A", "B", "C", "D")
 
-    if pattern_family == "ODD_ONE_OUT":
-        return _render_odd_item(option)
 
-    if pattern_family == "COMPOSITION":
-        return _render_composite_option(option)
+def render_options_grid_svg(
+    question: Dict,
+    selected_index: Optional[int] = None,
+    compact: bool = False,
+    precision: int = DEFAULT_PRECISION,
+    theme: str = "screen",
+) -> str:
+    """
+    Render all four options as ONE 2x2 SVG for the svg_options component.
+    Each card is a <g id="option-A" class="option-card"> (B, C, D likewise),
+    which is what the component's click handlers look for.
+    compact, precision and theme work as in render_question_svg.
+    """
+    options = question["options"]
+    family = question["pattern_family"]
+    assert family in OPTION_RENDERERS, (
+        f"No option renderer implemented for pattern family: {family}"
+    )
+    assert len(options) == 4
+
+    card_w, card_h = 200, 150
+    gap = 16
+    pad = 12
+    width = pad * 2 + card_w * 2 + gap
+    height = pad * 2 + card_h * 2 + gap
+    out = _SvgWriter(compact=compact, precision=precision, theme=theme)
+    defs = _ShapeDefs()
+
+    _open_canvas(out, width, height)
+    for i, option in enumerate(options):
+        x = pad + (i % 2) * (card_w + gap)
+        y = pad + (i // 2) * (card_h + gap)
+        cx, cy = x + card_w // 2, y + card_h // 2 + 8
+
+        _open_tile(
+            out, x, y, card_w, card_h,
+            selected=(selected_index == i),
+            attrs=f' id="option-{OPTION_LABELS[i]}" class="option-card"',
+        )
+        out.write(_text(x + 16, y + 30, OPTION_LABELS[i], size=18, color="#9aa4b2"))
+        if family == "ODD_ONE_OUT" and "ref_index" in option:
+            # ODD_ONE_OUT options point at a stem item rather than carrying a shape.
+            option = question["stem"]["items"][option["ref_index"]]
+        if family == "COMPOSITION":
+            for item in option.get("items", []):
+                out.write(_draw_shape(shape=item.get("shape", "triangle"), x=cx, y=cy, size=40, rotation=item.get("rotation", 0), opacity=0.6, defs=defs))
+        else:
+            if family == "MATRIX":
+                out.write(f'<rect x="{cx - 40}" y="{cy - 40}" width="80" height="80" rx="12" fill="none" stroke="rgba(255,255,255,.16)" />')
+            out.write(_draw_shape(shape=option.get("shape", "triangle"), x=cx, y=cy, size=40, rotation=int(option.get("rotation", 0)), opacity=option.get("opacity", 1.0), defs=defs))
+        _close_tile(out)
+    _close_canvas(out, defs)
 
-    raise ValueError(f"Unsupported pattern family: {pattern_family}")
+    return out.getvalue()
+
+
+def _render_option(
+    option: dict,
+    pattern_family: str,
+    use_defs: bool = False,
+    compact: bool = False,
+    precision: int = DEFAULT_PRECISION,
+) -> str:
+    return _shortest(lambda defs_mode: _render_option_svg(option, pattern_family, defs_mode, compact, precision), use_defs)
+
+
+def _render_option_svg(option: dict, pattern_family: str, use_defs: bool, compact: bool, precision: int) -> str:
+    out = _SvgWriter(compact=compact, precision=precision)
+    defs = _ShapeDefs() if use_defs else None
+    if pattern_family in ("SEQUENCE", "ANALOGY"):
+        _render_sequence_option(out, option, defs)
+
+    elif pattern_family == "MATRIX":
+        _render_matrix_cell(out, option, defs)
+
+    elif pattern_family == "ODD_ONE_OUT":
+        _render_odd_item(out, option, defs)
+
+    elif pattern_family == "COMPOSITION":
+        _render_composite_option(out, option, defs)
+
+    else:
+        raise ValueError(f"Unsupported pattern family: {pattern_family}")
+
+    return out.getvalue()
+
+
+# =========================
+# Worksheets
+# =========================
+WORKSHEET_LAYOUTS = {
+    "a4": {"page_size": "A4", "per_page": 4},
+    "letter": {"page_size": "letter", "per_page": 4},
+}
+# Below this many pages a process pool costs more than it saves.
+_MIN_POOL_PAGES = 16
+
+_WORKSHEET_STYLE = """<style>
+@page {{ size: {page_size}; margin: 12mm; }}
+body {{ font-family: Inter, system-ui, Arial, sans-serif; margin: 0; }}
+.page {{ break-after: page; }}
+.page h1 {{ font-size: 16pt; margin: 0 0 4mm; }}
+.question {{ display: flex; align-items: center; gap: 6mm; margin-bottom: 6mm; break-inside: avoid; }}
+.question .number {{ font-weight: 700; font-size: 14pt; width: 10mm; }}
+.question .stem {{ flex: 3; }}
+.question .options {{ flex: 2; }}
+.question svg {{ max-width: 100%; height: auto; }}
+.answer-key ol {{ columns: 4; font-size: 11pt; }}
+</style>"""
+
+
+def _render_worksheet_page(task: Tuple[int, str, List[Dict]]) -> str:
+    """
+    One worksheet page as HTML. Module-level so a process pool can run it.
+    """
+    first_number, heading, questions = task
+    out = _SvgWriter()
+    out.write(f'<section class="page"><h1>{heading}</h1>')
+    for number, question in enumerate(questions, start=first_number):
+        out.write(f'<div class="question"><div class="number">{number}.</div><div class="stem">')
+        write_question_svg(question, out, use_defs=True, theme="print")
+        out.write('</div><div class="options">')
+        out.write(render_options_grid_svg(question, compact=True, theme="print"))
+        out.write("</div></div>")
+    out.write("</section>")
+    return out.getvalue()
+
+
+def render_worksheet(
+    questions: List[Dict],
+    layout: str = "a4",
+    out=None,
+    title: str = "NVR Worksheet",
+    answer_key: bool = True,
+    workers: Optional[int] = None,
+) -> Optional[str]:
+    """
+    Lay `questions` out as one printable HTML document: `layout` sets the
+    page size and questions per page (see WORKSHEET_LAYOUTS), each page
+    shows the stems beside their A-D option grids in the "print" theme,
+    and an answer key from correct_index closes the document.
+
+    With `out` (anything with write()) the document is streamed page by
+    page and None is returned; otherwise the HTML string is returned.
+    Large runs render pages across a process pool of `workers` processes
+    (default: CPU count; 1 renders in-process).
+    """
+    assert layout in WORKSHEET_LAYOUTS, f"Unknown worksheet layout: {layout}"
+    settings = WORKSHEET_LAYOUTS[layout]
+    per_page = settings["per_page"]
+    heading = html.escape(title)
+
+    target = _SvgWriter(out)
+    target.write(
+        f'<!DOCTYPE html><html lang="en"><head><meta charset="utf-8" />'
+        f"<title>{heading}</title>{_WORKSHEET_STYLE.format(page_size=settings['page_size'])}</head><body>"
+    )
+
+    tasks = [
+        (start + 1, f"{heading} &middot; page {start // per_page + 1}", questions[start:start + per_page])
+        for start in range(0, len(questions), per_page)
+    ]
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(tasks) >= _MIN_POOL_PAGES:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for page in pool.map(_render_worksheet_page, tasks, chunksize=max(1, len(tasks) // (workers * 4))):
+                target.write(page)
+    else:
+        for task in tasks:
+            target.write(_render_worksheet_page(task))
+
+    if answer_key and questions:
+        target.write(f'<section class="page answer-key"><h1>{heading} &middot; answers</h1><ol>')
+        for question in questions:
+            target.write(f"<li>{OPTION_LABELS[question['correct_index']]}</li>")
+        target.write("</ol></section>")
+
+    target.write("</body></html>")
+    return None if out is not None else target.getvalue()
@@ -0,0 +1,253 @@
+"""
+Local append-only spool for attempts the database could not take.
+
+The AttemptWriter appends rows here when its queue is full (Postgres slow)
+or a batch INSERT fails (Postgres down), and a loader thread replays the
+spool once the database is back. Rows carry a client-generated attempt_id
+and are inserted with ON CONFLICT DO NOTHING, so a segment that is replayed
+twice (crash between INSERT and unlink, two processes racing) still lands
+exactly once.
+
+Layout of the spool directory:
+
+    attempts-<pid>-<token>-<seq>.open        segment being appended to by process <pid>
+    attempts-<pid>-<token>-<seq>.jsonl       sealed segment, ready for replay
+    attempts-<pid>-<token>-<seq>.quarantine  rows the database rejected; never replayed
+
+<token> is random per AttemptSpool, so a restarted container that gets its
+old PID back never reuses a name. Segments are only ever moved with
+os.link + unlink and created exclusively, so no file is replaced.
+
+Each line is one row as a JSON array in ATTEMPT_COLUMNS order. Appends are
+group-committed: concurrent writers share one fsync. A torn last line left
+by a crash is skipped on replay. Segments left open by a process that no
+longer exists are sealed by the next loader that sees them.
+
+Rows Postgres rejects outright (constraint or data errors) would fail on
+every replay, so they are set aside in quarantine segments instead of
+holding up the rest. Once the cause is fixed, renaming a .quarantine file
+to .jsonl queues it for the next replay.
+"""
+import fcntl
+import json
+import logging
+import os
+import threading
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_MAX_BYTES = int(os.environ.get("NVR_SPOOL_SEGMENT_BYTES", str(4 * 1024 * 1024)))
+
+_PREFIX = "attempts-"
+_OPEN = ".open"
+_SEALED = ".jsonl"
+_QUARANTINE = ".quarantine"
+_LOCK_FILENAME = "replay.lock"
+
+Row = Tuple[Any, ...]
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _segment_pid(path: Path) -> Optional[int]:
+    try:
+        return int(path.name[len(_PREFIX):].split("-", 1)[0])
+    except ValueError:
+        return None
+
+
+def _move(path: Path, suffix: str) -> Path:
+    """
+    Give `path` the suffix `suffix` without replacing an existing file; on a
+    clash the new name gets a random tag. Returns the new path.
+    """
+    target = path.with_suffix(suffix)
+    while True:
+        try:
+            os.link(path, target)
+        except FileExistsError:
+            target = path.with_name(f"{path.stem}-{uuid.uuid4().hex[:8]}{suffix}")
+            continue
+        os.unlink(path)
+        return target
+
+
+class AttemptSpool:
+    """
+    Append-only segment files in `directory`. Thread-safe; each process
+    appends to its own segment.
+    """
+
+    def __init__(self, directory: Path, segment_max_bytes: int = SEGMENT_MAX_BYTES):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segment_max_bytes = segment_max_bytes
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._file = None
+        self._path: Optional[Path] = None
+        self._token = uuid.uuid4().hex[:12]
+        self._seq = 0
+        self._written = 0
+        self._synced = 0
+        self.appended = 0
+        self.quarantined = 0
+
+    def _segment_path(self, suffix: str) -> Path:
+        # Called with self._lock held.
+        self._seq += 1
+        return self.directory / f"{_PREFIX}{os.getpid()}-{self._token}-{self._seq:06d}{suffix}"
+
+    def _open_segment(self):
+        # Called with self._lock held.
+        if self._file is None:
+            self._path = self._segment_path(_OPEN)
+            self._file = self._path.open("x", encoding="utf-8")
+        return self._file
+
+    @staticmethod
+    def _encode(rows: List[Row]) -> str:
+        return "".join(json.dumps(list(row), default=str, separators=(",", ":")) + "\n" for row in rows)
+
+    def append(self, rows: List[Row]) -> None:
+        """
+        Append `rows` and return once they are on disk.
+        """
+        if not rows:
+            return
+        data = self._encode(rows)
+        with self._lock:
+            file = self._open_segment()
+            file.write(data)
+            file.flush()
+            self._written += 1
+            self.appended += len(rows)
+            target = self._written
+            roll = file.tell() >= self.segment_max_bytes
+        self._sync(target)
+        if roll:
+            self.seal()
+
+    def _sync(self, target: int) -> None:
+        with self._sync_lock:
+            if self._synced >= target:
+                return  # another appender's fsync already covered these rows
+            with self._lock:
+                file, written = self._file, self._written
+            if file is not None:
+                os.fsync(file.fileno())
+            self._synced = written
+
+    def seal(self) -> None:
+        """
+        Close the active segment so the loader can replay it.
+        """
+        with self._sync_lock, self._lock:
+            if self._file is None:
+                return
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._synced = self._written
+            _move(self._path, _SEALED)
+            self._file = None
+            self._path = None
+
+    def quarantine(self, rows: List[Row]) -> Optional[Path]:
+        """
+        Write `rows` to a new quarantine segment and return its path.
+        """
+        if not rows:
+            return None
+        data = self._encode(rows)
+        with self._lock:
+            path = self._segment_path(_QUARANTINE)
+            self.quarantined += len(rows)
+        with path.open("x", encoding="utf-8") as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        return path
+
+    def has_segments(self) -> bool:
+        """
+        True if there is anything to replay (quarantined rows do not count).
+        """
+        return any(self.directory.glob(f"{_PREFIX}*{_SEALED}")) or any(self.directory.glob(f"{_PREFIX}*{_OPEN}"))
+
+    def _claim_orphans(self) -> None:
+        for path in self.directory.glob(f"{_PREFIX}*{_OPEN}"):
+            pid = _segment_pid(path)
+            if pid is not None and pid != os.getpid() and not _pid_alive(pid):
+                _move(path, _SEALED)
+
+    @staticmethod
+    def _read_segment(path: Path) -> Iterator[Row]:
+        with path.open("r", encoding="utf-8") as file:
+            for number, line in enumerate(file, 1):
+                try:
+                    yield tuple(json.loads(line))
+                except ValueError:
+                    logger.warning("Skipping unreadable line %d of %s", number, path.name)
+
+    def replay(
+        self,
+        write: Callable[[List[Row]], None],
+        batch_size: int = 500,
+        is_transient: Callable[[Exception], bool] = lambda exc: True,
+    ) -> int:
+        """
+        Feed every sealed segment to `write` in batches, deleting each one
+        once it is fully written. The active segment is sealed first.
+
+        A transient failure (per `is_transient`) stops the replay and
+        propagates; that segment is retried next time. Any other failure
+        moves the segment to quarantine and the replay goes on with the
+        next one. Returns the number of rows handed to `write`.
+        """
+        self.seal()
+        with (self.directory / _LOCK_FILENAME).open("a") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return 0  # another process is replaying
+            self._claim_orphans()
+            replayed = 0
+            for path in sorted(self.directory.glob(f"{_PREFIX}*{_SEALED}")):
+                try:
+                    replayed += self._replay_segment(path, write, batch_size)
+                except Exception as exc:
+                    if is_transient(exc):
+                        raise
+                    logger.error("Quarantining %s, rejected by the database: %s", path.name, exc)
+                    _move(path, _QUARANTINE)
+                    continue
+                path.unlink()
+            return replayed
+
+    def _replay_segment(self, path: Path, write: Callable[[List[Row]], None], batch_size: int) -> int:
+        written = 0
+        batch: List[Row] = []
+        for row in self._read_segment(path):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                write(batch)
+                written += len(batch)
+                batch = []
+        if batch:
+            write(batch)
+            written += len(batch)
+        return written
+
+    def close(self) -> None:
+        self.seal()
@@ -0,0 +1,514 @@
+"""
+Write-behind batching for nvr_attempts.
+
+record_attempt() hands the row to an AttemptWriter and returns at once; a
+background thread inserts queued rows with one multi-row INSERT
+(execute_values) per batch, when `batch_size` rows are waiting or
+`flush_interval` seconds after the oldest one arrived, whichever is first.
+Remaining rows are flushed at interpreter exit.
+
+When Postgres is slow (queue full) or unreachable (a transient error, see
+is_transient), rows go to a local AttemptSpool instead of blocking submit()
+or being lost, and a loader thread replays the spool every
+NVR_ATTEMPT_REPLAY_INTERVAL seconds. Each row carries a client-generated
+attempt_id, and inserts skip ids that are already present, so replays are
+idempotent. A batch the database rejects for any other reason is retried
+row by row, and only the rows that still fail are quarantined in the spool
+(or dropped, with an error logged, when there is no spool). Read caches
+that count attempts not yet written track them with PendingAttempts, which
+learns when rows settle through add_write_listener.
+
+Settings come from the environment:
+
+    NVR_ATTEMPT_BATCH_SIZE       rows per INSERT (default 200)
+    NVR_ATTEMPT_FLUSH_INTERVAL   max seconds a row waits (default 1.0)
+    NVR_ATTEMPT_QUEUE_MAX        queued rows before submit() spools (default 10000)
+    NVR_ATTEMPT_SPOOL_DIR        spool directory (default .nvr_spool; empty disables)
+    NVR_ATTEMPT_REPLAY_INTERVAL  seconds between spool replays (default 5)
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+import psycopg2
+from psycopg2 import pool
+from psycopg2.extras import execute_values
+
+from nvr_proto.db import connection
+from nvr_proto.repository.attempt_spool import AttemptSpool
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = int(os.environ.get("NVR_ATTEMPT_BATCH_SIZE", "200"))
+FLUSH_INTERVAL = float(os.environ.get("NVR_ATTEMPT_FLUSH_INTERVAL", "1.0"))
+QUEUE_MAX = int(os.environ.get("NVR_ATTEMPT_QUEUE_MAX", "10000"))
+SPOOL_DIR = os.environ.get("NVR_ATTEMPT_SPOOL_DIR", ".nvr_spool")
+REPLAY_INTERVAL = float(os.environ.get("NVR_ATTEMPT_REPLAY_INTERVAL", "5"))
+
+ATTEMPT_COLUMNS = (
+    "attempt_id",
+    "session_id",
+    "user_id",
+    "pattern_family",
+    "difficulty",
+    "selected_index",
+    "correct_index",
+    "is_correct",
+    "response_ms",
+    "pattern_id",
+    "level",
+    "ts",
+)
+_INSERT_SQL = (
+    f"INSERT INTO nvr_attempts ({', '.join(ATTEMPT_COLUMNS)}) VALUES %s "
+    "ON CONFLICT (attempt_id) DO NOTHING "
+    "RETURNING session_id, is_correct, response_ms"
+)
+_SESSION_STATS_SQL = """
+INSERT INTO nvr_session_stats (session_id, attempts, correct, total_response_ms) VALUES %s
+ON CONFLICT (session_id) DO UPDATE SET
+    attempts = nvr_session_stats.attempts + EXCLUDED.attempts,
+    correct = nvr_session_stats.correct + EXCLUDED.correct,
+    total_response_ms = nvr_session_stats.total_response_ms + EXCLUDED.total_response_ms,
+    updated_at = NOW()
+"""
+
+Row = Tuple[Any, ...]
+_ATTEMPT_ID = ATTEMPT_COLUMNS.index("attempt_id")
+
+
+_WRITE_LISTENERS: List[Callable[[List[Row], List[Row]], None]] = []
+
+
+def add_write_listener(listener: Callable[[List[Row], List[Row]], None]) -> None:
+    """
+    Call `listener(written, rejected)` whenever a writer in this process
+    settles rows, by a flush or a spool replay: `written` are in the
+    database (rows it already had count), `rejected` were quarantined or
+    dropped. Listeners run on the writer threads and must be quick.
+    """
+    if listener not in _WRITE_LISTENERS:
+        _WRITE_LISTENERS.append(listener)
+
+
+def _notify_settled(written: List[Row], rejected: List[Row] = ()) -> None:
+    if not written and not rejected:
+        return
+    for listener in _WRITE_LISTENERS:
+        try:
+            listener(written, list(rejected))
+        except Exception:
+            logger.exception("Attempt write listener failed")
+
+
+class PendingAttempts:
+    """
+    Rows this process submitted that are not known to be in the database
+    yet (queued, being written, or spooled while Postgres is down), grouped
+    by one ATTEMPT_COLUMNS `column`. Read caches add them to what a query
+    returns. Rows leave when a writer reports them settled, or when a load
+    finds them already stored (forget); `on_rejected(row)` runs for tracked
+    rows that will never be stored.
+
+    Callers hold `lock` around every call, together with the cache updates
+    that go with it; the write listener takes it itself.
+    """
+
+    def __init__(self, column: str, lock: threading.Lock, on_rejected: Optional[Callable[[Row], None]] = None):
+        self._key = ATTEMPT_COLUMNS.index(column)
+        self.lock = lock
+        self._on_rejected = on_rejected
+        self._rows: Dict[Any, Dict[str, Row]] = {}
+        add_write_listener(self._settled)
+
+    def __len__(self) -> int:
+        return sum(map(len, self._rows.values()))
+
+    def add(self, row: Row) -> None:
+        self._rows.setdefault(row[self._key], {})[row[_ATTEMPT_ID]] = row
+
+    def discard(self, row: Row) -> bool:
+        """Stop tracking `row`; False if it was not tracked (already settled)."""
+        return self._pop(row[self._key], row[_ATTEMPT_ID]) is not None
+
+    def get(self, key: Any) -> Dict[str, Row]:
+        """Copy of the rows tracked for `key`, by attempt_id."""
+        return dict(self._rows.get(key, ()))
+
+    def forget(self, key: Any, attempt_ids) -> None:
+        for attempt_id in attempt_ids:
+            self._pop(key, attempt_id)
+
+    def _pop(self, key: Any, attempt_id: str) -> Optional[Row]:
+        rows = self._rows.get(key)
+        if rows is None:
+            return None
+        row = rows.pop(attempt_id, None)
+        if not rows:
+            del self._rows[key]
+        return row
+
+    def _settled(self, written: List[Row], rejected: List[Row]) -> None:
+        with self.lock:
+            for row in written:
+                self._pop(row[self._key], row[_ATTEMPT_ID])
+            for row in rejected:
+                if self._pop(row[self._key], row[_ATTEMPT_ID]) is not None and self._on_rejected is not None:
+                    self._on_rejected(row)
+
+
+def is_transient(exc: Exception) -> bool:
+    """
+    True for failures that say nothing about the rows themselves (database
+    unreachable, connection dropped, no pool slot free), where writing the
+    same rows again later can succeed.
+    """
+    return isinstance(exc, (psycopg2.OperationalError, psycopg2.InterfaceError, pool.PoolError))
+
+
+def insert_attempts(rows: List[Row]) -> None:
+    """
+    Insert `rows` (tuples in ATTEMPT_COLUMNS order) in one statement, and
+    fold the rows that were actually new into nvr_session_stats, in one
+    transaction. Rows whose attempt_id is already stored are skipped by
+    both, so replays never double-count.
+    """
+    with connection() as conn:
+        with conn:
+            with conn.cursor() as cur:
+                inserted = execute_values(cur, _INSERT_SQL, rows, page_size=len(rows), fetch=True)
+                totals: Dict[str, List[int]] = {}
+                for session_id, is_correct, response_ms in inserted:
+                    total = totals.setdefault(session_id, [0, 0, 0])
+                    total[0] += 1
+                    total[1] += 1 if is_correct else 0
+                    total[2] += response_ms
+                if totals:
+                    # Sorted, so concurrent batches lock rollup rows in the same order.
+                    execute_values(
+                        cur,
+                        _SESSION_STATS_SQL,
+                        [(session_id, *total) for session_id, total in sorted(totals.items())],
+                        page_size=len(totals),
+                    )
+
+
+class AttemptWriter:
+    """
+    Bounded in-process queue drained by one flush thread.
+
+    With a `spool`, rows that do not fit in the queue and batches that fail
+    transiently are appended to it, and a second thread replays it. Without
+    one, submit() blocks while the queue is full and transiently failed
+    batches go back to the head of the queue for the next cycle.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = BATCH_SIZE,
+        flush_interval: float = FLUSH_INTERVAL,
+        max_queue: int = QUEUE_MAX,
+        write: Callable[[List[Row]], None] = insert_attempts,
+        spool: Optional[AttemptSpool] = None,
+        replay_interval: float = REPLAY_INTERVAL,
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self._write = write
+        self.spool = spool
+        self.replay_interval = replay_interval
+        self._queue: Deque[Row] = deque()
+        self._in_flight: List[Row] = []
+        self._oldest: Optional[float] = None
+        self._flush_requested = False
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._loader: Optional[threading.Thread] = None
+        self._stats = {
+            "enqueued": 0,
+            "written": 0,
+            "batches": 0,
+            "failures": 0,
+            "spooled": 0,
+            "replayed": 0,
+            "quarantined": 0,
+            "flush_total_ms": 0.0,
+            "flush_max_ms": 0.0,
+            "flush_last_ms": 0.0,
+        }
+
+    def _start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="nvr-attempt-writer", daemon=True)
+            self._thread.start()
+        if self.spool is not None and self._loader is None:
+            self._loader = threading.Thread(target=self._replay_loop, name="nvr-attempt-loader", daemon=True)
+            self._loader.start()
+
+    def submit(self, row: Row) -> None:
+        """
+        Queue one row. When the queue is full the row is spooled instead,
+        or, without a spool, this blocks until there is room.
+        """
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("AttemptWriter is closed")
+            self._start()
+            self._stats["enqueued"] += 1
+            spill = self.spool is not None and len(self._queue) >= self.max_queue
+            if not spill:
+                while len(self._queue) >= self.max_queue:
+                    self._cond.wait()
+                self._queue.append(row)
+                if self._oldest is None:
+                    # First row: the flush thread starts its interval timer.
+                    self._oldest = time.monotonic()
+                    self._cond.notify_all()
+                elif len(self._queue) >= self.batch_size:
+                    self._cond.notify_all()
+        if spill and not self._spool([row]):
+            _notify_settled([], [row])
+
+    def _spool(self, rows: List[Row]) -> bool:
+        try:
+            self.spool.append(rows)
+        except OSError:
+            logger.exception("Failed to spool %d attempts", len(rows))
+            return False
+        with self._cond:
+            self._stats["spooled"] += len(rows)
+        return True
+
+    def _quarantine(self, rows: List[Row]) -> None:
+        if not rows:
+            return
+        with self._cond:
+            self._stats["quarantined"] += len(rows)
+        if self.spool is not None:
+            try:
+                path = self.spool.quarantine(rows)
+            except OSError:
+                logger.exception("Failed to quarantine %d rejected attempts; dropped", len(rows))
+                return
+            logger.error("Quarantined %d attempts rejected by the database in %s", len(rows), path.name)
+        else:
+            logger.error("Dropped %d attempts rejected by the database", len(rows))
+
+    def _write_batch(self, batch: List[Row]) -> int:
+        """
+        Write `batch`; if the database rejects it for a non-transient reason,
+        write it row by row and quarantine the rows that still fail. Raises
+        only transient errors. Returns the number of rows written.
+        """
+        try:
+            self._write(batch)
+        except Exception as exc:
+            if is_transient(exc):
+                raise
+            if len(batch) == 1:
+                self._quarantine(batch)
+                _notify_settled([], batch)
+                return 0
+            logger.warning("Batch of %d attempts rejected (%s); retrying row by row", len(batch), exc)
+        else:
+            _notify_settled(batch)
+            return len(batch)
+        written, rejected = [], []
+        for row in batch:
+            try:
+                self._write([row])
+            except Exception as exc:
+                if is_transient(exc):
+                    _notify_settled(written)
+                    raise
+                rejected.append(row)
+            else:
+                written.append(row)
+        self._quarantine(rejected)
+        _notify_settled(written, rejected)
+        return len(written)
+
+    def _next_batch(self) -> Optional[List[Row]]:
+        # Called with the lock held; None once closed and drained.
+        while True:
+            if self._queue:
+                due = self._oldest + self.flush_interval
+                if (
+                    len(self._queue) >= self.batch_size
+                    or self._flush_requested
+                    or self._closed
+                    or time.monotonic() >= due
+                ):
+                    count = min(len(self._queue), self.batch_size)
+                    batch = [self._queue.popleft() for _ in range(count)]
+                    self._oldest = time.monotonic() if self._queue else None
+                    self._in_flight = batch
+                    self._cond.notify_all()
+                    return batch
+                self._cond.wait(max(0.0, due - time.monotonic()))
+            elif self._closed:
+                return None
+            else:
+                self._flush_requested = False
+                self._cond.notify_all()
+                self._cond.wait()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                batch = self._next_batch()
+            if batch is None:
+                return
+            started = time.perf_counter()
+            try:
+                written = self._write_batch(batch)
+            except Exception as exc:
+                spooled = self.spool is not None and self._spool(batch)
+                outcome = "spooled" if spooled else "will retry"
+                if is_transient(exc):
+                    logger.warning("Failed to write %d attempts (%s); %s", len(batch), exc, outcome)
+                else:
+                    logger.exception("Failed to write %d attempts; %s", len(batch), outcome)
+                with self._cond:
+                    self._stats["failures"] += 1
+                    if not spooled:
+                        self._queue.extendleft(reversed(batch))
+                        self._oldest = time.monotonic()
+                    self._in_flight = []
+                    self._cond.notify_all()
+                    if self._closed:
+                        if spooled:
+                            continue
+                        return
+                    self._cond.wait(self.flush_interval)
+                continue
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            with self._cond:
+                stats = self._stats
+                stats["written"] += written
+                stats["batches"] += 1
+                stats["flush_total_ms"] += elapsed_ms
+                stats["flush_last_ms"] = elapsed_ms
+                stats["flush_max_ms"] = max(stats["flush_max_ms"], elapsed_ms)
+                self._in_flight = []
+                self._cond.notify_all()
+
+    def _replay_loop(self) -> None:
+        while True:
+            with self._cond:
+                if not self._closed:
+                    self._cond.wait(self.replay_interval)
+                if self._closed:
+                    return
+            try:
+                if self.spool.has_segments():
+                    replayed = self.spool.replay(self._write_batch, self.batch_size, is_transient)
+                    with self._cond:
+                        self._stats["replayed"] += replayed
+            except Exception as exc:
+                if is_transient(exc):
+                    logger.warning("Spool replay deferred, database unavailable: %s", exc)
+                else:
+                    logger.exception("Spool replay failed; will retry")
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Write everything queued so far; True if it was written within
+        `timeout` seconds.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            if self._thread is None:
+                return not self._queue
+            self._flush_requested = True
+            self._cond.notify_all()
+            while self._queue or self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def close(self, timeout: Optional[float] = 10.0) -> bool:
+        """
+        Stop accepting rows and flush what is queued; whatever is still
+        unwritten after `timeout` seconds goes to the spool. Returns False if
+        rows were lost (no spool, or the spool failed).
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        with self._cond:
+            unwritten = list(self._queue)
+            if thread is not None and thread.is_alive():
+                unwritten = self._in_flight + unwritten  # idempotent if it lands after all
+            self._queue.clear()
+        if unwritten and self.spool is not None and self._spool(unwritten):
+            unwritten = []
+        if self.spool is not None:
+            self.spool.close()
+        if unwritten:
+            logger.error("AttemptWriter closed with %d unwritten attempts", len(unwritten))
+        return not unwritten
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            stats = dict(self._stats)
+            stats["queue_depth"] = len(self._queue)
+            stats["in_flight"] = len(self._in_flight)
+        batches = stats["batches"]
+        stats["flush_mean_ms"] = round(stats["flush_total_ms"] / batches, 3) if batches else 0.0
+        for key in ("flush_total_ms", "flush_max_ms", "flush_last_ms"):
+            stats[key] = round(stats[key], 3)
+        return stats
+
+
+_WRITER: Optional[AttemptWriter] = None
+_WRITER_PID: Optional[int] = None
+_WRITER_LOCK = threading.Lock()
+
+
+def get_attempt_writer() -> AttemptWriter:
+    """
+    The process-wide writer, created on first use (one per process, like
+    the connection pool).
+    """
+    global _WRITER, _WRITER_PID
+    pid = os.getpid()
+    if _WRITER is not None and _WRITER_PID == pid:
+        return _WRITER
+    with _WRITER_LOCK:
+        if _WRITER is None or _WRITER_PID != pid:
+            _WRITER = AttemptWriter(spool=AttemptSpool(SPOOL_DIR) if SPOOL_DIR else None)
+            _WRITER_PID = pid
+        return _WRITER
+
+
+def close_attempt_writer(timeout: Optional[float] = 10.0) -> bool:
+    global _WRITER, _WRITER_PID
+    with _WRITER_LOCK:
+        writer, _WRITER, _WRITER_PID = (_WRITER if _WRITER_PID == os.getpid() else None), None, None
+    return writer.close(timeout) if writer is not None else True
+
+
+def attempt_writer_stats() -> Dict[str, Any]:
+    """
+    Queue depth and flush latency of the shared writer (empty before first use).
+    """
+    if _WRITER is None or _WRITER_PID != os.getpid():
+        return {}
+    return _WRITER.stats()
+
+
+# Registered after db's close_pool, so it runs first and can still borrow
+# a connection for the final flush.
+atexit.register(close_attempt_writer)
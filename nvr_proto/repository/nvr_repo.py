@@ -1,54 +1,48 @@
 import os
-import psycopg2
-from psycopg2.extras import RealDictCursor
-from typing import Optional, Dict, Any
-
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
 
-def _get_conn():
-    db_url = os.getenv("DATABASE_URL")
-    if not db_url:
-        raise RuntimeError("DATABASE_URL not set")
-    return psycopg2.connect(db_url)
+from psycopg2.extras import RealDictCursor
+from typing import Optional, Dict, Any, List, Tuple
 
+from nvr_proto.db import connection
+from nvr_proto.migrations import ensure_schema
+from nvr_proto.repository.attempt_writer import ATTEMPT_COLUMNS, PendingAttempts, Row, get_attempt_writer
 
-def init_nvr_tables() -> None:
-    """
-    Idempotent schema init for NVR attempts. Safe to call on every app run.
-    """
-    ddl = """
-    CREATE TABLE IF NOT EXISTS nvr_attempts (
-        id BIGSERIAL PRIMARY KEY,
-        session_id TEXT NOT NULL,
-        user_id TEXT NULL,
+_SESSION_ID = ATTEMPT_COLUMNS.index("session_id")
+_IS_CORRECT = ATTEMPT_COLUMNS.index("is_correct")
+_RESPONSE_MS = ATTEMPT_COLUMNS.index("response_ms")
 
-        pattern_family TEXT NOT NULL,
-        difficulty TEXT NOT NULL,
+# Running [attempts, correct, total_response_ms] per session, most recently
+# used last. Loaded once from nvr_session_stats, then kept current by
+# record_attempt, so the sidebar summary needs no query on later reruns.
+SESSION_CACHE_MAX = int(os.environ.get("NVR_SESSION_CACHE_MAX", "10000"))
+_session_totals: "OrderedDict[str, List[int]]" = OrderedDict()
+_session_lock = threading.Lock()
 
-        selected_index INT NOT NULL,
-        correct_index INT NOT NULL,
-        is_correct BOOLEAN NOT NULL,
 
-        response_ms INT NOT NULL,
+def _add_to_totals(row: Row, sign: int) -> None:
+    # Called with _session_lock held.
+    totals = _session_totals.get(row[_SESSION_ID])
+    if totals is not None:
+        totals[0] += sign
+        totals[1] += sign if row[_IS_CORRECT] else 0
+        totals[2] += sign * row[_RESPONSE_MS]
 
-        ts TIMESTAMPTZ NOT NULL DEFAULT NOW()
-    );
 
-    CREATE INDEX IF NOT EXISTS idx_nvr_attempts_session_ts
-        ON nvr_attempts (session_id, ts DESC);
+# Attempts recorded here but not in nvr_session_stats yet; a rejected one
+# is taken back out of its session's totals.
+_unlanded = PendingAttempts("session_id", _session_lock, on_rejected=lambda row: _add_to_totals(row, -1))
 
-    CREATE INDEX IF NOT EXISTS idx_nvr_attempts_user_ts
-        ON nvr_attempts (user_id, ts DESC);
 
-    CREATE INDEX IF NOT EXISTS idx_nvr_attempts_pattern
-        ON nvr_attempts (pattern_family);
+def init_nvr_tables() -> None:
     """
-    conn = _get_conn()
-    try:
-        with conn:
-            with conn.cursor() as cur:
-                cur.execute(ddl)
-    finally:
-        conn.close()
+    Idempotent schema init for NVR attempts. Safe to call on every app run:
+    migrations run once per process, later calls return immediately.
+    """
+    ensure_schema()
 
 
 def record_attempt(
@@ -61,62 +55,108 @@ def record_attempt(
     correct_index: int,
     is_correct: bool,
     response_ms: int,
-) -> None:
+    pattern_id: Optional[str] = None,
+    level: Optional[int] = None,
+) -> str:
     """
-    Append-only attempt logging.
+    Append-only attempt logging. The row is queued on the shared
+    AttemptWriter (or its local spool) and inserted in a later batch; this
+    does not wait for Postgres. Returns the attempt's client-generated id.
     """
-    sql = """
-    INSERT INTO nvr_attempts (
-        session_id, user_id,
-        pattern_family, difficulty,
-        selected_index, correct_index, is_correct,
-        response_ms
+    attempt_id = str(uuid.uuid4())
+    row = (
+        attempt_id,
+        session_id,
+        user_id,
+        pattern_family,
+        difficulty,
+        selected_index,
+        correct_index,
+        is_correct,
+        response_ms,
+        pattern_id,
+        level,
+        datetime.now(timezone.utc),
     )
-    VALUES (%s,%s,%s,%s,%s,%s,%s,%s)
-    """
-    conn = _get_conn()
+    # Count first: the row may be written (and reported) before submit returns.
+    with _session_lock:
+        _unlanded.add(row)
+        _add_to_totals(row, 1)
     try:
-        with conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    sql,
-                    (
-                        session_id,
-                        user_id,
-                        pattern_family,
-                        difficulty,
-                        selected_index,
-                        correct_index,
-                        is_correct,
-                        response_ms,
-                    ),
-                )
-    finally:
-        conn.close()
+        # Outside the lock: submit may wait for queue room or a spool fsync.
+        get_attempt_writer().submit(row)
+    except BaseException:
+        with _session_lock:
+            if _unlanded.discard(row):
+                _add_to_totals(row, -1)
+        raise
+    return attempt_id
 
 
-def get_session_summary(*, session_id: str) -> Dict[str, Any]:
+def _load_session_totals(session_id: str, unlanded: Dict[str, Row]) -> Tuple[List[int], List[str]]:
     """
-    Lightweight analytics for the current session.
+    Totals for `session_id`: the nvr_session_stats rollup plus the
+    `unlanded` attempts it does not contain yet. The rollup and the check
+    of which unlanded attempts are stored come from one statement, so they
+    see the same snapshot. Returns (totals, ids of the stored attempts).
     """
     sql = """
-    SELECT
-        COUNT(*) AS attempts,
-        SUM(CASE WHEN is_correct THEN 1 ELSE 0 END) AS correct,
-        AVG(response_ms)::INT AS avg_response_ms
-    FROM nvr_attempts
-    WHERE session_id = %s
+    SELECT s.attempts, s.correct, s.total_response_ms,
+           ARRAY(
+             SELECT a.attempt_id::text FROM nvr_attempts a
+             WHERE a.attempt_id = ANY(%s::uuid[])
+           ) AS landed
+    FROM (SELECT %s::text AS session_id) AS q
+    LEFT JOIN nvr_session_stats s ON s.session_id = q.session_id
     """
-    conn = _get_conn()
-    try:
+    with connection() as conn:
         with conn:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute(sql, (session_id,))
+                cur.execute(sql, (list(unlanded), session_id))
                 row = cur.fetchone() or {}
-                return {
-                    "attempts": int(row.get("attempts") or 0),
-                    "correct": int(row.get("correct") or 0),
-                    "avg_response_ms": int(row.get("avg_response_ms") or 0),
-                }
-    finally:
-        conn.close()
+    landed = list(row.get("landed") or ())
+    totals = [
+        int(row.get("attempts") or 0),
+        int(row.get("correct") or 0),
+        int(row.get("total_response_ms") or 0),
+    ]
+    stored = set(landed)
+    for attempt_id, attempt in unlanded.items():
+        if attempt_id not in stored:
+            totals[0] += 1
+            totals[1] += 1 if attempt[_IS_CORRECT] else 0
+            totals[2] += attempt[_RESPONSE_MS]
+    return totals, landed
+
+
+def get_session_summary(*, session_id: str) -> Dict[str, Any]:
+    """
+    Lightweight analytics for the current session, including attempts
+    still queued or spooled for writing. Only the first call per session
+    (per process) reads the database; later calls use the running totals.
+    """
+    with _session_lock:
+        totals = _session_totals.get(session_id)
+        if totals is not None:
+            _session_totals.move_to_end(session_id)
+        unlanded = _unlanded.get(session_id)
+    if totals is None:
+        totals, landed = _load_session_totals(session_id, unlanded)
+        with _session_lock:
+            # Stored by another process's spool replay: no listener here will see them.
+            _unlanded.forget(session_id, landed)
+            cached = _session_totals.get(session_id)
+            if cached is not None:
+                totals = cached  # loaded concurrently
+            elif _unlanded.get(session_id).keys() == unlanded.keys() - set(landed):
+                # Nothing recorded or settled during the load: safe to keep.
+                _session_totals[session_id] = totals
+                while len(_session_totals) > SESSION_CACHE_MAX:
+                    _session_totals.popitem(last=False)
+            # Otherwise answer from this load and read again next time.
+    attempts, correct, total_ms = totals
+    return {
+        "attempts": attempts,
+        "correct": correct,
+        "avg_response_ms": int(total_ms / attempts) if attempts else 0,
+    }
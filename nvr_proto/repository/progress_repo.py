@@ -1,12 +1,34 @@
-from nvr_proto.db import get_db_connection
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+from nvr_proto.db import connection
+from nvr_proto.repository import nvr_repo
+from nvr_proto.repository.attempt_writer import ATTEMPT_COLUMNS, Row, add_write_listener
 
 MASTERY_ACCURACY = 0.80
 MASTERY_MIN_ATTEMPTS = 10
 
+# (family, level) -> [attempts, correct]
+LevelCounts = Dict[Tuple[str, int], list]
+
+_USER_ID = ATTEMPT_COLUMNS.index("user_id")
+_LEVEL = ATTEMPT_COLUMNS.index("level")
+
+# Per-user level counts for every family, most recently used last. Loaded
+# with one GROUP BY query; record_attempt drops the user's entry, and so
+# does the writer storing a levelled attempt, so the next read reloads.
+USER_CACHE_MAX = int(os.environ.get("NVR_PROGRESS_CACHE_MAX", "10000"))
+_user_counts: "OrderedDict[str, LevelCounts]" = OrderedDict()
+# user_id -> token of the load in flight; _invalidate drops it so that a
+# load which raced with a new attempt is not cached.
+_loading: Dict[str, object] = {}
+_user_lock = threading.Lock()
+
 
 def get_or_create_user(email: str, name: str | None = None) -> int:
-    conn = get_db_connection()
-    try:
+    with connection() as conn:
         with conn.cursor() as cur:
             cur.execute("SELECT id FROM nvr_users WHERE email=%s", (email,))
             row = cur.fetchone()
@@ -20,8 +42,6 @@ def get_or_create_user(email: str, name: str | None = None) -> int:
             uid = cur.fetchone()[0]
             conn.commit()
             return int(uid)
-    finally:
-        conn.close()
 
 
 def record_attempt(
@@ -31,55 +51,150 @@ def record_attempt(
     level: int,
     is_correct: bool,
     duration_ms: int | None,
-):
-    conn = get_db_connection()
-    try:
-        with conn.cursor() as cur:
-            cur.execute(
-                """
-                INSERT INTO nvr_attempts(user_id, pattern_id, family, level, is_correct, duration_ms)
-                VALUES (%s,%s,%s,%s,%s,%s)
-                """,
-                (user_id, pattern_id, family, level, is_correct, duration_ms),
-            )
-            conn.commit()
-    finally:
-        conn.close()
+    *,
+    session_id: str | None = None,
+    difficulty: str = "unknown",
+    selected_index: int = -1,
+    correct_index: int = -1,
+) -> str:
+    """
+    Log a levelled attempt through nvr_repo's batched writer, in the
+    canonical nvr_attempts schema (see nvr_proto.migrations), and drop the
+    user's cached level stats. Callers of the original six-argument form
+    get placeholders for the newer columns: a per-user session id,
+    difficulty "unknown" and index -1.
+    """
+    attempt_id = nvr_repo.record_attempt(
+        session_id=session_id or f"user-{user_id}",
+        user_id=str(user_id),
+        pattern_family=family,
+        difficulty=difficulty,
+        selected_index=selected_index,
+        correct_index=correct_index,
+        is_correct=is_correct,
+        response_ms=duration_ms or 0,
+        pattern_id=pattern_id,
+        level=level,
+    )
+    with _user_lock:
+        _invalidate(str(user_id))
+    return attempt_id
 
 
-def get_level_stats(user_id: int, family: str, level: int):
-    conn = get_db_connection()
-    try:
+def _invalidate(user_id: str) -> None:
+    # Called with _user_lock held.
+    _user_counts.pop(user_id, None)
+    _loading.pop(user_id, None)
+
+
+def _on_attempts_settled(written: List[Row], rejected: List[Row]) -> None:
+    # A levelled attempt is now part of the GROUP BY; rejected ones never were.
+    users = {row[_USER_ID] for row in written if row[_USER_ID] is not None and row[_LEVEL] is not None}
+    if users:
+        with _user_lock:
+            for user_id in users:
+                _invalidate(user_id)
+
+
+add_write_listener(_on_attempts_settled)
+
+
+def _load_level_counts(user_id: str) -> LevelCounts:
+    # One round trip for every family and level; served from
+    # idx_nvr_attempts_user_family_level without touching the heap.
+    with connection() as conn:
         with conn.cursor() as cur:
             cur.execute(
                 """
                 SELECT
+                  pattern_family,
+                  level,
                   COUNT(*) as n,
-                  AVG(CASE WHEN is_correct THEN 1 ELSE 0 END) as acc
+                  COUNT(*) FILTER (WHERE is_correct) as correct
                 FROM nvr_attempts
-                WHERE user_id=%s AND family=%s AND level=%s
+                WHERE user_id=%s AND level IS NOT NULL
+                GROUP BY pattern_family, level
                 """,
-                (user_id, family, level),
+                (user_id,),
             )
-            n, acc = cur.fetchone()
-            n = int(n or 0)
-            acc = float(acc or 0.0)
-            return n, acc
-    finally:
-        conn.close()
+            rows = cur.fetchall()
+    return {(family, int(level)): [int(n), int(correct)] for family, level, n, correct in rows}
 
 
-def is_level_mastered(user_id: int, family: str, level: int) -> bool:
-    n, acc = get_level_stats(user_id, family, level)
+def _level_counts(user_id: int) -> LevelCounts:
+    key = str(user_id)
+    token = object()
+    with _user_lock:
+        counts = _user_counts.get(key)
+        if counts is not None:
+            _user_counts.move_to_end(key)
+            return counts
+        _loading[key] = token
+    try:
+        counts = _load_level_counts(key)
+    except BaseException:
+        with _user_lock:
+            if _loading.get(key) is token:
+                del _loading[key]
+        raise
+    with _user_lock:
+        if _loading.get(key) is token:
+            del _loading[key]
+            _user_counts[key] = counts
+            while len(_user_counts) > USER_CACHE_MAX:
+                _user_counts.popitem(last=False)
+    return counts
+
+
+def _stats(counts: LevelCounts, family: str, level: int) -> Tuple[int, float]:
+    n, correct = counts.get((family, level), (0, 0))
+    return n, (correct / n if n else 0.0)
+
+
+def get_level_stats(user_id: int, family: str, level: int):
+    return _stats(_level_counts(user_id), family, level)
+
+
+def get_family_level_stats(user_id: int, family: str | None = None) -> Dict[str, Dict[int, Tuple[int, float]]]:
+    """
+    {family: {level: (attempts, accuracy)}} for one family or all of them,
+    from a single query (or the cache).
+    """
+    stats: Dict[str, Dict[int, Tuple[int, float]]] = {}
+    counts = _level_counts(user_id)
+    for fam, level in sorted(counts):
+        if family is None or fam == family:
+            stats.setdefault(fam, {})[level] = _stats(counts, fam, level)
+    return stats
+
+
+def _mastered(counts: LevelCounts, family: str, level: int) -> bool:
+    n, acc = _stats(counts, family, level)
     return n >= MASTERY_MIN_ATTEMPTS and acc >= MASTERY_ACCURACY
 
 
-def get_unlocked_level(user_id: int, family: str, max_level: int = 5) -> int:
+def is_level_mastered(user_id: int, family: str, level: int) -> bool:
+    return _mastered(_level_counts(user_id), family, level)
+
+
+def _unlocked(counts: LevelCounts, family: str, max_level: int) -> int:
     # unlocked = highest consecutive mastered + 1 (capped)
     unlocked = 1
     for lvl in range(1, max_level + 1):
-        if is_level_mastered(user_id, family, lvl):
+        if _mastered(counts, family, lvl):
             unlocked = min(lvl + 1, max_level)
         else:
             break
     return unlocked
+
+
+def get_unlocked_level(user_id: int, family: str, max_level: int = 5) -> int:
+    return _unlocked(_level_counts(user_id), family, max_level)
+
+
+def get_unlocked_levels(user_id: int, families, max_level: int = 5) -> Dict[str, int]:
+    """
+    Unlocked level of each family in `families`, from one query.
+    """
+    counts = _level_counts(user_id)
+    return {family: _unlocked(counts, family, max_level) for family in families}
@@ -0,0 +1,62 @@
+"""
+Validated-once question marker.
+
+Questions that passed generator.validate_question are wrapped in
+ValidatedQuestion, and downstream code (render_svg, app.py, the bank) skips
+the checks it would otherwise repeat on every rerun.
+
+Set NVR_STRICT_VALIDATION=1 to ignore the marker and run every check
+everywhere, as before.
+"""
+import os
+from typing import Any, Dict
+
+STRICT_VALIDATION = os.environ.get("NVR_STRICT_VALIDATION", "").lower() not in ("", "0", "false", "no")
+
+
+def _frozen(self, *args, **kwargs):
+    raise TypeError("ValidatedQuestion is read-only; copy it with dict(question) to modify")
+
+
+class ValidatedQuestion(dict):
+    """
+    A question dict that has passed validation. The top level is read-only,
+    so the marker cannot outlive a change to the keys it vouches for; nested
+    stem/option values are shared with the original and must not be mutated.
+
+    Only build one through generator.ensure_validated() or mark_validated().
+    """
+
+    __slots__ = ()
+
+    __setitem__ = _frozen
+    __delitem__ = _frozen
+    __ior__ = _frozen
+    clear = _frozen
+    pop = _frozen
+    popitem = _frozen
+    setdefault = _frozen
+    update = _frozen
+
+    def __reduce__(self):
+        return mark_validated, (dict(self),)
+
+    def __copy__(self) -> "ValidatedQuestion":
+        return self
+
+
+def mark_validated(question: Dict[str, Any]) -> ValidatedQuestion:
+    """
+    Wrap `question` without checking it. For callers that just validated
+    it, or that load questions produced by a validated path.
+    """
+    if isinstance(question, ValidatedQuestion):
+        return question
+    return ValidatedQuestion(question)
+
+
+def is_trusted(question: Any) -> bool:
+    """
+    True when checks on `question` can be skipped.
+    """
+    return not STRICT_VALIDATION and isinstance(question, ValidatedQuestion)
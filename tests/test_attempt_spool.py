@@ -0,0 +1,57 @@
+"""
+AttemptSpool segment naming: nothing already on disk is ever replaced.
+"""
+import json
+
+from nvr_proto.repository.attempt_spool import AttemptSpool
+
+
+def replayed_rows(spool):
+    rows = []
+    spool.replay(rows.extend)
+    return sorted(rows)
+
+
+def test_restarted_process_does_not_overwrite_sealed_segments(tmp_path):
+    # Same directory and PID, fresh sequence numbers: a restarted container.
+    first = AttemptSpool(tmp_path)
+    first.append([("a", 1)])
+    first.seal()
+    second = AttemptSpool(tmp_path)
+    second.append([("b", 2)])
+    second.seal()
+
+    assert len(list(tmp_path.glob("attempts-*.jsonl"))) == 2
+    assert replayed_rows(second) == [("a", 1), ("b", 2)]
+
+
+def test_quarantine_keeps_earlier_quarantined_rows(tmp_path):
+    first = AttemptSpool(tmp_path)
+    first.quarantine([("a", 1)])
+    second = AttemptSpool(tmp_path)
+    second.quarantine([("b", 2)])
+
+    rows = sorted(
+        tuple(json.loads(line))
+        for path in tmp_path.glob("attempts-*.quarantine")
+        for line in path.read_text().splitlines()
+    )
+    assert rows == [("a", 1), ("b", 2)]
+
+
+def test_rejected_segment_does_not_replace_existing_quarantine(tmp_path):
+    spool = AttemptSpool(tmp_path)
+    spool.append([("a", 1)])
+    spool.seal()
+    (sealed,) = tmp_path.glob("attempts-*.jsonl")
+    clash = sealed.with_suffix(".quarantine")
+    clash.write_text('["old",0]\n')
+
+    def reject(rows):
+        raise ValueError("rejected")
+
+    spool.replay(reject, is_transient=lambda exc: False)
+
+    assert clash.read_text() == '["old",0]\n'
+    assert len(list(tmp_path.glob("attempts-*.quarantine"))) == 2
+    assert not spool.has_segments()
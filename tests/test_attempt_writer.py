@@ -0,0 +1,285 @@
+"""
+AttemptWriter, its spool and the session summaries built on them, against
+an in-memory stand-in for Postgres passed as the writer's `write`.
+"""
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import psycopg2
+import pytest
+
+from nvr_proto.repository import nvr_repo
+from nvr_proto.repository.attempt_spool import AttemptSpool
+from nvr_proto.repository.attempt_writer import ATTEMPT_COLUMNS, AttemptWriter
+
+_ATTEMPT_ID = ATTEMPT_COLUMNS.index("attempt_id")
+_SESSION_ID = ATTEMPT_COLUMNS.index("session_id")
+_SELECTED_INDEX = ATTEMPT_COLUMNS.index("selected_index")
+_IS_CORRECT = ATTEMPT_COLUMNS.index("is_correct")
+_RESPONSE_MS = ATTEMPT_COLUMNS.index("response_ms")
+
+# Rows with this selected_index are refused like a constraint violation.
+POISON = -1
+
+
+class FakeDatabase:
+    """
+    nvr_attempts keyed by attempt_id (so repeated writes land once), with
+    switchable outages.
+    """
+
+    def __init__(self):
+        self.rows = {}
+        self.up = True
+        self.calls = []
+
+    def write(self, rows):
+        self.calls.append(len(rows))
+        if not self.up:
+            raise psycopg2.OperationalError("database is down")
+        if any(row[_SELECTED_INDEX] == POISON for row in rows):
+            raise psycopg2.DataError("value out of range")
+        for row in rows:
+            self.rows.setdefault(row[_ATTEMPT_ID], row)
+
+    def session_row(self, session_id, attempt_ids):
+        # What nvr_repo._load_session_totals' single statement returns.
+        rows = [row for row in self.rows.values() if row[_SESSION_ID] == session_id]
+        return {
+            "attempts": len(rows) or None,
+            "correct": sum(1 for row in rows if row[_IS_CORRECT]),
+            "total_response_ms": sum(row[_RESPONSE_MS] for row in rows),
+            "landed": [attempt_id for attempt_id in attempt_ids if attempt_id in self.rows],
+        }
+
+    def connection(self):
+        database = self
+
+        class Cursor:
+            def execute(self, sql, params):
+                self.params = params
+
+            def fetchone(self):
+                attempt_ids, session_id = self.params
+                return database.session_row(session_id, attempt_ids)
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+        class Connection:
+            def cursor(self, cursor_factory=None):
+                return Cursor()
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+        @contextmanager
+        def connection():
+            yield Connection()
+
+        return connection
+
+
+def make_row(session_id="s1", is_correct=True, response_ms=100, selected_index=0):
+    return (
+        str(uuid.uuid4()),
+        session_id,
+        "u1",
+        "SEQUENCE",
+        "easy",
+        selected_index,
+        0,
+        is_correct,
+        response_ms,
+        None,
+        None,
+        datetime.now(timezone.utc),
+    )
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not met in time")
+        time.sleep(0.01)
+
+
+def segments(spool, suffix):
+    return sorted(spool.directory.glob(f"attempts-*{suffix}"))
+
+
+@pytest.fixture
+def db():
+    return FakeDatabase()
+
+
+@pytest.fixture
+def make_writer(db):
+    writers = []
+
+    def make(**kwargs):
+        kwargs.setdefault("write", db.write)
+        writer = AttemptWriter(**kwargs)
+        writers.append(writer)
+        return writer
+
+    yield make
+    for writer in writers:
+        writer.close(timeout=5)
+
+
+def test_flushes_when_batch_is_full(db, make_writer):
+    writer = make_writer(batch_size=3, flush_interval=60)
+    rows = [make_row() for _ in range(3)]
+    for row in rows:
+        writer.submit(row)
+
+    wait_for(lambda: len(db.rows) == 3)
+    assert db.calls == [3]
+    assert writer.stats()["batches"] == 1
+
+
+def test_flushes_after_interval(db, make_writer):
+    writer = make_writer(batch_size=100, flush_interval=0.05)
+    started = time.monotonic()
+    writer.submit(make_row())
+
+    wait_for(lambda: len(db.rows) == 1)
+    assert time.monotonic() - started >= 0.05
+    assert db.calls == [1]
+
+
+def test_spools_while_database_is_down_then_replays(db, make_writer, tmp_path):
+    spool = AttemptSpool(tmp_path)
+    writer = make_writer(batch_size=2, flush_interval=0.02, spool=spool, replay_interval=0.05)
+    db.up = False
+    rows = [make_row() for _ in range(5)]
+    for row in rows:
+        writer.submit(row)
+
+    wait_for(lambda: writer.stats()["spooled"] == 5)
+    assert db.rows == {}
+
+    db.up = True
+    wait_for(lambda: len(db.rows) == 5)
+    assert set(db.rows) == {row[_ATTEMPT_ID] for row in rows}
+    # The segment is unlinked just before the writer counts it as replayed.
+    wait_for(lambda: not spool.has_segments() and writer.stats()["replayed"] == 5)
+
+
+def test_rejected_rows_are_quarantined_not_retried(db, make_writer, tmp_path):
+    spool = AttemptSpool(tmp_path)
+    writer = make_writer(batch_size=3, flush_interval=60, spool=spool, replay_interval=0.05)
+    good = [make_row(), make_row()]
+    poison = make_row(selected_index=POISON)
+    for row in (good[0], poison, good[1]):
+        writer.submit(row)
+
+    wait_for(lambda: writer.stats()["quarantined"] == 1)
+    assert set(db.rows) == {row[_ATTEMPT_ID] for row in good}
+    (quarantined,) = segments(spool, ".quarantine")
+    assert poison[_ATTEMPT_ID] in quarantined.read_text()
+    assert not spool.has_segments()
+
+
+def test_poison_row_in_spooled_segment_does_not_block_replay(db, make_writer, tmp_path):
+    spool = AttemptSpool(tmp_path)
+    writer = make_writer(batch_size=3, flush_interval=0.02, spool=spool, replay_interval=0.05)
+    db.up = False
+    good = [make_row(), make_row()]
+    poison = make_row(selected_index=POISON)
+    for row in (good[0], poison, good[1]):
+        writer.submit(row)
+    wait_for(lambda: writer.stats()["spooled"] == 3)
+
+    db.up = True
+    wait_for(lambda: len(db.rows) == 2 and not spool.has_segments())
+    assert set(db.rows) == {row[_ATTEMPT_ID] for row in good}
+    assert writer.stats()["quarantined"] == 1
+    (quarantined,) = segments(spool, ".quarantine")
+    assert poison[_ATTEMPT_ID] in quarantined.read_text()
+
+    # Quarantined rows stay out of later replays.
+    calls = len(db.calls)
+    time.sleep(0.2)
+    assert len(db.calls) == calls
+
+
+@pytest.fixture
+def repo(db, make_writer, tmp_path, monkeypatch):
+    writer = make_writer(batch_size=2, flush_interval=0.02, spool=AttemptSpool(tmp_path), replay_interval=0.05)
+    monkeypatch.setattr(nvr_repo, "connection", db.connection())
+    monkeypatch.setattr(nvr_repo, "get_attempt_writer", lambda: writer)
+    monkeypatch.setattr(nvr_repo, "_session_totals", type(nvr_repo._session_totals)())
+    monkeypatch.setattr(nvr_repo._unlanded, "_rows", {})
+    return writer
+
+
+def record(session_id="s1", is_correct=True, response_ms=100, selected_index=0):
+    return nvr_repo.record_attempt(
+        session_id=session_id,
+        user_id="u1",
+        pattern_family="SEQUENCE",
+        difficulty="easy",
+        selected_index=selected_index,
+        correct_index=0 if is_correct else 1,
+        is_correct=is_correct,
+        response_ms=response_ms,
+    )
+
+
+def summary(session_id="s1", cached=True):
+    if not cached:
+        nvr_repo._session_totals.clear()
+    return nvr_repo.get_session_summary(session_id=session_id)
+
+
+def test_summary_counts_attempts_through_an_outage(db, repo):
+    record(response_ms=200)
+    wait_for(lambda: len(db.rows) == 1)
+    assert summary() == {"attempts": 1, "correct": 1, "avg_response_ms": 200}
+
+    db.up = False
+    for is_correct in (True, True, False, False, True):
+        record(is_correct=is_correct, response_ms=100)
+    wait_for(lambda: repo.stats()["spooled"] == 5)
+    expected = {"attempts": 6, "correct": 4, "avg_response_ms": 116}
+    assert summary() == expected
+    assert summary(cached=False) == expected  # spooled rows are not in the database
+
+    db.up = True
+    wait_for(lambda: len(db.rows) == 6)
+    wait_for(lambda: not nvr_repo._unlanded)
+    assert summary() == expected
+    assert summary(cached=False) == expected  # replayed rows are counted once
+
+    record(is_correct=False, response_ms=300)
+    assert summary() == {"attempts": 7, "correct": 4, "avg_response_ms": 142}
+
+
+def test_summary_drops_rejected_attempts(db, repo):
+    record()
+    assert summary() == {"attempts": 1, "correct": 1, "avg_response_ms": 100}
+
+    record(selected_index=POISON)
+    wait_for(lambda: repo.stats()["quarantined"] == 1)
+    wait_for(lambda: not nvr_repo._unlanded)
+    assert summary() == {"attempts": 1, "correct": 1, "avg_response_ms": 100}
+
+
+def test_summary_loaded_after_a_rejected_attempt(db, repo):
+    record()
+    record(selected_index=POISON)
+    wait_for(lambda: repo.stats()["quarantined"] == 1)
+    wait_for(lambda: not nvr_repo._unlanded)
+    # First read of the session: only the stored attempt is counted.
+    assert summary() == {"attempts": 1, "correct": 1, "avg_response_ms": 100}
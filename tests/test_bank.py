@@ -0,0 +1,33 @@
+"""
+Drawing from a built bank: shard contents are checked before use.
+"""
+import json
+import random
+
+import pytest
+
+from nvr_proto.bank import QuestionBank, build_bank
+from nvr_proto.validated import ValidatedQuestion
+
+
+@pytest.fixture
+def bank_dir(tmp_path):
+    build_bank(tmp_path, per_family=3, shard_size=3, workers=1, seed=1, families=["ANALOGY"], difficulties=["easy"])
+    return tmp_path
+
+
+def test_draw_hands_out_validated_questions(bank_dir):
+    question = QuestionBank(bank_dir).draw("easy", rng=random.Random(1))
+    assert isinstance(question, ValidatedQuestion)
+    assert question["pattern_family"] == "ANALOGY"
+
+
+def test_draw_rejects_a_tampered_shard(bank_dir):
+    (shard,) = bank_dir.glob("*.jsonl")
+    questions = [json.loads(line) for line in shard.read_text().splitlines()]
+    for question in questions:
+        question["correct_index"] = (question["correct_index"] + 1) % 4
+    shard.write_text("".join(json.dumps(question) + "\n" for question in questions))
+
+    with pytest.raises(AssertionError):
+        QuestionBank(bank_dir).draw("easy", rng=random.Random(1))
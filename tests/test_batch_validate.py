@@ -0,0 +1,114 @@
+"""
+Batch validation verdicts against generator.validate_question, and the
+bank audit built on it.
+"""
+import copy
+import json
+import os
+import random
+
+import pytest
+
+from nvr_proto.bank import audit_bank, build_bank
+from nvr_proto.batch_validate import EncodedBatch, encode_questions, validate_encoded, validate_questions_batch
+from nvr_proto.compact import CompactQuestion
+from nvr_proto.generator import DIFFICULTY_LEVELS, FAMILIES, generate_question_for_family, validate_question
+
+
+def scalar_valid(question):
+    try:
+        validate_question(question)
+    except Exception:
+        return False
+    return True
+
+
+def corruptions(question):
+    """Plain-dict variants of `question`, most of them invalid."""
+    wrong_key = copy.deepcopy(dict(question))
+    wrong_key["correct_index"] = (question["correct_index"] + 1) % 4
+    yield wrong_key
+
+    duplicate = copy.deepcopy(dict(question))
+    duplicate["options"][(question["correct_index"] + 1) % 4] = copy.deepcopy(duplicate["options"][question["correct_index"]])
+    yield duplicate
+
+    short = copy.deepcopy(dict(question))
+    short["options"] = short["options"][:3]
+    yield short
+
+    out_of_range = copy.deepcopy(dict(question))
+    out_of_range["correct_index"] = 4
+    yield out_of_range
+
+    stem = copy.deepcopy(dict(question))
+    if question["pattern_family"] == "MATRIX":
+        for row in stem["stem"]["cells"]:
+            for column, cell in enumerate(row):
+                if cell is None:
+                    row[column] = copy.deepcopy(stem["options"][stem["correct_index"]])
+    elif question["pattern_family"] in ("SEQUENCE", "ODD_ONE_OUT"):
+        stem["stem"]["items"].reverse()
+    elif question["pattern_family"] == "ANALOGY":
+        stem["stem"]["A"], stem["stem"]["B"] = stem["stem"]["B"], stem["stem"]["A"]
+    elif question["pattern_family"] == "COMPOSITION":
+        stem["stem"]["operation"] = "INTERSECTION"
+    yield stem
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    rng = random.Random(7)
+    questions = []
+    for family in FAMILIES:
+        for difficulty in DIFFICULTY_LEVELS:
+            for _ in range(15):
+                question = generate_question_for_family(family, difficulty=difficulty, rng=rng)
+                questions.append(question)
+                questions.extend(corruptions(question))
+    return questions
+
+
+def test_mask_matches_validate_question(corpus):
+    expected = [scalar_valid(question) for question in corpus]
+    assert 0 < sum(expected) < len(expected)
+
+    mask, reasons = validate_questions_batch([CompactQuestion.from_dict(question) for question in corpus])
+    assert mask.tolist() == expected
+    assert [reason is None for reason in reasons] == expected
+
+    dict_mask, _ = validate_questions_batch(corpus)
+    assert dict_mask.tolist() == expected
+
+
+def test_saved_encoding_gives_the_same_verdicts(corpus, tmp_path):
+    compact = [CompactQuestion.from_dict(question) for question in corpus]
+    encoded = encode_questions(compact)
+    assert encoded.families  # the vectorized path was taken
+    encoded.save(tmp_path / "corpus.npz")
+
+    mask, reasons = validate_encoded(EncodedBatch.load(tmp_path / "corpus.npz"))
+    assert mask.tolist() == [scalar_valid(question) for question in corpus]
+    assert reasons == validate_encoded(encoded)[1]
+
+
+def test_audit_reuses_encodings_and_reports_bad_shards(tmp_path):
+    build_bank(tmp_path, per_family=4, shard_size=4, workers=1, seed=3, families=["SEQUENCE"], difficulties=["easy"])
+    report = audit_bank(tmp_path)
+    assert (report["questions"], report["invalid"], report["encoded"]) == (4, 0, 1)
+    assert audit_bank(tmp_path)["encoded"] == 0
+
+    (shard,) = tmp_path.glob("*.jsonl")
+    lines = shard.read_text().splitlines()
+    question = json.loads(lines[0])
+    question["correct_index"] = (question["correct_index"] + 1) % 4
+    lines[0] = json.dumps(question)
+    shard.write_text("\n".join(lines) + "\n")
+    encoded = shard.with_suffix(".npz")
+    stat = encoded.stat()
+    # Make the edit newer than the cached encoding even on coarse mtimes.
+    os.utime(encoded, (stat.st_atime, shard.stat().st_mtime - 10))
+
+    report = audit_bank(tmp_path)
+    assert (report["invalid"], report["encoded"]) == (1, 1)
+    assert report["failing"][0]["file"] == shard.name
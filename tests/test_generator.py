@@ -0,0 +1,43 @@
+"""
+Options must look different, not just differ in their rotation numbers.
+"""
+import random
+
+import pytest
+
+from nvr_proto.batch_validate import validate_questions_batch
+from nvr_proto.compact import CompactQuestion
+from nvr_proto.generator import DIFFICULTY_LEVELS, FAMILIES, _rotation_key, generate_question_for_family, validate_question
+
+
+def test_generated_options_look_different():
+    rng = random.Random(11)
+    for family in FAMILIES:
+        for difficulty in DIFFICULTY_LEVELS:
+            for _ in range(20):
+                question = generate_question_for_family(family, difficulty=difficulty, rng=rng)
+                assert len({_rotation_key(option) for option in question["options"]}) == 4
+
+
+@pytest.mark.parametrize(
+    "shape, rotation, same",
+    [("square", 90, True), ("square", 45, False), ("circle", 135, True), ("triangle", 90, False)],
+)
+def test_symmetric_rotations_are_duplicates(shape, rotation, same):
+    question = generate_question_for_family("COMPOSITION", difficulty="medium", rng=random.Random(3))
+    correct = question["options"][question["correct_index"]]
+    other = (question["correct_index"] + 1) % 4
+    question["stem"]["inputs"] = [{"shape": shape, "rotation": 0}, {"shape": "triangle", "rotation": 180}]
+    correct["items"] = [{"shape": shape, "rotation": 0}, {"shape": "triangle", "rotation": 180}]
+    question["options"][other] = {
+        "type": "composite",
+        "items": [{"shape": shape, "rotation": rotation}, {"shape": "triangle", "rotation": 180}],
+    }
+
+    if same:
+        with pytest.raises(AssertionError):
+            validate_question(question)
+    else:
+        validate_question(question)
+    mask, _ = validate_questions_batch([CompactQuestion.from_dict(question)])
+    assert mask.tolist() == [not same]
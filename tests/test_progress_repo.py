@@ -0,0 +1,123 @@
+"""
+progress_repo's per-user level counts: one GROUP BY per load, cached per
+user, dropped when an attempt is recorded or stored.
+"""
+from contextlib import contextmanager
+
+import pytest
+
+from nvr_proto.repository import progress_repo
+from nvr_proto.repository.attempt_writer import ATTEMPT_COLUMNS
+
+
+class FakeProgressDatabase:
+    """GROUP BY results per user_id, counting the queries it answers."""
+
+    def __init__(self):
+        self.counts = {}
+        self.queries = []
+
+    def connection(self):
+        database = self
+
+        class Cursor:
+            def execute(self, sql, params):
+                database.queries.append(params)
+                self.user_id = params[0]
+
+            def fetchall(self):
+                return [
+                    (family, level, n, correct)
+                    for (family, level), (n, correct) in database.counts.get(self.user_id, {}).items()
+                ]
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+        class Connection:
+            def cursor(self):
+                return Cursor()
+
+        @contextmanager
+        def connection():
+            yield Connection()
+
+        return connection
+
+
+@pytest.fixture
+def db(monkeypatch):
+    database = FakeProgressDatabase()
+    monkeypatch.setattr(progress_repo, "connection", database.connection())
+    monkeypatch.setattr(progress_repo, "_user_counts", type(progress_repo._user_counts)())
+    monkeypatch.setattr(progress_repo, "_loading", {})
+    return database
+
+
+@pytest.fixture
+def recorded(monkeypatch):
+    calls = []
+
+    def record_attempt(**kwargs):
+        calls.append(kwargs)
+        return f"attempt-{len(calls)}"
+
+    monkeypatch.setattr(progress_repo.nvr_repo, "record_attempt", record_attempt)
+    return calls
+
+
+def written_row(user_id, level=1):
+    row = dict.fromkeys(ATTEMPT_COLUMNS)
+    row.update(user_id=user_id, level=level, pattern_family="SEQUENCE", is_correct=True)
+    return tuple(row[column] for column in ATTEMPT_COLUMNS)
+
+
+def test_repeat_reads_hit_the_cache(db):
+    db.counts["7"] = {("SEQUENCE", 1): (12, 11), ("MATRIX", 1): (3, 1)}
+
+    assert progress_repo.get_unlocked_levels(7, ["SEQUENCE", "MATRIX"]) == {"SEQUENCE": 2, "MATRIX": 1}
+    assert progress_repo.get_level_stats(7, "MATRIX", 1) == (3, 1 / 3)
+    assert progress_repo.is_level_mastered(7, "SEQUENCE", 1)
+    assert db.queries == [("7",)]
+
+
+def test_record_attempt_invalidates_the_users_counts(db, recorded):
+    db.counts["7"] = {("SEQUENCE", 1): (9, 9)}
+    db.counts["8"] = {("SEQUENCE", 1): (1, 1)}
+    assert not progress_repo.is_level_mastered(7, "SEQUENCE", 1)
+    progress_repo.get_level_stats(8, "SEQUENCE", 1)
+
+    # The original six-argument form still works.
+    assert progress_repo.record_attempt(7, "p1", "SEQUENCE", 1, True, 900) == "attempt-1"
+    assert recorded[0]["session_id"] == "user-7"
+    db.counts["7"] = {("SEQUENCE", 1): (10, 10)}
+
+    assert progress_repo.is_level_mastered(7, "SEQUENCE", 1)
+    progress_repo.get_level_stats(8, "SEQUENCE", 1)
+    assert db.queries == [("7",), ("8",), ("7",)]
+
+
+def test_written_attempt_invalidates_the_users_counts(db):
+    db.counts["7"] = {("SEQUENCE", 1): (9, 9)}
+    progress_repo.get_level_stats(7, "SEQUENCE", 1)
+    db.counts["7"] = {("SEQUENCE", 1): (10, 10)}
+
+    progress_repo._on_attempts_settled([written_row("7")], [])
+    assert progress_repo.get_level_stats(7, "SEQUENCE", 1) == (10, 1.0)
+    assert len(db.queries) == 2
+
+
+def test_least_recently_used_user_is_evicted(db, monkeypatch):
+    monkeypatch.setattr(progress_repo, "USER_CACHE_MAX", 2)
+    for user_id in (1, 2):
+        progress_repo.get_unlocked_level(user_id, "SEQUENCE")
+    progress_repo.get_unlocked_level(1, "SEQUENCE")  # 2 is now the oldest
+    progress_repo.get_unlocked_level(3, "SEQUENCE")
+
+    assert list(progress_repo._user_counts) == ["1", "3"]
+    progress_repo.get_unlocked_level(1, "SEQUENCE")
+    progress_repo.get_unlocked_level(2, "SEQUENCE")
+    assert db.queries == [("1",), ("2",), ("3",), ("2",)]
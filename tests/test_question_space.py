@@ -0,0 +1,38 @@
+"""
+The enumerated question space and question_stream drawing from it.
+"""
+import random
+
+from nvr_proto.compact import CompactQuestion
+from nvr_proto.fingerprint import SeenSet, question_fingerprint
+from nvr_proto.generator import question_stream, validate_question
+from nvr_proto.question_space import QuestionSpace, get_question_space
+from nvr_proto.validated import ValidatedQuestion
+
+
+def test_space_holds_validated_compact_questions(tmp_path):
+    space = QuestionSpace.build(families=["MATRIX"], difficulties=["easy"])
+    question, fingerprint = space.draw("MATRIX", "easy", random.Random(1))
+    assert isinstance(question, CompactQuestion)
+    assert isinstance(question.to_dict(), ValidatedQuestion)
+    assert fingerprint == question_fingerprint(question.to_dict())
+
+    space.save(tmp_path / "space.json")
+    loaded = QuestionSpace.load(tmp_path / "space.json")
+    assert loaded.sizes() == space.sizes()
+    assert loaded.get("MATRIX", "easy", 0) == space.get("MATRIX", "easy", 0)
+    assert not isinstance(loaded.get("MATRIX", "easy", 0), ValidatedQuestion)
+
+
+def test_stream_draws_enumerated_families_from_the_space():
+    space = get_question_space()
+    stream = question_stream(difficulty="medium", families=["ANALOGY", "COMPOSITION"], seed=3, seen=SeenSet())
+    try:
+        questions = [next(stream) for _ in range(20)]
+    finally:
+        stream.close()
+
+    for question in questions:
+        table = space.tables[(question.pattern_family, "medium")]
+        assert any(question is entry for entry in table)
+        validate_question(question.to_dict())
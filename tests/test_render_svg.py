@@ -0,0 +1,29 @@
+"""
+<defs>/<use> output is only kept where it is the smaller rendering.
+"""
+import random
+
+from nvr_proto.generator import FAMILIES, generate_question_for_family
+from nvr_proto.render_svg import render_option_svg, render_question_svg
+
+
+def test_defs_mode_is_never_larger_than_inline():
+    rng = random.Random(5)
+    for family in FAMILIES:
+        for _ in range(10):
+            question = generate_question_for_family(family, difficulty="medium", rng=rng)
+            inline = render_question_svg(question, compact=True)
+            with_defs = render_question_svg(question, use_defs=True, compact=True)
+            assert len(with_defs) <= len(inline)
+            if "<defs>" not in with_defs:
+                assert with_defs == inline
+            for option in question["options"]:
+                assert len(render_option_svg(option, family, use_defs=True, compact=True)) <= len(
+                    render_option_svg(option, family, compact=True)
+                )
+
+
+def test_repeated_shapes_still_use_defs():
+    rng = random.Random(5)
+    questions = [generate_question_for_family("SEQUENCE", difficulty="medium", rng=rng) for _ in range(10)]
+    assert any("<defs>" in render_question_svg(question, use_defs=True, compact=True) for question in questions)